@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+대화 로그 일괄 가져오기 벤치마크
+턴마다 add_interaction(증분 기록 + 컨텍스트 구성) / add_interactions 한 번 호출 비교
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from context_manager import AdvancedContextManager
+from memory_persistence import MemoryPersister
+from test_context_manager import InMemoryContextDB
+
+SAMPLES = [
+    ("파이썬 비동기 프로그래밍에 대해 알려줘", "asyncio는 이벤트 루프 기반으로 동작합니다. " * 5),
+    ("How do I profile memory usage in Python?", "Use tracemalloc to snapshot allocations. " * 5),
+    ("오늘 기분이 좀 우울해, 왜 그럴까?", "그런 날도 있죠. 무슨 일이 있었는지 이야기해 주실래요? " * 5),
+    ("Explain the difference between a heap and a sorted list", "A heap keeps only the minimum ordered. " * 5),
+]
+
+def _turns(count: int):
+    return [
+        (f"{SAMPLES[i % len(SAMPLES)][0]} #{i}", SAMPLES[i % len(SAMPLES)][1], {"emotion_tone": {"enthusiasm": 0.7}})
+        for i in range(count)
+    ]
+
+def _manager() -> AdvancedContextManager:
+    manager = AdvancedContextManager(max_working_memory=30, max_episodic_memory=200)
+    manager.persister = MemoryPersister(db=InMemoryContextDB(), flush_interval=3600)
+    return manager
+
+async def _per_turn(turns) -> float:
+    manager = _manager()
+    start = time.perf_counter()
+    for user, assistant, metadata in turns:
+        await manager.add_interaction(user, assistant, metadata, session_id="bench")
+    await manager.persister.flush()
+    return time.perf_counter() - start
+
+async def _bulk(turns) -> float:
+    manager = _manager()
+    start = time.perf_counter()
+    await manager.add_interactions(turns, session_id="bench")
+    return time.perf_counter() - start
+
+def main(count: int = 5000):
+    print(f"🚀 일괄 가져오기 벤치마크 ({count}턴)\n")
+    turns = _turns(count)
+    per_turn = asyncio.run(_per_turn(turns))
+    bulk = asyncio.run(_bulk(turns))
+    print(f"{'add_interaction x N':<24} {per_turn * 1000:9.1f} ms ({count / per_turn:8.0f} 턴/초)")
+    print(f"{'add_interactions':<24} {bulk * 1000:9.1f} ms ({count / bulk:8.0f} 턴/초)")
+    print(f"\n속도 향상: {per_turn / bulk:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Episodic Memory 표현 방식별 메모리 사용량 벤치마크
+dataclass Memory(JSON content) / 슬롯 기반 MemoryRecord 비교
+"""
+
+import gc
+import json
+import random
+import sys
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from context_manager import Memory, MemoryRecord, MemoryType
+
+SAMPLES = [
+    ("파이썬 비동기 프로그래밍에 대해 알려줘", "asyncio는 이벤트 루프 기반으로 동작합니다."),
+    ("How do I profile memory usage in Python?", "Use tracemalloc to snapshot allocations."),
+    ("오늘 기분이 좀 우울해", "그런 날도 있죠. 무슨 일이 있었는지 이야기해 주실래요?"),
+    ("Explain the difference between a heap and a sorted list", "A heap keeps only the minimum ordered."),
+]
+
+def _metadata(rng: random.Random) -> dict:
+    """웹소켓 경로와 같은 형태의 메타데이터"""
+    return {
+        "boundaries_detected": 0,
+        "emotion_tone": {"enthusiasm": 0.7},
+        "persona_state": {
+            "location": rng.choice(["garden_internal", "outside_garden"]),
+            "growth_stage": "seedling",
+            "mask_level": 100,
+            "authenticity": "hidden"
+        }
+    }
+
+def _build_dataclass(count: int, rng: random.Random):
+    memories = []
+    for i in range(count):
+        user, assistant = SAMPLES[i % len(SAMPLES)]
+        memories.append(Memory(
+            id=f"ep_{i}",
+            type=MemoryType.EPISODIC,
+            content=json.dumps({"user": f"{user} #{i}", "assistant": assistant}),
+            timestamp=datetime.now(),
+            importance=rng.random(),
+            metadata=_metadata(rng)
+        ))
+    return memories
+
+def _build_compact(count: int, rng: random.Random):
+    memories = []
+    for i in range(count):
+        user, assistant = SAMPLES[i % len(SAMPLES)]
+        memories.append(MemoryRecord(
+            id=f"ep_{i}",
+            user=f"{user} #{i}",
+            assistant=assistant,
+            created_at=time.time(),
+            importance=rng.random(),
+            metadata=_metadata(rng)
+        ))
+    return memories
+
+def _measure(label: str, builder, count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    memories = builder(count, random.Random(1))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {current / 1024 / 1024:8.1f} MB ({current / count:6.0f} B/memory)")
+    del memories
+    return current
+
+def main(count: int = 100000):
+    print(f"🚀 메모리 표현 벤치마크 ({count}개)\n")
+    baseline = _measure("dataclass Memory (JSON)", _build_dataclass, count)
+    compact = _measure("MemoryRecord (slots)", _build_compact, count)
+    print(f"\n절감률: {(1 - compact / baseline) * 100:.1f}%")
+
+if __name__ == "__main__":
+    main()
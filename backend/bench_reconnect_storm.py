@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+웹소켓 재접속 폭주 벤치마크
+연결마다 ClaudeClient 를 두 번 새로 만들던 방식 / 시작 시 만든 공유 클라이언트 재사용 비교
+(접속 후 첫 응답까지의 시간과 업스트림 TCP 연결 수 측정)
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from claude_client import ClaudeClient, ClaudeClientRegistry
+from test_claude_client import FakeAnthropicServer
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+async def _per_connection(server: FakeAnthropicServer):
+    """이전 websocket_endpoint 동작: connect 전과 try 블록 안에서 클라이언트를 각각 생성"""
+    start = time.perf_counter()
+    ClaudeClient("bench-key", base_url=server.base_url)
+    client = ClaudeClient("bench-key", base_url=server.base_url)
+    response = await client.get_response("안녕")
+    return time.perf_counter() - start, response.startswith("Claude API 오류")
+
+async def _shared(registry: ClaudeClientRegistry):
+    start = time.perf_counter()
+    response = await registry.client.get_response("안녕")
+    return time.perf_counter() - start, response.startswith("Claude API 오류")
+
+async def _storm(connect, connections: int, waves: int):
+    latencies = []
+    for _ in range(waves):
+        latencies.extend(await asyncio.gather(*(connect() for _ in range(connections))))
+    return latencies
+
+async def _run(connections: int, waves: int):
+    results = {}
+    async with FakeAnthropicServer(chunks=1, delay=0) as server:
+        latencies = await _storm(lambda: _per_connection(server), connections, waves)
+        results["클라이언트 연결마다 생성"] = (latencies, server.connections)
+
+    async with FakeAnthropicServer(chunks=1, delay=0) as server:
+        registry = ClaudeClientRegistry()
+        # 유휴 연결을 폭주 규모만큼 유지 (CLAUDE_MAX_KEEPALIVE)
+        registry.start("bench-key", base_url=server.base_url, max_keepalive=connections, max_in_flight=0)
+        latencies = await _storm(lambda: _shared(registry), connections, waves)
+        results["공유 클라이언트"] = (latencies, server.connections)
+        await registry.shutdown()
+    return results
+
+def main(connections: int = 100, waves: int = 5):
+    print(f"🚀 재접속 폭주 벤치마크 ({connections}개 동시 재접속 x {waves}회)\n")
+    results = asyncio.run(_run(connections, waves))
+    for name, (samples, tcp_connections) in results.items():
+        latencies = [latency for latency, _ in samples]
+        errors = sum(failed for _, failed in samples)
+        print(f"{name:<16} p50 {_percentile(latencies, 0.5) * 1000:7.1f} ms  "
+              f"p95 {_percentile(latencies, 0.95) * 1000:7.1f} ms  업스트림 연결 {tcp_connections:5d}개  오류 {errors}")
+
+if __name__ == "__main__":
+    main()
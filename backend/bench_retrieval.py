@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Episodic Memory 검색 벤치마크
+키워드 겹침 전수 검사 / 역색인 / 임베딩 행렬 top-k 비교
+"""
+
+import asyncio
+import random
+import sys
+import os
+import time
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from context_manager import AdvancedContextManager
+from embedding_index import HashingEmbedder, NUMPY_AVAILABLE
+
+VOCABULARY = [
+    "python", "파이썬", "async", "memory", "database", "react", "typescript",
+    "감정", "대화", "요약", "claude", "stream", "socket", "server", "cache",
+    "model", "token", "vector", "index", "query", "garden", "persona",
+    "학습", "프로그래밍", "웹개발", "deploy", "replit", "docker", "test", "bug",
+]
+
+def _random_text(rng: random.Random, length: int = 12) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(length))
+
+def _populate(manager: AdvancedContextManager, count: int, seed: int = 7):
+    rng = random.Random(seed)
+
+    async def run():
+        for _ in range(count):
+            await manager._save_to_episodic(
+                {"timestamp": None, "user": _random_text(rng),
+                 "assistant": _random_text(rng), "metadata": {}},
+                importance=0.8
+            )
+    asyncio.run(run())
+
+def _timeit(label: str, fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"{label:<28} {elapsed:8.3f} ms/query")
+    return elapsed
+
+def main(memory_count: int = 10000, query_count: int = 200):
+    print(f"🚀 검색 벤치마크 (메모리 {memory_count}개, numpy={NUMPY_AVAILABLE})\n")
+    rng = random.Random(42)
+    queries = [_random_text(rng, 4) for _ in range(query_count)]
+
+    keyword = AdvancedContextManager(max_episodic_memory=memory_count + 1)
+    _populate(keyword, memory_count)
+
+    vector = AdvancedContextManager(
+        max_episodic_memory=memory_count + 1,
+        embedder=HashingEmbedder(dim=256)
+    )
+    _populate(vector, memory_count)
+
+    _timeit(
+        "keyword overlap (전수 검사)",
+        lambda q: [m for m in keyword.episodic_memory if keyword._is_relevant(q, m.content)],
+        queries
+    )
+    _timeit("inverted index", keyword._search_episodic_index, queries)
+    _timeit("embedding top-k matmul", lambda q: vector._search_episodic_vectors(q, top_k=20), queries)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+스트리밍 응답 벤치마크
+로컬 가짜 업스트림에 대해 첫 청크까지 시간(TTFC)과 초당 청크 수 비교
+(이전 방식: 전체 응답을 받은 뒤 단어로 나눠 3단어마다 0.1초 대기 / 현재: 업스트림 SSE 그대로 전달)
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from claude_client import ClaudeClient
+from test_claude_client import FakeAnthropicServer
+
+async def _simulated_stream(client: ClaudeClient, message: str):
+    """이전 get_streaming_response 동작 재현"""
+    response = await client.get_response(message)
+    for i, word in enumerate(response.split()):
+        yield word + " "
+        if i % 3 == 0:
+            await asyncio.sleep(0.1)
+
+async def _measure(stream):
+    start = time.perf_counter()
+    first = None
+    count = 0
+    async for _ in stream:
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    return first, count, time.perf_counter() - start
+
+async def _run(chunks: int, delay: float):
+    async with FakeAnthropicServer(chunks=chunks, delay=delay) as server:
+        client = ClaudeClient("bench-key", base_url=server.base_url)
+        results = {
+            "simulated (fetch+split)": await _measure(_simulated_stream(client, "안녕")),
+            "upstream streaming": await _measure(client.get_streaming_response("안녕")),
+        }
+        await client.close()
+    return results
+
+def main(chunks: int = 200, delay: float = 0.005):
+    print(f"🚀 스트리밍 벤치마크 ({chunks}청크, 업스트림 청크 간격 {delay * 1000:.0f}ms)\n")
+    results = asyncio.run(_run(chunks, delay))
+    for name, (first, count, total) in results.items():
+        print(f"{name:<26} TTFC {first * 1000:8.1f} ms  전체 {total * 1000:8.1f} ms  ({count / total:7.1f} 청크/초)")
+    simulated_first = results["simulated (fetch+split)"][0]
+    streaming_first = results["upstream streaming"][0]
+    print(f"\nTTFC 단축: {simulated_first / streaming_first:.1f}x")
+
+if __name__ == "__main__":
+    main()
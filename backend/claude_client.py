@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Claude API 클라이언트
+비동기 SDK로 응답을 받고, 스트리밍은 업스트림 토큰이 도착하는 즉시 그대로 흘려보냄
+HTTP 연결 풀(keep-alive)과 동시 요청 제한은 여러 클라이언트가 공유할 수 있음
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
+
+import anthropic
+import httpx
+
+from stream_transformers import StreamTransformerFactory
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "claude-3-opus-4-20250514"
+DEFAULT_MAX_TOKENS = 1024
+
+def create_http_client(max_connections: int = 100, max_keepalive: int = 20, keepalive_expiry: float = 60.0,
+                       timeout: float = 600.0, connect_timeout: float = 5.0):
+    """Claude 호출용 HTTP 연결 풀 (생성이 끝날 때까지 읽기가 이어지므로 읽기 타임아웃은 길게)"""
+    return anthropic.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=anthropic.Timeout(timeout, connect=connect_timeout)
+    )
+
+class InFlightLimiter:
+    """동시에 진행 중인 Claude 요청 수 제한 (0 이하면 제한 없음)"""
+
+    def __init__(self, max_in_flight: int = 32):
+        self.max_in_flight = max_in_flight
+        self._semaphore = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+
+        # 통계
+        self.stats = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "waiting": 0, "queued": 0}
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """요청 하나가 끝날 때까지(스트리밍이면 마지막 청크까지) 자리 하나를 점유"""
+        if self._semaphore is not None:
+            if self._semaphore.locked():
+                self.stats["queued"] += 1
+            self.stats["waiting"] += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.stats["waiting"] -= 1
+
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+        try:
+            yield
+        finally:
+            self.stats["in_flight"] -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "max_in_flight": self.max_in_flight}
+
+class ClaudeClient:
+    def __init__(self, api_key: str, base_url: Optional[str] = None, http_client=None,
+                 limiter: Optional[InFlightLimiter] = None):
+        # base_url: 로컬 가짜 업스트림 등 다른 엔드포인트로 보낼 때 사용 (없으면 ANTHROPIC_BASE_URL)
+        # http_client: create_http_client() 로 만든 공유 연결 풀 (없으면 클라이언트별 풀)
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=http_client)
+        self.limiter = limiter or InFlightLimiter(0)
+        self._owns_http_client = http_client is None
+
+    @staticmethod
+    def _build_request(user_message: str, model: str, context_messages: Optional[List[Dict[str, str]]], system: Optional[str],
+                       max_tokens: int = DEFAULT_MAX_TOKENS) -> Dict[str, Any]:
+        # 컨텍스트 메시지가 있으면 포함
+        messages = []
+        if context_messages:
+            messages.extend(context_messages)
+        messages.append({"role": "user", "content": user_message})
+
+        request = {"model": model, "max_tokens": max_tokens, "messages": messages}
+        if system:
+            request["system"] = system
+        return request
+
+    async def get_response(self, user_message: str, model: str = DEFAULT_MODEL, context_messages: Optional[List[Dict[str, str]]] = None, system: Optional[str] = None,
+                           max_tokens: int = DEFAULT_MAX_TOKENS) -> str:
+        try:
+            request = self._build_request(user_message, model, context_messages, system, max_tokens)
+            async with self.limiter.slot():
+                response = await self.client.messages.create(**request)
+            return response.content[0].text
+        except Exception as e:
+            logger.error(f"Claude API 오류: {str(e)}")
+            return f"Claude API 오류: {str(e)}"
+
+    async def get_streaming_response(self, user_message: str, model: str = DEFAULT_MODEL, context_messages: Optional[List[Dict[str, str]]] = None, system: Optional[str] = None,
+                                     max_tokens: int = DEFAULT_MAX_TOKENS) -> AsyncGenerator[str, None]:
+        """스트리밍 응답 생성 (업스트림 SSE 텍스트 델타를 도착하는 대로 전달)
+
+        소비자가 다음 청크를 요청할 때만 업스트림을 읽으므로, 웹소켓 전송이 느리면
+        읽기가 멈추고 TCP 흐름 제어로 업스트림까지 역압이 전달된다 (내부 버퍼 없음).
+        """
+        request = self._build_request(user_message, model, context_messages, system, max_tokens)
+        try:
+            async with self.limiter.slot(), self.client.messages.stream(**request) as stream:
+                async for text in stream.text_stream:
+                    if text:
+                        yield text
+        except Exception as e:
+            logger.error(f"Claude API 스트리밍 오류: {str(e)}")
+            yield f"Claude API 오류: {str(e)}"
+
+    async def get_transformed_stream(self, user_message: str, transformer_configs: Optional[list[Dict[str, Any]]] = None, model: str = DEFAULT_MODEL, context_messages: Optional[List[Dict[str, str]]] = None, system: Optional[str] = None,
+                                     max_tokens: int = DEFAULT_MAX_TOKENS) -> AsyncGenerator[str, None]:
+        """변환기가 적용된 스트리밍 응답"""
+        # 기본 변환기 설정
+        if transformer_configs is None:
+            transformer_configs = [
+                {"type": "code_format", "language": "python"},
+                {"type": "summary", "summary_ratio": 0.3}
+            ]
+
+        # 파이프라인 생성
+        pipeline = StreamTransformerFactory.create_pipeline(transformer_configs)
+
+        # 원본 스트림 생성
+        original_stream = self.get_streaming_response(user_message, model, context_messages, system, max_tokens)
+
+        # 변환된 스트림 반환
+        async for transformed_chunk in pipeline.process(original_stream):
+            yield transformed_chunk
+
+    async def close(self):
+        """클라이언트 전용 연결 풀만 닫음 (공유 풀은 만든 쪽에서 닫음)"""
+        if self._owns_http_client:
+            await self.client.close()
+
+class ClaudeClientRegistry:
+    """애플리케이션 범위 Claude 클라이언트 - 시작 시 한 번 만들어 모든 웹소켓과 분석기가 공유하고 종료 시 닫음"""
+
+    def __init__(self):
+        self.client: Optional[ClaudeClient] = None
+        self.http_client = None
+        self.limiter: Optional[InFlightLimiter] = None
+
+    def start(self, api_key: Optional[str], base_url: Optional[str] = None, max_connections: int = 100,
+              max_keepalive: int = 20, keepalive_expiry: float = 60.0, max_in_flight: int = 32) -> Optional[ClaudeClient]:
+        """API 키가 있으면 공유 연결 풀과 클라이언트 생성 (이미 시작했으면 기존 클라이언트 반환)"""
+        if self.client is not None or not api_key:
+            return self.client
+        self.http_client = create_http_client(max_connections, max_keepalive, keepalive_expiry)
+        self.limiter = InFlightLimiter(max_in_flight)
+        self.client = ClaudeClient(api_key, base_url=base_url, http_client=self.http_client, limiter=self.limiter)
+        return self.client
+
+    async def shutdown(self):
+        """진행 중인 요청이 끝난 연결을 포함해 공유 연결 풀을 닫음"""
+        client, http_client = self.client, self.http_client
+        self.client = self.http_client = None
+        if client is not None:
+            await client.close()
+        if http_client is not None:
+            await http_client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.client is not None,
+            "requests": self.limiter.get_stats() if self.limiter else {}
+        }
+
+# 전역 Claude 클라이언트 보관소 (FastAPI startup 에서 start, shutdown 에서 닫음)
+claude_registry = ClaudeClientRegistry()
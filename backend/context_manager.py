@@ -3,18 +3,28 @@ import json
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple, Optional, Any
 from dataclasses import dataclass, field
-from collections import deque, defaultdict
+from collections import deque, defaultdict, Counter
+from itertools import islice
 import asyncio
 import re
+import time
 from enum import Enum
-from database_manager import db_manager
+from types import MappingProxyType
+from embedding_index import EmbeddingBackend, VectorIndex
+from summary_worker import SummarizationWorker, summary_worker
+from memory_store import EpisodicStore, effective_importance, effective_importances, rank_by_importance
+from memory_persistence import MemoryPersister, memory_persister, with_working_ids
+from text_features import InteractionFeatures, extract_features
+from time_series import RingSeries
+from topic_graph import TopicTransitionGraph
+from tokenizer import token_counter
+from context_packer import ContextSegment, PackedContext, assemble
+from llm_analyzer import API_ERROR_PREFIX
 
 # Tiktoken 대신 간단한 토큰 카운터 (실제로는 tiktoken 사용 권장)
 def estimate_tokens(text: str) -> int:
-    """대략적인 토큰 수 추정 (실제로는 tiktoken 사용)"""
-    # 대략 4글자 = 1토큰 (영어 기준)
-    # 한글은 보통 2-3글자 = 1토큰
-    return len(text) // 3
+    """토큰 수 계산 (CONTEXT_TOKENIZER 설정, 같은 텍스트는 캐시에서 반환)"""
+    return token_counter.count(text)
 
 class MemoryType(Enum):
     WORKING = "working"      # 현재 대화 (단기)
@@ -22,6 +32,9 @@ class MemoryType(Enum):
     SEMANTIC = "semantic"    # 학습된 지식 (장기)
     PROCEDURAL = "procedural" # 행동 패턴 (장기)
 
+# 메모리 종류별 시간당 중요도 감쇠율 (없으면 감쇠 없음)
+DECAY_RATES = {MemoryType.EPISODIC: 0.1}
+
 @dataclass
 class Memory:
     """개별 메모리 단위"""
@@ -29,17 +42,112 @@ class Memory:
     type: MemoryType
     content: str
     timestamp: datetime
-    importance: float = 0.5
+    importance: float = 0.5  # 기준 중요도 (감쇠 전)
     access_count: int = 0
     last_accessed: datetime = field(default_factory=datetime.now)
     metadata: Dict[str, Any] = field(default_factory=dict)
     embedding: Optional[List[float]] = None  # 벡터 임베딩 (선택)
+    decay_anchor: float = 0.0  # 감쇠 기준 시각 (epoch 초, 기본값은 last_accessed)
+    
+    def __post_init__(self):
+        if not self.decay_anchor:
+            self.decay_anchor = self.last_accessed.timestamp()
+    
+    @property
+    def decay_rate(self) -> float:
+        return DECAY_RATES.get(self.type, 0.0)
+    
+    def effective_importance(self, now: Optional[float] = None) -> float:
+        """읽는 시점의 감쇠 중요도 (저장된 값은 바꾸지 않음)"""
+        now = time.time() if now is None else now
+        return effective_importance(self.importance, self.decay_anchor, now, self.decay_rate)
+    
+    def touch(self, now: Optional[datetime] = None):
+        """접근 기록 (지금까지의 감쇠를 기준 중요도에 반영한 뒤 기준 시각 갱신)"""
+        now = now or datetime.now()
+        now_ts = now.timestamp()
+        self.importance = effective_importance(self.importance, self.decay_anchor, now_ts, self.decay_rate)
+        self.access_count += 1
+        self.last_accessed = now
+        self.decay_anchor = now_ts
     
     def decay_importance(self, current_time: datetime, decay_rate: float = 0.1):
-        """시간에 따른 중요도 감소"""
-        time_diff = (current_time - self.last_accessed).total_seconds() / 3600  # 시간 단위
-        self.importance *= (1 - decay_rate * time_diff)
-        self.importance = max(0.1, self.importance)  # 최소값 유지
+        """시간에 따른 중요도 감소 (현재 감쇠값으로 기준점 이동, 반복 호출해도 누적되지 않음)"""
+        now = current_time.timestamp()
+        self.importance = effective_importance(self.importance, self.decay_anchor, now, decay_rate)
+        self.decay_anchor = now
+
+# 압축 모드 메타데이터 인턴 테이블 (같은 메타데이터는 읽기 전용 객체 하나를 공유)
+_EMPTY_METADATA = MappingProxyType({})
+_METADATA_INTERN: Dict[str, Any] = {}
+_METADATA_INTERN_LIMIT = 4096
+
+def intern_metadata(metadata: Optional[Dict[str, Any]]):
+    """메타데이터를 인턴된 읽기 전용 매핑으로 변환"""
+    if not metadata:
+        return _EMPTY_METADATA
+    try:
+        key = json.dumps(metadata, sort_keys=True, default=str)
+    except TypeError:
+        return MappingProxyType(dict(metadata))
+    interned = _METADATA_INTERN.get(key)
+    if interned is None:
+        interned = MappingProxyType(dict(metadata))
+        if len(_METADATA_INTERN) < _METADATA_INTERN_LIMIT:
+            _METADATA_INTERN[key] = interned
+    return interned
+
+class MemoryRecord:
+    """슬롯 기반 압축 Episodic 메모리 (Memory와 같은 인터페이스)
+    
+    사용자/AI 텍스트를 따로 보관해 json.loads가 필요 없고,
+    시각은 epoch float로, 메타데이터는 인턴된 매핑으로 저장한다.
+    """
+    __slots__ = ("id", "user", "assistant", "created_at", "importance",
+                 "access_count", "decay_anchor", "metadata")
+    
+    type = MemoryType.EPISODIC
+    embedding = None
+    
+    def __init__(self, id: str, user: str, assistant: str, created_at: float,
+                 importance: float = 0.5, access_count: int = 0,
+                 decay_anchor: Optional[float] = None, metadata=None):
+        self.id = id
+        self.user = user
+        self.assistant = assistant
+        self.created_at = created_at
+        self.importance = importance
+        self.access_count = access_count
+        self.decay_anchor = decay_anchor or time.time()
+        self.metadata = intern_metadata(metadata)
+    
+    @property
+    def content(self) -> str:
+        return json.dumps({"user": self.user, "assistant": self.assistant})
+    
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.created_at)
+    
+    @property
+    def last_accessed(self) -> datetime:
+        return datetime.fromtimestamp(self.decay_anchor)
+    
+    @property
+    def decay_rate(self) -> float:
+        return DECAY_RATES.get(MemoryType.EPISODIC, 0.0)
+    
+    def effective_importance(self, now: Optional[float] = None) -> float:
+        """읽는 시점의 감쇠 중요도"""
+        now = time.time() if now is None else now
+        return effective_importance(self.importance, self.decay_anchor, now, self.decay_rate)
+    
+    def touch(self, now: Optional[datetime] = None):
+        """접근 기록 (지금까지의 감쇠를 기준 중요도에 반영한 뒤 기준 시각 갱신)"""
+        now_ts = (now or datetime.now()).timestamp()
+        self.importance = effective_importance(self.importance, self.decay_anchor, now_ts, self.decay_rate)
+        self.access_count += 1
+        self.decay_anchor = now_ts
 
 @dataclass
 class ConversationContext:
@@ -58,35 +166,143 @@ class AdvancedContextManager:
                  max_working_memory: int = 20,
                  max_episodic_memory: int = 100,
                  max_tokens: int = 8000,
-                 compression_threshold: float = 0.7):
+                 compression_threshold: float = 0.7,
+                 embedder: Optional[EmbeddingBackend] = None,
+                 embedding_min_score: float = 0.2,
+                 compact_storage: bool = False,
+                 context_token_budget: int = 3000,
+                 compression_fanout: int = 4,
+                 semantic_memory: Optional[Dict[str, Memory]] = None,
+                 emotion_history: int = 50,
+                 emotion_window: int = 10):
         
         # 메모리 저장소
         self.working_memory = deque(maxlen=max_working_memory)
-        self.episodic_memory: List[Memory] = []
-        self.semantic_memory: Dict[str, Memory] = {}
+        self.episodic_memory = EpisodicStore()
+        self.compact_storage = compact_storage  # Episodic을 MemoryRecord로 저장
+        # Semantic Memory는 같은 사용자의 세션끼리 공유될 수 있음 (semantic_store.acquire)
+        self._shared_semantic = semantic_memory is not None
+        self.semantic_memory: Dict[str, Memory] = semantic_memory if self._shared_semantic else {}
         self.procedural_memory: Dict[str, List[Dict]] = defaultdict(list)
         
         # 설정
         self.max_episodic = max_episodic_memory
         self.max_tokens = max_tokens
         self.compression_threshold = compression_threshold
+        self.context_token_budget = context_token_budget  # Claude 호출당 컨텍스트 토큰 예산
+        self.compression_fanout = compression_fanout  # 같은 레벨 압축 블록이 이만큼 쌓이면 상위 레벨로 병합
+        self.max_summary_chars = 600  # 병합 요약 최대 길이 (LLM 요약 도착 전)
+        self.recency_decay = 0.85  # 대화 턴이 하나 오래될 때마다 곱해지는 가치
         
         # 현재 상태
         self.current_topics = []
-        self.emotional_trajectory = []
+        self.emotion_series = RingSeries(emotion_history)  # (시각, 감정 점수) 링 버퍼
+        self.emotion_window = emotion_window  # 현재 감정 상태 계산에 쓰는 최근 개수
         self.conversation_depth = 0
         self.last_compression = datetime.now()
         
+        # Working Memory 토큰 장부 (추가/제거 시 증분 갱신)
+        self._working_tokens = 0
+        
+        # 컨텍스트 스냅샷 캐시 (메모리 변경 시에만 무효화)
+        self._state_version = 0
+        self._context_cache: Optional[ConversationContext] = None
+        self._context_cache_version = -1
+        self._prompt_cache: Optional[str] = None
+        self._prompt_cache_version = -1
+        
+        # 증분 저장용 변경 추적 (마지막 collect_memory_delta 이후)
+        self.persister: Optional[MemoryPersister] = memory_persister
+        self._working_seq = 0
+        self._dirty_working: set = set()
+        self._dirty_episodic: set = set()
+        self._removed_episodic: set = set()
+        self._dirty_semantic: set = set()
+        
+        # Episodic Memory 역색인 (토큰 -> 메모리 ID)
+        self._episodic_index: Dict[str, set] = defaultdict(set)
+        self._episodic_terms: Dict[str, set] = {}
+        self._episodic_seq = 0
+        
+        # Episodic 검색 결과 메모 (색인 내용이 바뀌면 비움)
+        self._episodic_index_version = 0
+        self._search_memo: Dict[Tuple[str, Optional[int]], List[str]] = {}
+        self._search_memo_version = 0
+        
+        # 임베딩 검색 (선택) - 설정되면 키워드 색인 대신 벡터 top-k 사용
+        self.embedder = embedder
+        self.embedding_min_score = embedding_min_score
+        self._vector_index = VectorIndex(embedder.dim) if embedder else None
+        
         # 패턴 인식
         self.interaction_patterns = {
             "question_types": defaultdict(int),
             "response_preferences": defaultdict(float),
-            "topic_transitions": defaultdict(list)
+            "topic_transitions": TopicTransitionGraph()  # 크기 제한 전환 카운터
         }
         
         # LLM 분석기 (선택적)
         self.llm_analyzer = None
         
+        # 백그라운드 요약 워커 (압축 요약을 요청 경로 밖에서 생성)
+        self.summary_worker: Optional[SummarizationWorker] = summary_worker
+        self._compression_seq = 0
+        self._defer_summaries = False  # 일괄 가져오기 중에는 LLM 요약 생략
+        
+        # 응답 생성 중 미리 계산한 값 (prefetch)
+        self._speculation: Optional[Dict[str, Any]] = None
+        # 다음 검색의 후보 풀 (상태 버전과 주제 스택이 같을 때만 재사용)
+        self._retrieval_pool: Optional[Dict[str, Any]] = None
+    
+    @property
+    def working_tokens(self) -> int:
+        """Working Memory의 현재 토큰 합계 (읽기 전용)"""
+        return self._working_tokens
+    
+    def _mark_dirty(self):
+        """Working/Episodic/Semantic Memory 변경 표시 (스냅샷 캐시 무효화)"""
+        self._state_version += 1
+    
+    def _assign_working_id(self, item: Dict):
+        """Working Memory 항목 ID 부여 및 변경 표시"""
+        if "id" not in item:
+            self._working_seq += 1
+            item["id"] = f"wm_{datetime.now().timestamp()}_{self._working_seq}"
+        self._dirty_working.add(item["id"])
+    
+    def _append_working(self, item: Dict):
+        """Working Memory 뒤에 추가 (가득 차면 압축 블록이 아닌 가장 오래된 원본 대화를 밀어냄)"""
+        self._assign_working_id(item)
+        if self._working_full():
+            # deque 자동 밀어내기는 맨 앞(가장 높은 레벨의 압축 블록)을 지우므로 직접 제거
+            prefix = self._compressed_prefix_length()
+            index = prefix if prefix < len(self.working_memory) else 0
+            self._working_tokens -= self.working_memory[index].get("tokens", 0)
+            del self.working_memory[index]
+        self.working_memory.append(item)
+        self._working_tokens += item.get("tokens", 0)
+        self._mark_dirty()
+    
+    def _working_full(self) -> bool:
+        maxlen = self.working_memory.maxlen
+        return maxlen is not None and len(self.working_memory) >= maxlen
+    
+    def _replace_working_range(self, start: int, count: int, item: Dict) -> List[Dict]:
+        """Working Memory의 연속 구간을 항목 하나로 교체하고 제거된 항목 반환"""
+        self._assign_working_id(item)
+        items = list(self.working_memory)
+        removed = items[start:start + count]
+        self.working_memory.clear()
+        self.working_memory.extend(items[:start] + [item] + items[start + count:])
+        self._working_tokens += item.get("tokens", 0) - sum(r.get("tokens", 0) for r in removed)
+        self._mark_dirty()
+        return removed
+    
+    def _recount_working_tokens(self):
+        """토큰 장부 전체 재계산 (복원 시에만 사용)"""
+        self._working_tokens = sum(item.get("tokens", 0) for item in self.working_memory)
+        self._mark_dirty()
+        
     async def add_interaction(self, 
                             user_message: str, 
                             ai_response: str,
@@ -94,46 +310,131 @@ class AdvancedContextManager:
                             session_id: str = None) -> ConversationContext:
         """새로운 상호작용 추가 및 처리"""
         
+        # 1-7. 메모리 반영 (사용자 메시지 특징은 한 번만 추출해 이후 단계가 공유)
+        await self._ingest_interaction(
+            user_message, ai_response, metadata,
+            features=extract_features(user_message),
+            tokens=estimate_tokens(user_message) + estimate_tokens(ai_response),
+            timestamp=datetime.now()
+        )
+        
+        # 8. 🗄️ 변경분만 증분으로 기록 (배치 간격/크기에 따라 백그라운드 저장)
+        if session_id and self.persister:
+            self.persister.record(session_id, self.collect_memory_delta(), self.export_memory_state)
+            await self.persister.maybe_flush()
+        else:
+            self._clear_dirty_tracking()  # 저장하지 않으면 변경 표시가 쌓이지 않도록
+        
+        # 9. 다음 턴 준비 (검색 후보 풀, 스냅샷, 시스템 프롬프트) 후 현재 컨텍스트 반환
+        return self._prepare_next_turn()
+    
+    def _prepare_next_turn(self) -> ConversationContext:
+        """상호작용 반영 직후 다음 검색 후보 풀과 컨텍스트 스냅샷을 미리 구성"""
+        self._retrieval_candidates()
+        self.get_system_prompt_context()
+        return self._build_current_context()
+    
+    def _retrieval_candidates(self) -> Dict[str, Any]:
+        """검색 1단계 후보(최근 Working 항목)와 본문 단어 집합
+        
+        상태 버전과 주제 스택이 같으면 풀을 그대로 쓰고, 아니면 풀을 다시 만들되
+        내용이 바뀌지 않은 항목의 단어 집합은 이전 풀에서 가져온다.
+        """
+        key = (self._state_version, tuple(self.current_topics))
+        pool = self._retrieval_pool
+        if pool is not None and pool["key"] == key:
+            return pool
+        
+        known = {item.get("id"): (content, words) for item, content, words in pool["working"]} if pool else {}
+        working = []
+        for item in list(self.working_memory)[-10:]:
+            content = item["user"] + item["assistant"]
+            cached = known.get(item.get("id"))
+            words = cached[1] if cached and cached[0] == content else set(content.lower().split())
+            working.append((item, content, words))
+        
+        self._retrieval_pool = {"key": key, "working": working}
+        return self._retrieval_pool
+    
+    async def add_interactions(self,
+                               turns: List[Tuple[str, str, Optional[Dict]]],
+                               session_id: str = None) -> ConversationContext:
+        """과거 대화 기록 일괄 반영 (대화 로그 재생/대량 가져오기용)
+        
+        turns는 (사용자 메시지, AI 응답, 메타데이터) 목록이며, 메타데이터의
+        "timestamp"(datetime 또는 ISO 문자열)가 있으면 그 시각으로 기록한다.
+        특징 추출과 토큰 계산은 먼저 한 번에 수행하고, 압축 블록의 LLM 요약은
+        요청하지 않으며(기본 요약 사용), 저장은 마지막에 스냅샷 한 번만 한다.
+        """
+        if not turns:
+            return self._build_current_context()
+        
+        features = [extract_features(user_message) for user_message, _, _ in turns]
+        tokens = [estimate_tokens(user_message) + estimate_tokens(ai_response) for user_message, ai_response, _ in turns]
+        now = datetime.now()
+        
+        self._defer_summaries = True
+        try:
+            for (user_message, ai_response, metadata), turn_features, turn_tokens in zip(turns, features, tokens):
+                metadata = dict(metadata or {})
+                timestamp = metadata.pop("timestamp", now)
+                if isinstance(timestamp, str):
+                    timestamp = datetime.fromisoformat(timestamp)
+                await self._ingest_interaction(
+                    user_message, ai_response, metadata,
+                    features=turn_features, tokens=turn_tokens, timestamp=timestamp
+                )
+        finally:
+            self._defer_summaries = False
+        
+        if session_id and self.persister:
+            await self.persister.save_snapshot(session_id, self.export_memory_state())
+        self._clear_dirty_tracking()
+        
+        return self._prepare_next_turn()
+    
+    async def _ingest_interaction(self, user_message: str, ai_response: str,
+                                  metadata: Optional[Dict], features: InteractionFeatures,
+                                  tokens: int, timestamp: datetime):
+        """상호작용 하나를 각 메모리 계층에 반영 (저장/컨텍스트 구성 제외)"""
         # 1. Working Memory에 추가
         interaction = {
-            "timestamp": datetime.now(),
+            "timestamp": timestamp,
             "user": user_message,
             "assistant": ai_response,
             "metadata": metadata or {},
-            "tokens": estimate_tokens(user_message + ai_response)
+            "tokens": tokens
         }
-        self.working_memory.append(interaction)
+        self._append_working(interaction)
         
         # 2. 중요도 평가
-        importance = self._calculate_importance(user_message, ai_response, metadata)
+        importance = self._calculate_importance(
+            user_message, ai_response, metadata, features,
+            is_new_topic=self._speculated_new_topic(user_message)
+        )
         
         # 3. 중요한 순간은 Episodic Memory로
         if importance > 0.7:
             await self._save_to_episodic(interaction, importance)
         
         # 4. 패턴 학습
-        self._learn_patterns(user_message, ai_response)
+        self._learn_patterns(features, ai_response)
         
         # 5. 주제 추적
-        self._track_topics(user_message, ai_response)
+        self._track_topics(features)
         
         # 6. 감정 궤적 추적
-        self._track_emotions(ai_response, metadata)
+        self._track_emotions(ai_response, metadata, timestamp)
         
         # 7. 컨텍스트 압축 필요 여부 확인
         if self._needs_compression():
             await self._compress_context()
-        
-        # 8. 🗄️ Replit Database에 컨텍스트 메모리 저장
-        if session_id:
-            memory_state = self.export_memory_state()
-            db_manager.save_context_memory(session_id, memory_state)
-        
-        # 9. 현재 컨텍스트 반환
-        return self._build_current_context()
     
-    def _calculate_importance(self, user_msg: str, ai_response: str, metadata: Dict) -> float:
+    def _calculate_importance(self, user_msg: str, ai_response: str, metadata: Dict,
+                              features: Optional[InteractionFeatures] = None,
+                              is_new_topic: Optional[bool] = None) -> float:
         """상호작용의 중요도 계산"""
+        features = features or extract_features(user_msg)
         importance = 0.5  # 기본값
         
         # 길이 기반 (긴 대화일수록 중요)
@@ -149,19 +450,21 @@ class AdvancedContextManager:
             importance += 0.3
         
         # 새로운 주제 도입
-        if self._is_new_topic(user_msg):
+        if is_new_topic is None:
+            is_new_topic = self._is_new_topic(features)
+        if is_new_topic:
             importance += 0.2
         
         # 질문 유형 (심층 질문일수록 중요)
-        if any(word in user_msg.lower() for word in ["why", "how", "feel", "think"]):
+        if features.is_deep_question:
             importance += 0.15
         
         return min(1.0, importance)
     
-    def _is_new_topic(self, message: str) -> bool:
+    def _is_new_topic(self, features: InteractionFeatures) -> bool:
         """새로운 주제인지 확인"""
         # 간단한 구현 - 실제로는 더 정교한 NLP 필요
-        keywords = set(message.lower().split())
+        keywords = features.token_set
         if not self.current_topics:
             return True
         
@@ -174,19 +477,32 @@ class AdvancedContextManager:
     
     async def _save_to_episodic(self, interaction: Dict, importance: float):
         """Episodic Memory에 저장"""
-        memory = Memory(
-            id=f"ep_{datetime.now().timestamp()}",
-            type=MemoryType.EPISODIC,
-            content=json.dumps({
-                "user": interaction["user"],
-                "assistant": interaction["assistant"]
-            }),
-            timestamp=interaction["timestamp"],
-            importance=importance,
-            metadata=interaction["metadata"]
-        )
+        self._episodic_seq += 1
+        memory_id = f"ep_{datetime.now().timestamp()}_{self._episodic_seq}"
+        if self.compact_storage:
+            memory = MemoryRecord(
+                id=memory_id,
+                user=interaction["user"],
+                assistant=interaction["assistant"],
+                created_at=interaction["timestamp"].timestamp(),
+                importance=importance,
+                metadata=interaction["metadata"]
+            )
+        else:
+            memory = Memory(
+                id=memory_id,
+                type=MemoryType.EPISODIC,
+                content=json.dumps({
+                    "user": interaction["user"],
+                    "assistant": interaction["assistant"]
+                }),
+                timestamp=interaction["timestamp"],
+                importance=importance,
+                metadata=interaction["metadata"]
+            )
         
         self.episodic_memory.append(memory)
+        self._index_episodic(memory)
         
         # 크기 제한 관리
         if len(self.episodic_memory) > self.max_episodic:
@@ -195,64 +511,164 @@ class AdvancedContextManager:
     
     def _cleanup_episodic_memory(self):
         """오래되고 덜 중요한 메모리 정리"""
-        current_time = datetime.now()
-        
-        # 모든 메모리의 중요도 재계산 (시간 감쇠 적용)
-        for memory in self.episodic_memory:
-            memory.decay_importance(current_time)
-        
-        # 중요도 기준 정렬 후 하위 20% 제거
-        self.episodic_memory.sort(key=lambda m: m.importance, reverse=True)
+        # 감쇠 중요도 힙에서 하위 20% 제거 (전체 재정렬 없음)
         cutoff = int(self.max_episodic * 0.8)
+        evicted = self.episodic_memory.pop_lowest(len(self.episodic_memory) - cutoff)
         
-        # 제거되는 메모리 중 일부는 Semantic으로 추상화
-        for memory in self.episodic_memory[cutoff:]:
-            self._abstract_to_semantic(memory)
+        for memory in evicted:
+            self._unindex_episodic(memory.id)
         
-        self.episodic_memory = self.episodic_memory[:cutoff]
+        # 제거되는 메모리는 주제별로 묶어 Semantic으로 추상화
+        self._abstract_to_semantic_batch(evicted)
+    
+    def _dialogue(self, memory) -> Tuple[str, str]:
+        """Episodic 메모리의 (사용자, AI) 텍스트 (압축 레코드는 파싱 없음)"""
+        if isinstance(memory, MemoryRecord):
+            return memory.user, memory.assistant
+        content = json.loads(memory.content)
+        return content["user"], content["assistant"]
+    
+    def _memory_terms(self, memory: Memory) -> set:
+        """메모리 본문의 색인 토큰 집합"""
+        try:
+            text = " ".join(self._dialogue(memory))
+        except (ValueError, TypeError, KeyError):
+            text = memory.content
+        return set(text.lower().split())
+    
+    def _index_episodic(self, memory: Memory):
+        """Episodic Memory를 역색인에 등록"""
+        terms = self._memory_terms(memory)
+        self._mark_dirty()
+        self._episodic_index_version += 1
+        self._dirty_episodic.add(memory.id)
+        self._removed_episodic.discard(memory.id)
+        self._episodic_terms[memory.id] = terms
+        for term in terms:
+            self._episodic_index[term].add(memory.id)
+        
+        if self._vector_index is not None:
+            # 미리 계산된 임베딩이 있으면 그대로 사용
+            vector = memory.embedding or self.embedder.embed(" ".join(terms))
+            self._vector_index.add(memory.id, vector)
+    
+    def _unindex_episodic(self, memory_id: str):
+        """역색인에서 Episodic Memory 제거"""
+        self._mark_dirty()
+        self._episodic_index_version += 1
+        self._dirty_episodic.discard(memory_id)
+        self._removed_episodic.add(memory_id)
+        if self._vector_index is not None:
+            self._vector_index.remove(memory_id)
+        for term in self._episodic_terms.pop(memory_id, ()):
+            postings = self._episodic_index.get(term)
+            if postings is not None:
+                postings.discard(memory_id)
+                if not postings:
+                    del self._episodic_index[term]
+    
+    def _rebuild_episodic_index(self):
+        """역색인 전체 재구축 (복원 시에만 사용)"""
+        self._episodic_index_version += 1
+        self._episodic_index = defaultdict(set)
+        self._episodic_terms = {}
+        if self._vector_index is not None:
+            self._vector_index.clear()
+        for memory in self.episodic_memory:
+            self._index_episodic(memory)
+    
+    def _search_episodic_index(self, query: str, threshold: float = 0.3) -> List[Memory]:
+        """역색인으로 쿼리와 토큰을 공유하는 후보만 채점"""
+        query_words = set(query.lower().split())
+        if not query_words:
+            return []
+        
+        hits: Dict[str, int] = defaultdict(int)
+        for word in query_words:
+            for memory_id in self._episodic_index.get(word, ()):
+                hits[memory_id] += 1
+        
+        return [
+            self.episodic_memory.get(memory_id)
+            for memory_id, count in hits.items()
+            if count / len(query_words) > threshold
+        ]
+    
+    def _search_episodic(self, query: str, top_k: int) -> List[Memory]:
+        """임베딩 top-k 또는 역색인 후보 검색 (색인이 그대로면 같은 검색의 이전 결과 재사용)"""
+        use_vectors = self._vector_index is not None
+        if self._search_memo_version != self._episodic_index_version:
+            self._search_memo.clear()
+            self._search_memo_version = self._episodic_index_version
+        
+        key = (query, top_k if use_vectors else None)
+        memory_ids = self._search_memo.get(key)
+        if memory_ids is None:
+            if use_vectors:
+                found = self._search_episodic_vectors(query, top_k=top_k)
+            else:
+                found = self._search_episodic_index(query)
+            if len(self._search_memo) >= 64:
+                self._search_memo.clear()
+            memory_ids = self._search_memo[key] = [memory.id for memory in found]
+        return [self.episodic_memory.get(memory_id) for memory_id in memory_ids]
+    
+    def _search_episodic_vectors(self, query: str, top_k: int) -> List[Memory]:
+        """임베딩 행렬 한 번의 곱으로 top-k 후보 검색"""
+        query_vector = self.embedder.embed(query)
+        return [
+            self.episodic_memory.get(memory_id)
+            for memory_id, _ in self._vector_index.search(
+                query_vector, top_k=top_k, min_score=self.embedding_min_score
+            )
+        ]
     
     def _abstract_to_semantic(self, memory: Memory):
         """Episodic을 Semantic으로 추상화"""
-        try:
-            content = json.loads(memory.content)
-            
-            # 주제 추출 (간단한 구현)
-            topic = self._extract_topic(content["user"])
-            
-            # Semantic Memory 업데이트
+        self._abstract_to_semantic_batch([memory])
+    
+    def _abstract_to_semantic_batch(self, memories: List[Memory]):
+        """Episodic 묶음을 주제별로 모아 Semantic으로 한 번에 추상화"""
+        grouped: Dict[str, List[Memory]] = defaultdict(list)
+        for memory in memories:
+            try:
+                user_text, _ = self._dialogue(memory)
+                
+                # 주제 추출 (간단한 구현)
+                grouped[self._extract_topic(user_text)].append(memory)
+            except Exception as e:
+                print(f"Semantic abstraction error: {e}")
+        
+        for topic, group in grouped.items():
             if topic not in self.semantic_memory:
                 self.semantic_memory[topic] = Memory(
                     id=f"sem_{topic}",
                     type=MemoryType.SEMANTIC,
                     content=f"User frequently discusses: {topic}",
-                    timestamp=memory.timestamp,
+                    timestamp=group[0].timestamp,
                     importance=0.5
                 )
+                reinforcements = len(group) - 1
             else:
-                # 기존 semantic 강화
-                self.semantic_memory[topic].importance += 0.1
-                self.semantic_memory[topic].access_count += 1
-                
-        except Exception as e:
-            print(f"Semantic abstraction error: {e}")
+                reinforcements = len(group)
+            
+            # 기존 semantic 강화
+            self.semantic_memory[topic].importance += 0.1 * reinforcements
+            self.semantic_memory[topic].access_count += reinforcements
+            self._dirty_semantic.add(topic)
+        
+        if grouped:
+            self._mark_dirty()
     
     def _extract_topic(self, text: str) -> str:
         """텍스트에서 주제 추출 (간단한 구현)"""
         # 실제로는 NLP 모델 사용 권장
-        words = text.lower().split()
-        # 불용어 제거
-        stopwords = {"the", "is", "at", "which", "on", "a", "an", "and", "or", "but"}
-        keywords = [w for w in words if w not in stopwords and len(w) > 3]
-        
-        if keywords:
-            return keywords[0]  # 가장 첫 번째 의미있는 단어
-        return "general"
+        return extract_features(text).topic
     
-    def _learn_patterns(self, user_msg: str, ai_response: str):
+    def _learn_patterns(self, features: InteractionFeatures, ai_response: str):
         """사용자 패턴 학습"""
         # 질문 유형 추적
-        question_type = self._classify_question(user_msg)
-        self.interaction_patterns["question_types"][question_type] += 1
+        self.interaction_patterns["question_types"][features.question_type] += 1
         
         # 선호 응답 길이 추적
         response_length = len(ai_response)
@@ -265,27 +681,16 @@ class AdvancedContextManager:
     
     def _classify_question(self, text: str) -> str:
         """질문 분류"""
-        text_lower = text.lower()
-        
-        if any(w in text_lower for w in ["what", "which", "who", "where", "when"]):
-            return "factual"
-        elif any(w in text_lower for w in ["why", "how"]):
-            return "explanatory"
-        elif any(w in text_lower for w in ["feel", "think", "believe", "opinion"]):
-            return "subjective"
-        elif "?" in text:
-            return "yes_no"
-        else:
-            return "statement"
+        return extract_features(text).question_type
     
-    def _track_topics(self, user_msg: str, ai_response: str):
+    def _track_topics(self, features: InteractionFeatures):
         """주제 추적"""
         # 현재 주제 추출
-        current_topic = self._extract_topic(user_msg)
+        current_topic = features.topic
         
         if self.current_topics and self.current_topics[-1] != current_topic:
             # 주제 전환 기록
-            self.interaction_patterns["topic_transitions"][self.current_topics[-1]].append(current_topic)
+            self.interaction_patterns["topic_transitions"].record(self.current_topics[-1], current_topic)
         
         self.current_topics.append(current_topic)
         
@@ -293,7 +698,61 @@ class AdvancedContextManager:
         if len(self.current_topics) > 10:
             self.current_topics = self.current_topics[-10:]
     
-    def _track_emotions(self, ai_response: str, metadata: Dict):
+    async def prefetch(self, user_message: str):
+        """모델이 응답을 생성하는 동안 응답과 무관한 다음 단계 값을 미리 계산
+        
+        add_interaction이 재사용하는 사용자 메시지 특징(캐시), 토큰 수(캐시), 새 주제
+        여부와 함께, 다음 검색의 후보 풀(최근 Working 항목의 단어 집합)과 이 메시지
+        다음에 올 것으로 예측되는 주제의 Episodic 검색 결과를 준비한다. 응답이 도착하면
+        add_interaction이 바뀐 항목만 다시 계산해 풀을 갱신하고 스냅샷을 미리 구성한다.
+        """
+        try:
+            features = extract_features(user_message)
+            estimate_tokens(user_message)
+            self._speculation = {
+                "message": user_message,
+                "recent_topics": tuple(self.current_topics[-3:]),
+                "is_new_topic": self._is_new_topic(features)
+            }
+            self._retrieval_candidates()
+            await asyncio.sleep(0)
+            
+            # 이번 턴이 끝나면 주제 스택 맨 위가 이 메시지의 주제가 된다
+            self._predicted_memories_after(features.topic)
+        except Exception as e:
+            print(f"Prefetch error: {e}")
+    
+    def _speculated_new_topic(self, user_message: str) -> Optional[bool]:
+        """prefetch 결과가 여전히 유효하면 새 주제 여부 반환 (한 번만 사용)"""
+        speculation, self._speculation = self._speculation, None
+        if (speculation and speculation["message"] == user_message
+                and speculation["recent_topics"] == tuple(self.current_topics[-3:])):
+            return speculation["is_new_topic"]
+        return None
+    
+    def predict_next_topics(self, k: int = 3) -> List[Tuple[str, float]]:
+        """현재 주제 다음에 나올 가능성이 높은 주제와 추정 확률"""
+        if not self.current_topics:
+            return []
+        return self.interaction_patterns["topic_transitions"].predict_next(self.current_topics[-1], k)
+    
+    def get_predicted_memories(self, k: int = 3, per_topic: int = 2) -> List[Memory]:
+        """예측된 다음 주제의 기억 (다음 메시지 전에 미리 준비, 접근 기록은 남기지 않음)"""
+        if not self.current_topics:
+            return []
+        return self._predicted_memories_after(self.current_topics[-1], k, per_topic)
+    
+    def _predicted_memories_after(self, topic: str, k: int = 3, per_topic: int = 2) -> List[Memory]:
+        """주어진 주제 다음에 올 것으로 예측되는 주제들의 Semantic/Episodic 기억"""
+        memories = []
+        for next_topic, _ in self.interaction_patterns["topic_transitions"].predict_next(topic, k):
+            if next_topic in self.semantic_memory:
+                memories.append(self.semantic_memory[next_topic])
+            candidates = self._search_episodic(next_topic, top_k=per_topic)
+            memories.extend(rank_by_importance(candidates, limit=per_topic))
+        return memories
+    
+    def _track_emotions(self, ai_response: str, metadata: Dict, timestamp: Optional[datetime] = None):
         """감정 궤적 추적"""
         emotion_score = 0.5  # 기본값
         
@@ -305,74 +764,193 @@ class AdvancedContextManager:
             negative = emotions.get("hesitation", 0)
             emotion_score = 0.5 + (positive - negative) * 0.5
         
-        self.emotional_trajectory.append({
-            "timestamp": datetime.now(),
-            "score": emotion_score
-        })
-        
-        # 최근 50개만 유지
-        if len(self.emotional_trajectory) > 50:
-            self.emotional_trajectory = self.emotional_trajectory[-50:]
+        # 고정 크기 링 버퍼라 오래된 값은 자동으로 덮어씀
+        self.emotion_series.append(emotion_score, (timestamp or datetime.now()).timestamp())
     
     def _needs_compression(self) -> bool:
         """압축 필요 여부 확인"""
-        # 토큰 수 계산
-        total_tokens = sum(item["tokens"] for item in self.working_memory)
+        # 토큰 수 (증분 장부 사용)
+        total_tokens = self._working_tokens
         
         # 시간 기반 (10분마다)
         time_since_compression = (datetime.now() - self.last_compression).seconds > 600
         
-        return total_tokens > self.max_tokens * self.compression_threshold or time_since_compression
+        # 개수 기반 (가득 차면 원본 대화가 밀려나기 전에 압축 블록으로 접음)
+        return (total_tokens > self.max_tokens * self.compression_threshold
+                or time_since_compression or self._working_full())
     
     async def _compress_context(self):
-        """컨텍스트 압축"""
-        if len(self.working_memory) < 5:
+        """컨텍스트 압축 (LLM 요약은 백그라운드에서 채워짐)
+        
+        압축 블록은 Working Memory 앞쪽에 오래된 순(상위 레벨 먼저)으로 모여 있다.
+        가장 오래된 원본 10개를 레벨 1 블록으로 접고, 같은 레벨 블록이
+        compression_fanout개 쌓이면 상위 레벨 블록으로 병합해 블록 수를 로그 규모로 유지한다.
+        """
+        prefix = self._compressed_prefix_length()
+        messages_to_compress = list(islice(self.working_memory, prefix, prefix + 10))  # 오래된 원본 10개
+        if len(messages_to_compress) < 5:
             return  # 너무 적으면 압축 불필요
         
-        # Working Memory를 요약
-        messages_to_compress = list(self.working_memory)[:10]  # 오래된 10개
+        # 즉시 사용할 기본 요약 (LLM 요약이 도착하면 교체)
+        compressed_memory = self._create_compressed_block(
+            messages_to_compress,
+            self._generate_fallback_summary(messages_to_compress),
+            level=1
+        )
         
-        # 요약 생성 (실제로는 LLM 사용)
-        summary = self._generate_summary(messages_to_compress)
+        # 오래된 메시지를 요약으로 대체 (기존 블록 뒤)
+        self._replace_working_range(prefix, len(messages_to_compress), compressed_memory)
+        self.last_compression = datetime.now()
         
-        # 압축된 메모리 생성
-        compressed_memory = {
-            "timestamp": messages_to_compress[0]["timestamp"],
-            "user": f"[Compressed: {len(messages_to_compress)} messages]",
+        self._schedule_summary(compressed_memory, messages_to_compress)
+        self._rollup_compressed_blocks()
+    
+    def _compressed_prefix_length(self) -> int:
+        """Working Memory 앞쪽에 연속된 압축 블록 수"""
+        count = 0
+        for item in self.working_memory:
+            if not item.get("metadata", {}).get("compressed", False):
+                break
+            count += 1
+        return count
+    
+    def _create_compressed_block(self, sources: List[Dict], summary: str, level: int) -> Dict:
+        """원본 메시지나 하위 블록을 대표하는 압축 항목 생성"""
+        self._compression_seq += 1
+        original_count = sum(
+            s["metadata"].get("original_count", 1) if s.get("metadata", {}).get("compressed") else 1
+            for s in sources
+        )
+        source_tokens = sum(
+            s.get("metadata", {}).get("source_tokens", s.get("tokens", 0)) for s in sources
+        )
+        return {
+            "timestamp": sources[0]["timestamp"],
+            "user": f"[Compressed: {original_count} messages]",
             "assistant": summary,
-            "metadata": {"compressed": True, "original_count": len(messages_to_compress)},
+            "metadata": {
+                "compressed": True,
+                "level": level,
+                "original_count": original_count,
+                "source_tokens": source_tokens,
+                "block_id": f"cmp_{datetime.now().timestamp()}_{self._compression_seq}",
+                "summary_pending": False
+            },
             "tokens": estimate_tokens(summary)
         }
-        
-        # 오래된 메시지 제거하고 요약으로 대체
-        for _ in range(len(messages_to_compress)):
-            self.working_memory.popleft()
-        
-        self.working_memory.appendleft(compressed_memory)
-        self.last_compression = datetime.now()
+    
+    def _rollup_compressed_blocks(self):
+        """같은 레벨 블록이 compression_fanout개 이상이면 가장 오래된 것부터 상위 레벨로 병합"""
+        while True:
+            blocks = list(islice(self.working_memory, 0, self._compressed_prefix_length()))
+            positions: Dict[int, List[int]] = defaultdict(list)
+            for index, block in enumerate(blocks):
+                positions[block["metadata"].get("level", 1)].append(index)
+            
+            full_levels = [level for level, indexes in positions.items()
+                           if len(indexes) >= self.compression_fanout]
+            if not full_levels:
+                return
+            
+            # 레벨은 앞쪽일수록 높으므로 같은 레벨 블록은 연속 구간을 이룬다
+            level = min(full_levels)
+            start = positions[level][0]
+            children = blocks[start:start + self.compression_fanout]
+            merged = self._create_compressed_block(
+                children, self._merge_fallback_summary(children), level=level + 1
+            )
+            
+            # 병합된 하위 블록의 대기 중인 요약 작업은 실행 직전에 건너뛴다
+            self._replace_working_range(start, len(children), merged)
+            self._schedule_summary(merged, children)
+    
+    def _merge_fallback_summary(self, blocks: List[Dict]) -> str:
+        """하위 블록 요약들을 길이 제한 안에서 이어 붙인 기본 요약"""
+        per_block = max(self.max_summary_chars // len(blocks), 1)
+        total = sum(b["metadata"].get("original_count", 1) for b in blocks)
+        parts = " | ".join(b["assistant"][:per_block] for b in blocks)
+        return f"Earlier conversation ({total} exchanges): {parts}"
+    
+    def get_compression_stats(self) -> Dict[str, Any]:
+        """압축 블록 통계 (레벨별 개수, 원본 대비 압축률)"""
+        blocks = [item for item in self.working_memory
+                  if item.get("metadata", {}).get("compressed", False)]
+        source_tokens = sum(b["metadata"].get("source_tokens", b.get("tokens", 0)) for b in blocks)
+        compressed_tokens = sum(b.get("tokens", 0) for b in blocks)
+        return {
+            "blocks": len(blocks),
+            "levels": dict(Counter(b["metadata"].get("level", 1) for b in blocks)),
+            "compressed_messages": sum(b["metadata"].get("original_count", 0) for b in blocks),
+            "source_tokens": source_tokens,
+            "compressed_tokens": compressed_tokens,
+            "compression_ratio": round(source_tokens / compressed_tokens, 2) if compressed_tokens else 1.0
+        }
+    
+    def _schedule_summary(self, entry: Dict, source_messages: List[Dict]):
+        """압축 항목의 LLM 요약을 백그라운드 워커에 등록"""
+        if self._defer_summaries or not (self.llm_analyzer and self.summary_worker):
+            return
+        
+        # LLMAnalyzer는 role/content 형식의 메시지를 받음
+        conversation = self._working_to_messages(source_messages)
+        block_id = entry["metadata"]["block_id"]
+        analyzer = self.llm_analyzer
+        accepted = self.summary_worker.submit(
+            key=(id(self), block_id),
+            summarize=lambda: analyzer.generate_intelligent_summary(conversation),
+            on_done=lambda summary: self._apply_summary(block_id, summary),
+            # 롤업으로 병합되었거나 밀려난 블록은 LLM을 호출하지 않음
+            is_current=lambda: self._find_compressed_block(block_id) is not None
+        )
+        entry["metadata"]["summary_pending"] = accepted
+    
+    def _find_compressed_block(self, block_id: str) -> Optional[Dict]:
+        """Working Memory 앞쪽 압축 블록 중 block_id 항목"""
+        for item in islice(self.working_memory, 0, self._compressed_prefix_length()):
+            if item["metadata"].get("block_id") == block_id:
+                return item
+        return None
+    
+    def _apply_summary(self, block_id: str, summary: str):
+        """도착한 LLM 요약으로 압축 항목을 제자리에서 교체"""
+        item = self._find_compressed_block(block_id)
+        if item is None:
+            return  # 이미 병합되었거나 밀려난 항목이면 결과를 버린다
+        
+        metadata = item["metadata"]
+        metadata["summary_pending"] = False
+        if not summary or summary.startswith(API_ERROR_PREFIX):
+            return  # API 오류 문자열로 기본 요약을 덮어쓰지 않음
+        
+        new_tokens = estimate_tokens(summary)
+        self._working_tokens += new_tokens - item.get("tokens", 0)
+        item["assistant"] = summary
+        item["tokens"] = new_tokens
+        self._dirty_working.add(item["id"])
+        self._mark_dirty()
     
     def _generate_summary(self, messages: List[Dict]) -> str:
-        """메시지 요약 생성 (LLM 기반)"""
-        # LLM 분석기가 있으면 사용, 없으면 기본 요약
-        if hasattr(self, 'llm_analyzer') and self.llm_analyzer:
+        """메시지 요약 생성 (이벤트 루프 밖에서만 LLM 직접 호출)"""
+        if not self.llm_analyzer:
+            return self._generate_fallback_summary(messages)
+        
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
             try:
-                # 비동기 함수를 동기적으로 실행
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    # 이미 실행 중인 루프가 있으면 새 태스크 생성
-                    task = asyncio.create_task(self.llm_analyzer.generate_intelligent_summary(messages))
-                    # 간단한 폴백을 위해 즉시 반환
-                    return f"LLM 요약 생성 중... (이전 {len(messages)}개 대화)"
-                else:
-                    summary = loop.run_until_complete(
-                        self.llm_analyzer.generate_intelligent_summary(messages)
-                    )
+                summary = asyncio.run(
+                    self.llm_analyzer.generate_intelligent_summary(self._working_to_messages(messages))
+                )
+                if summary and not summary.startswith(API_ERROR_PREFIX):
                     return summary
+                return self._generate_fallback_summary(messages)
             except Exception as e:
                 print(f"LLM 요약 오류: {e}")
                 return self._generate_fallback_summary(messages)
-        else:
-            return self._generate_fallback_summary(messages)
+        
+        # 실행 중인 루프 안에서는 요청 경로를 막지 않도록 기본 요약 사용
+        # (압축 블록의 LLM 요약은 _schedule_summary가 백그라운드로 처리)
+        return self._generate_fallback_summary(messages)
     
     def _generate_fallback_summary(self, messages: List[Dict]) -> str:
         """기본 요약 생성 (LLM 없을 때)"""
@@ -387,16 +965,12 @@ class AdvancedContextManager:
             return f"Previous {len(messages)} exchanges about various topics."
     
     def _build_current_context(self) -> ConversationContext:
-        """현재 컨텍스트 구축"""
+        """현재 컨텍스트 구축 (메모리 변경이 없으면 캐시된 스냅샷 공유, 수정 금지)"""
+        if self._context_cache is not None and self._context_cache_version == self._state_version:
+            return self._context_cache
+        
         # Working Memory를 메시지 형식으로 변환
-        messages = []
-        for item in self.working_memory:
-            if not item.get("metadata", {}).get("compressed", False):
-                messages.append({"role": "user", "content": item["user"]})
-                messages.append({"role": "assistant", "content": item["assistant"]})
-            else:
-                # 압축된 요약은 시스템 메시지로
-                messages.append({"role": "system", "content": item["assistant"]})
+        messages = self._working_to_messages(self.working_memory)
         
         # 주요 포인트 추출
         key_points = self._extract_key_points()
@@ -407,7 +981,7 @@ class AdvancedContextManager:
         # 사용자 선호도
         user_preferences = self._infer_preferences()
         
-        return ConversationContext(
+        self._context_cache = ConversationContext(
             messages=messages,
             summary=self._generate_summary(list(self.working_memory)[-5:]),
             key_points=key_points,
@@ -415,22 +989,32 @@ class AdvancedContextManager:
             topic_stack=self.current_topics[-5:],
             user_preferences=user_preferences
         )
+        self._context_cache_version = self._state_version
+        return self._context_cache
+    
+    def _working_to_messages(self, items) -> List[Dict[str, str]]:
+        """Working Memory 항목을 role/content 메시지로 변환"""
+        messages = []
+        for item in items:
+            if not item.get("metadata", {}).get("compressed", False):
+                messages.append({"role": "user", "content": item["user"]})
+                messages.append({"role": "assistant", "content": item["assistant"]})
+            else:
+                # 압축된 요약은 시스템 메시지로
+                messages.append({"role": "system", "content": item["assistant"]})
+        return messages
     
     def _extract_key_points(self) -> List[str]:
         """주요 포인트 추출"""
         key_points = []
         
-        # 최근 중요한 Episodic Memory에서
-        recent_important = sorted(
-            self.episodic_memory[-10:], 
-            key=lambda m: m.importance, 
-            reverse=True
-        )[:3]
+        # 최근 중요한 Episodic Memory에서 (감쇠 중요도 기준)
+        recent_important = rank_by_importance(self.episodic_memory.recent(10), limit=3)
         
         for memory in recent_important:
             try:
-                content = json.loads(memory.content)
-                key_points.append(f"Important: {content['user'][:50]}...")
+                user_text, _ = self._dialogue(memory)
+                key_points.append(f"Important: {user_text[:50]}...")
             except:
                 pass
         
@@ -438,21 +1022,15 @@ class AdvancedContextManager:
     
     def _calculate_emotional_state(self) -> Dict[str, float]:
         """현재 감정 상태 계산"""
-        if not self.emotional_trajectory:
+        if not self.emotion_series:
             return {"neutral": 1.0}
         
-        # 최근 감정 점수의 평균
-        recent_scores = [e["score"] for e in self.emotional_trajectory[-10:]]
-        avg_score = sum(recent_scores) / len(recent_scores)
-        
-        # 감정 변화율
-        if len(recent_scores) > 1:
-            trend = recent_scores[-1] - recent_scores[0]
-        else:
-            trend = 0
+        # 최근 감정 점수의 평균과 변화율 (누적합 기반 O(1))
+        stats = self.emotion_series.window_stats(self.emotion_window)
+        trend = stats["trend"]
         
         return {
-            "valence": avg_score,
+            "valence": stats["mean"],
             "arousal": abs(trend),
             "trend": "positive" if trend > 0 else "negative" if trend < 0 else "stable"
         }
@@ -492,42 +1070,48 @@ class AdvancedContextManager:
         """쿼리와 관련된 메모리 검색"""
         relevant_memories = []
         
-        # 1. Working Memory에서 최근 관련 항목
-        for item in list(self.working_memory)[-10:]:
-            if self._is_relevant(query, item["user"] + item["assistant"]):
+        # 1. Working Memory에서 최근 관련 항목 (본문 단어 집합은 후보 풀에서 재사용)
+        query_words = set(query.lower().split())
+        for item, _, content_words in self._retrieval_candidates()["working"]:
+            if self._words_relevant(query_words, content_words):
                 relevant_memories.append(
                     Memory(
                         id="working_recent",
                         type=MemoryType.WORKING,
-                        content=json.dumps(item),
+                        content=json.dumps(item, default=str),
                         timestamp=item["timestamp"],
                         importance=0.8
                     )
                 )
         
-        # 2. Episodic Memory에서 관련 항목
-        for memory in self.episodic_memory:
-            if self._is_relevant(query, memory.content):
-                memory.access_count += 1
-                memory.last_accessed = datetime.now()
-                relevant_memories.append(memory)
+        # 2. Episodic Memory에서 관련 항목 (임베딩 top-k 또는 역색인 후보만)
+        candidates = self._search_episodic(query, top_k=max_results * 4)
+        
+        now = datetime.now()
+        for memory in candidates:
+            memory.touch(now)
+            self.episodic_memory.touch(memory)
+            self._dirty_episodic.add(memory.id)
+            relevant_memories.append(memory)
+        if candidates:
+            self._mark_dirty()  # 접근 기록이 바뀌었으므로 캐시된 스냅샷 무효화
         
         # 3. Semantic Memory에서 관련 항목
         query_topic = self._extract_topic(query)
         if query_topic in self.semantic_memory:
             relevant_memories.append(self.semantic_memory[query_topic])
         
-        # 중요도 순 정렬
-        relevant_memories.sort(key=lambda m: m.importance, reverse=True)
-        
-        return relevant_memories[:max_results]
+        # 감쇠 중요도 순 정렬 (배열 연산)
+        return rank_by_importance(relevant_memories, limit=max_results)
     
     def _is_relevant(self, query: str, content: str, threshold: float = 0.3) -> bool:
         """관련성 판단 (간단한 구현)"""
-        # 실제로는 임베딩 기반 유사도 계산 권장
-        query_words = set(query.lower().split())
-        content_words = set(content.lower().split())
-        
+        # 임베딩 기반 검색은 embedder 설정 시 _search_episodic_vectors 사용
+        return self._words_relevant(set(query.lower().split()), set(content.lower().split()), threshold)
+    
+    @staticmethod
+    def _words_relevant(query_words: set, content_words: set, threshold: float = 0.3) -> bool:
+        """미리 나눈 단어 집합으로 관련성 판단"""
         if not query_words:
             return False
         
@@ -536,6 +1120,9 @@ class AdvancedContextManager:
     
     def get_system_prompt_context(self) -> str:
         """시스템 프롬프트에 추가할 컨텍스트 생성"""
+        if self._prompt_cache is not None and self._prompt_cache_version == self._state_version:
+            return self._prompt_cache
+        
         context = self._build_current_context()
         
         prompt_parts = []
@@ -548,72 +1135,229 @@ class AdvancedContextManager:
         if context.key_points:
             prompt_parts.append(f"Key points to remember: {'; '.join(context.key_points)}")
         
-        # 3. 사용자 선호도
+        # 3-5. 사용자 선호도, 현재 주제, 감정 상태
+        prompt_parts.extend(self._prompt_header_parts(context))
+        
+        self._prompt_cache = "\n".join(prompt_parts)
+        self._prompt_cache_version = self._state_version
+        return self._prompt_cache
+    
+    def _prompt_header_parts(self, context: ConversationContext) -> List[str]:
+        """항상 포함되는 짧은 프롬프트 항목 (선호도, 주제, 감정)"""
+        parts = []
+        
         if context.user_preferences:
             pref_str = ", ".join([f"{k}: {v}" for k, v in context.user_preferences.items()])
-            prompt_parts.append(f"User preferences: {pref_str}")
+            parts.append(f"User preferences: {pref_str}")
         
-        # 4. 현재 주제
         if context.topic_stack:
-            prompt_parts.append(f"Current topics: {', '.join(context.topic_stack[-3:])}")
+            parts.append(f"Current topics: {', '.join(context.topic_stack[-3:])}")
         
-        # 5. 감정 상태
         if context.emotional_state:
             emotion_str = f"valence: {context.emotional_state.get('valence', 0.5):.2f}"
-            prompt_parts.append(f"Emotional context: {emotion_str}")
+            parts.append(f"Emotional context: {emotion_str}")
+        
+        return parts
+    
+    def pack_context(self, relevant_memories: Optional[List[Memory]] = None,
+                     token_budget: Optional[int] = None) -> PackedContext:
+        """토큰 예산 안에서 Claude 호출용 system 프롬프트와 메시지 구성
+        
+        가장 최근 턴과 짧은 헤더는 항상 포함하고, 나머지(압축 요약, 주요 포인트,
+        검색된 메모리, 이전 턴)는 중요도와 최신성 기반 가치 대비 토큰 비율 순으로 채운다.
+        """
+        budget = token_budget or self.context_token_budget
+        context = self._build_current_context()
+        segments = []
+        
+        header = "\n".join(self._prompt_header_parts(context))
+        if header:
+            segments.append(ContextSegment(
+                "header", 0, estimate_tokens(header), 1.0, text=header, required=True
+            ))
+        
+        # Working Memory: 압축 블록은 요약으로, 나머지는 user/assistant 턴으로
+        items = list(self.working_memory)
+        newest = len(items) - 1
+        for position, item in enumerate(items):
+            recency = self.recency_decay ** (newest - position)
+            if item.get("metadata", {}).get("compressed", False):
+                text = f"Earlier conversation summary: {item['assistant']}"
+                segments.append(ContextSegment(
+                    "summary", position, estimate_tokens(text), 0.5 * recency, text=text
+                ))
+            else:
+                segments.append(ContextSegment(
+                    "turn", position, item.get("tokens", 0), recency,
+                    messages=self._working_to_messages([item]),
+                    required=position == newest
+                ))
         
-        return "\n".join(prompt_parts)
+        if context.key_points:
+            text = f"Key points to remember: {'; '.join(context.key_points)}"
+            segments.append(ContextSegment("key_points", 0, estimate_tokens(text), 0.6, text=text))
+        
+        # 검색된 장기 기억 (Working Memory 항목은 이미 턴으로 포함됨)
+        memories = [m for m in relevant_memories or [] if m.type != MemoryType.WORKING]
+        for rank, (memory, value) in enumerate(zip(memories, effective_importances(memories))):
+            try:
+                user_text, assistant_text = self._dialogue(memory)
+                text = f"Related memory - User: {user_text[:200]} / Assistant: {assistant_text[:200]}"
+            except (ValueError, TypeError, KeyError):
+                text = f"Related memory: {memory.content[:400]}"
+            segments.append(ContextSegment(
+                "memory", rank, estimate_tokens(text), float(value), text=text
+            ))
+        
+        return assemble(segments, budget)
+    
+    def _serialize_working_item(self, item: Dict) -> Dict:
+        """Working Memory 항목을 JSON 저장 가능한 사본으로 변환"""
+        serialized = {**item, "metadata": dict(item.get("metadata", {}))}
+        if isinstance(item.get("timestamp"), datetime):
+            serialized["timestamp"] = item["timestamp"].isoformat()
+        return serialized
+    
+    def _export_episodic(self, memory) -> Dict[str, Any]:
+        return {
+            "id": memory.id,
+            "content": memory.content,
+            "importance": memory.importance,
+            "timestamp": memory.timestamp.isoformat(),
+            "access_count": memory.access_count,
+            "decay_anchor": memory.decay_anchor
+        }
+    
+    def _export_semantic(self, memory: Memory) -> Dict[str, Any]:
+        return {
+            "content": memory.content,
+            "importance": memory.importance,
+            "access_count": memory.access_count
+        }
+    
+    def _export_emotional_trajectory(self) -> List[Dict[str, Any]]:
+        return self.emotion_series.to_list()
+    
+    @property
+    def emotional_trajectory(self) -> List[Dict[str, Any]]:
+        """감정 궤적 [{timestamp, score}] (오래된 순)"""
+        return [
+            {"timestamp": datetime.fromtimestamp(timestamp), "score": score}
+            for timestamp, score in self.emotion_series.points()
+        ]
+    
+    def get_emotional_trajectory(self, window: Optional[int] = None) -> Dict[str, Any]:
+        """최근 window개 감정 점수와 윈도우 통계 (대시보드용, 최대 emotion_history개)"""
+        window = window or len(self.emotion_series)
+        return {
+            "points": self.emotion_series.to_list(window),
+            **self.emotion_series.window_stats(window)
+        }
+    
+    def _export_patterns(self) -> Dict[str, Any]:
+        # 백그라운드 기록 중 변경되지 않도록 사본 사용 (값은 숫자/문자열이라 한 단계 복사로 충분)
+        patterns = self.interaction_patterns
+        return {
+            "question_types": dict(patterns["question_types"]),
+            "response_preferences": dict(patterns["response_preferences"]),
+            "topic_transitions": patterns["topic_transitions"].to_dict()
+        }
     
     def export_memory_state(self) -> Dict[str, Any]:
         """메모리 상태 내보내기 (백업/분석용)"""
         return {
             "timestamp": datetime.now().isoformat(),
-            "working_memory": list(self.working_memory),
-            "episodic_memory": [
-                {
-                    "id": m.id,
-                    "content": m.content,
-                    "importance": m.importance,
-                    "timestamp": m.timestamp.isoformat()
-                }
-                for m in self.episodic_memory
-            ],
+            "working_memory": [self._serialize_working_item(item) for item in self.working_memory],
+            "episodic_memory": [self._export_episodic(m) for m in self.episodic_memory],
             "semantic_memory": {
-                k: {
-                    "content": v.content,
-                    "importance": v.importance,
-                    "access_count": v.access_count
-                }
+                k: self._export_semantic(v)
                 for k, v in self.semantic_memory.items()
             },
-            "patterns": dict(self.interaction_patterns),
-            "current_topics": self.current_topics,
-            "emotional_trajectory": self.emotional_trajectory[-20:]  # 최근 20개
+            "patterns": self._export_patterns(),
+            "current_topics": list(self.current_topics),
+            "emotional_trajectory": self._export_emotional_trajectory(),
+            "compression_stats": self.get_compression_stats()
+        }
+    
+    def collect_memory_delta(self) -> Dict[str, Any]:
+        """마지막 수집 이후 새로 생기거나 바뀐 메모리만 담은 증분 (수집 후 변경 표시 초기화)"""
+        working_by_id = {item["id"]: item for item in self.working_memory if "id" in item}
+        
+        delta = {
+            "timestamp": datetime.now().isoformat(),
+            "working_ids": list(working_by_id),
+            "working_upserts": [
+                self._serialize_working_item(working_by_id[item_id])
+                for item_id in self._dirty_working if item_id in working_by_id
+            ],
+            "episodic_upserts": [
+                self._export_episodic(self.episodic_memory.get(memory_id))
+                for memory_id in self._dirty_episodic if memory_id in self.episodic_memory
+            ],
+            "episodic_removed": list(self._removed_episodic),
+            "semantic_upserts": {
+                topic: self._export_semantic(self.semantic_memory[topic])
+                for topic in self._dirty_semantic if topic in self.semantic_memory
+            },
+            "patterns": self._export_patterns(),
+            "current_topics": list(self.current_topics),
+            "emotional_trajectory": self._export_emotional_trajectory()
         }
+        
+        self._clear_dirty_tracking()
+        return delta
+    
+    def _clear_dirty_tracking(self):
+        self._dirty_working.clear()
+        self._dirty_episodic.clear()
+        self._removed_episodic.clear()
+        self._dirty_semantic.clear()
     
     def import_memory_state(self, state: Dict[str, Any]):
         """메모리 상태 가져오기 (복원용)"""
         try:
             # Working Memory 복원
             self.working_memory.clear()
-            for item in state.get("working_memory", []):
+            for item in with_working_ids(state.get("working_memory", [])):
+                item = dict(item)
+                if isinstance(item.get("timestamp"), str):
+                    item["timestamp"] = datetime.fromisoformat(item["timestamp"])
                 self.working_memory.append(item)
+            self._recount_working_tokens()
             
             # Episodic Memory 복원
             self.episodic_memory.clear()
             for item in state.get("episodic_memory", []):
-                memory = Memory(
-                    id=item["id"],
-                    type=MemoryType.EPISODIC,
-                    content=item["content"],
-                    timestamp=datetime.fromisoformat(item["timestamp"]),
-                    importance=item["importance"]
-                )
+                if self.compact_storage:
+                    content = json.loads(item["content"])
+                    memory = MemoryRecord(
+                        id=item["id"],
+                        user=content["user"],
+                        assistant=content["assistant"],
+                        created_at=datetime.fromisoformat(item["timestamp"]).timestamp(),
+                        importance=item["importance"],
+                        access_count=item.get("access_count", 0),
+                        decay_anchor=item.get("decay_anchor")
+                    )
+                else:
+                    memory = Memory(
+                        id=item["id"],
+                        type=MemoryType.EPISODIC,
+                        content=item["content"],
+                        timestamp=datetime.fromisoformat(item["timestamp"]),
+                        importance=item["importance"],
+                        access_count=item.get("access_count", 0),
+                        decay_anchor=item.get("decay_anchor", 0.0)
+                    )
                 self.episodic_memory.append(memory)
+            self._rebuild_episodic_index()
             
-            # Semantic Memory 복원
-            self.semantic_memory.clear()
+            # Semantic Memory 복원 (공유 저장소에 이미 있는 주제는 그 값이 최신)
+            if not self._shared_semantic:
+                self.semantic_memory.clear()
             for topic, data in state.get("semantic_memory", {}).items():
+                if topic in self.semantic_memory:
+                    continue
                 self.semantic_memory[topic] = Memory(
                     id=f"sem_{topic}",
                     type=MemoryType.SEMANTIC,
@@ -624,9 +1368,25 @@ class AdvancedContextManager:
                 )
             
             # 패턴 복원
-            self.interaction_patterns = state.get("patterns", self.interaction_patterns)
+            patterns = state.get("patterns")
+            if patterns:
+                # JSON으로 저장된 일반 dict를 누적 가능한 형태로 복원
+                self.interaction_patterns = {
+                    "question_types": defaultdict(int, patterns.get("question_types", {})),
+                    "response_preferences": defaultdict(float, patterns.get("response_preferences", {})),
+                    "topic_transitions": TopicTransitionGraph.from_dict(patterns.get("topic_transitions", {}))
+                }
             self.current_topics = state.get("current_topics", [])
-            self.emotional_trajectory = state.get("emotional_trajectory", [])
+            self.emotion_series.clear()
+            for e in state.get("emotional_trajectory", []):
+                timestamp = e.get("timestamp")
+                if isinstance(timestamp, str):
+                    timestamp = datetime.fromisoformat(timestamp)
+                self.emotion_series.append(e["score"], timestamp.timestamp() if timestamp else None)
+            
+            # 가져온 상태는 이미 저장된 것으로 간주
+            self._clear_dirty_tracking()
+            self._mark_dirty()
             
             print("✅ Memory state imported successfully")
             
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+토큰 예산 기반 컨텍스트 패커
+요약/주요 포인트/검색된 메모리/최근 대화를 가치 대비 토큰 비율 순으로 골라 예산 안에 채움
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+@dataclass
+class ContextSegment:
+    """프롬프트에 넣을 수 있는 컨텍스트 조각"""
+    kind: str            # header, summary, key_points, memory, turn
+    order: int           # 최종 배치 순서 (같은 kind 안에서 오래된 순)
+    tokens: int
+    value: float         # 중요도 x 최신성
+    text: str = ""
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    required: bool = False  # 예산과 무관하게 포함
+
+@dataclass
+class PackedContext:
+    """패킹 결과 (system 프롬프트 + 대화 메시지)"""
+    system: str
+    messages: List[Dict[str, str]]
+    tokens: int
+    dropped: int = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"tokens": self.tokens, "messages": len(self.messages), "dropped": self.dropped}
+
+def pack_segments(segments: List[ContextSegment], token_budget: int) -> List[ContextSegment]:
+    """필수 조각을 먼저 넣고, 나머지는 토큰당 가치가 높은 순으로 남은 예산에 채움 (탐욕 배낭)"""
+    selected = [s for s in segments if s.required]
+    remaining = token_budget - sum(s.tokens for s in selected)
+
+    optional = sorted(
+        (s for s in segments if not s.required),
+        key=lambda s: s.value / max(s.tokens, 1),
+        reverse=True
+    )
+    for segment in optional:
+        if segment.tokens <= remaining:
+            selected.append(segment)
+            remaining -= segment.tokens
+
+    return sorted(selected, key=lambda s: s.order)
+
+# system 프롬프트 안에서의 배치 순서
+_SYSTEM_SECTIONS = ("header", "summary", "key_points", "memory")
+
+def assemble(segments: List[ContextSegment], token_budget: int) -> PackedContext:
+    """조각을 예산에 맞게 고른 뒤 system 프롬프트와 메시지 목록으로 조립"""
+    selected = pack_segments(segments, token_budget)
+
+    system_parts = []
+    for section in _SYSTEM_SECTIONS:
+        system_parts.extend(s.text for s in selected if s.kind == section)
+
+    # 대화 턴은 user/assistant 쌍 단위라 건너뛰어도 역할 교대가 유지됨
+    messages = []
+    for segment in selected:
+        if segment.kind == "turn":
+            messages.extend(segment.messages)
+
+    return PackedContext(
+        system="\n".join(system_parts),
+        messages=messages,
+        tokens=sum(s.tokens for s in selected),
+        dropped=len(segments) - len(selected)
+    )
@@ -6,6 +6,7 @@ Replit Database 기반 데이터베이스 매니저
 
 import json
 import asyncio
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import logging
@@ -25,6 +26,8 @@ class ReplitDatabaseManager:
     
     def __init__(self):
         self.db_available = REPLIT_DB_AVAILABLE
+        # 백그라운드 스레드 기록과 로컬 파일 읽기-수정-쓰기가 겹치지 않도록
+        self._lock = threading.RLock()
         if not self.db_available:
             logger.info("📁 로컬 파일 기반 저장소로 대체됩니다.")
             self._init_local_storage()
@@ -105,9 +108,10 @@ class ReplitDatabaseManager:
         if self.db_available:
             db[key] = data
         else:
-            local_data = self._get_local_data()
-            local_data[key] = data
-            self._save_local_data(local_data)
+            with self._lock:
+                local_data = self._get_local_data()
+                local_data[key] = data
+                self._save_local_data(local_data)
         
         logger.info(f"🧠 메모리 저장: {session_id}")
     
@@ -134,8 +138,48 @@ class ReplitDatabaseManager:
                 del local_data[key]
                 self._save_local_data(local_data)
         
+        self.clear_context_deltas(session_id)
         logger.info(f"🗑️ 메모리 삭제: {session_id}")
     
+    def append_context_deltas(self, deltas_by_session: Dict[str, List[Dict]]):
+        """컨텍스트 메모리 증분 추가 기록 (여러 세션을 한 번에)"""
+        if self.db_available:
+            for session_id, deltas in deltas_by_session.items():
+                key = f"memory_delta:{session_id}"
+                db[key] = list(db.get(key, [])) + deltas
+        else:
+            with self._lock:
+                local_data = self._get_local_data()
+                for session_id, deltas in deltas_by_session.items():
+                    local_data.setdefault(f"memory_delta:{session_id}", []).extend(deltas)
+                self._save_local_data(local_data)
+        
+        logger.info(f"🧠 메모리 증분 저장: {sum(len(d) for d in deltas_by_session.values())}개")
+    
+    def get_context_deltas(self, session_id: str) -> List[Dict]:
+        """컨텍스트 메모리 증분 조회 (기록 순서)"""
+        key = f"memory_delta:{session_id}"
+        
+        if self.db_available:
+            return list(db.get(key, []))
+        else:
+            local_data = self._get_local_data()
+            return local_data.get(key, [])
+    
+    def clear_context_deltas(self, session_id: str):
+        """컨텍스트 메모리 증분 삭제 (스냅샷 압축 후)"""
+        key = f"memory_delta:{session_id}"
+        
+        if self.db_available:
+            if key in db:
+                del db[key]
+        else:
+            with self._lock:
+                local_data = self._get_local_data()
+                if key in local_data:
+                    del local_data[key]
+                    self._save_local_data(local_data)
+    
     # ===== 대화 기록 관리 =====
     def save_conversation(self, session_id: str, conversation_data: Dict):
         """대화 기록 저장"""
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+로컬 임베딩 기반 메모리 검색 엔진
+네트워크 없이 해싱 트릭 벡터를 만들고 연속 행렬 한 번의 곱으로 top-k 검색
+"""
+
+import heapq
+import math
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+class EmbeddingBackend:
+    """임베딩 백엔드 인터페이스 (교체 가능)"""
+
+    dim: int = 0
+
+    def embed(self, text: str) -> List[float]:
+        """텍스트 하나를 L2 정규화된 벡터로 변환"""
+        raise NotImplementedError
+
+    def embed_batch(self, texts: Iterable[str]) -> List[List[float]]:
+        """여러 텍스트를 한 번에 변환"""
+        return [self.embed(text) for text in texts]
+
+class HashingEmbedder(EmbeddingBackend):
+    """해싱 트릭 기반 로컬 임베딩 (단어 + 문자 n-gram)"""
+
+    def __init__(self, dim: int = 256, char_ngram: int = 2):
+        self.dim = dim
+        self.char_ngram = char_ngram
+
+    def _features(self, text: str) -> List[str]:
+        """단어와 단어 내부 문자 n-gram 추출 (한국어 조사 변형 대응)"""
+        features = []
+        n = self.char_ngram
+        for word in _WORD_PATTERN.findall(text.lower()):
+            features.append(word)
+            if n and len(word) > n:
+                features.extend(f"#{word[i:i + n]}" for i in range(len(word) - n + 1))
+        return features
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # 상위 비트로 부호를 정해 해시 충돌의 편향을 상쇄
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm > 0:
+            vector = [v / norm for v in vector]
+        return vector
+
+class VectorIndex:
+    """연속 행렬 기반 벡터 색인 (삭제 시 마지막 행과 교체)"""
+
+    def __init__(self, dim: int, initial_capacity: int = 64):
+        self.dim = dim
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        if NUMPY_AVAILABLE:
+            self._matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        else:
+            self._matrix = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._rows
+
+    def add(self, item_id: str, vector: List[float]):
+        """벡터 추가 (같은 ID면 덮어쓰기)"""
+        if item_id in self._rows:
+            self._set_row(self._rows[item_id], vector)
+            return
+
+        row = len(self._ids)
+        if NUMPY_AVAILABLE:
+            if row == self._matrix.shape[0]:
+                # 용량 2배 확장 (분할 상환 O(1))
+                grown = np.zeros((row * 2, self.dim), dtype=np.float32)
+                grown[:row] = self._matrix
+                self._matrix = grown
+        else:
+            self._matrix.append(None)
+
+        self._ids.append(item_id)
+        self._rows[item_id] = row
+        self._set_row(row, vector)
+
+    def _set_row(self, row: int, vector: List[float]):
+        if NUMPY_AVAILABLE:
+            self._matrix[row] = vector
+        else:
+            self._matrix[row] = list(vector)
+
+    def remove(self, item_id: str):
+        """벡터 제거"""
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return
+
+        last = len(self._ids) - 1
+        if row != last:
+            moved_id = self._ids[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+            self._matrix[row] = self._matrix[last]
+        self._ids.pop()
+        if not NUMPY_AVAILABLE:
+            self._matrix.pop()
+
+    def clear(self):
+        """색인 비우기"""
+        self._ids.clear()
+        self._rows.clear()
+        if not NUMPY_AVAILABLE:
+            self._matrix.clear()
+
+    def search(self, query_vector: List[float], top_k: int = 5,
+               min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """코사인 유사도 top-k 검색 (벡터는 정규화되어 있다고 가정)"""
+        n = len(self._ids)
+        if n == 0 or top_k <= 0:
+            return []
+
+        if NUMPY_AVAILABLE:
+            query = np.asarray(query_vector, dtype=np.float32)
+            scores = self._matrix[:n] @ query
+            if top_k < n:
+                candidates = np.argpartition(scores, n - top_k)[n - top_k:]
+            else:
+                candidates = np.arange(n)
+            candidates = candidates[np.argsort(-scores[candidates])]
+            return [
+                (self._ids[row], float(scores[row]))
+                for row in candidates
+                if scores[row] > min_score
+            ]
+
+        scored = (
+            (sum(a * b for a, b in zip(vector, query_vector)), row)
+            for row, vector in enumerate(self._matrix)
+        )
+        return [
+            (self._ids[row], score)
+            for score, row in heapq.nlargest(top_k, scored)
+            if score > min_score
+        ]
+
+def create_embedder(kind: Optional[str] = "hashing", **kwargs) -> Optional[EmbeddingBackend]:
+    """설정 문자열로 임베딩 백엔드 생성"""
+    if not kind:
+        return None
+    if kind == "hashing":
+        return HashingEmbedder(**kwargs)
+    raise ValueError(f"지원하지 않는 임베딩 백엔드: {kind}")
@@ -6,7 +6,10 @@ Claude API를 활용한 지능적 분석 및 요약
 
 import json
 import asyncio
-from typing import List, Dict, Any, Optional
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Awaitable, Callable, Tuple
 from datetime import datetime
 from dataclasses import dataclass
 
@@ -22,26 +25,116 @@ class ConversationAnalysis:
     suggested_directions: List[str]
     timestamp: datetime
 
+@dataclass
+class CombinedAnalysis:
+    """한 번의 호출로 얻은 종합 분석 + 감정 궤적 + 인사이트"""
+    analysis: ConversationAnalysis
+    emotion_trajectory: Dict[str, Any]
+    insights: List[str]
+
+# ClaudeClient.get_response 는 실패 시 예외 대신 이 접두어로 시작하는 문자열을 반환
+API_ERROR_PREFIX = "Claude API 오류"
+
+# 응답 최대 토큰 수 (통합 분석은 세 가지 결과를 한 JSON에 담으므로 더 길게)
+ANALYSIS_MAX_TOKENS = 1024
+COMBINED_MAX_TOKENS = 2048
+
+class AnalysisCache:
+    """프롬프트 내용 기반 응답 캐시 (TTL + LRU) 및 동일 요청 single-flight
+    
+    프롬프트는 템플릿과 포맷된 대화로 이루어지므로, 전체 프롬프트의 해시가 같으면
+    같은 (템플릿, 대화)에 대한 요청이다. 대화가 바뀌지 않은 채 반복되는 폴링은 캐시에서,
+    동시에 들어온 같은 요청은 진행 중인 업스트림 호출 하나의 결과를 함께 받는다.
+    """
+    
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl  # 0 이하면 저장하지 않고 single-flight 만 적용
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
+        # 통계
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "expired": 0, "evictions": 0}
+    
+    @staticmethod
+    def make_key(prompt: str) -> str:
+        return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+    
+    async def get_or_call(self, prompt: str, call: Callable[[], Awaitable[str]],
+                          cacheable: Callable[[str], bool] = lambda response: True) -> str:
+        """캐시된 응답 반환, 없으면 call() 결과를 저장 (같은 키의 동시 요청은 한 번만 호출)"""
+        key = self.make_key(prompt)
+        
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, response = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return response
+            del self._entries[key]
+            self.stats["expired"] += 1
+        
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._fill(key, call, cacheable))
+            self._inflight[key] = task
+        else:
+            self.stats["coalesced"] += 1
+        
+        # 기다리던 요청 하나가 취소되어도 공유 중인 업스트림 호출은 계속 진행
+        return await asyncio.shield(task)
+    
+    async def _fill(self, key: str, call: Callable[[], Awaitable[str]], cacheable: Callable[[str], bool]) -> str:
+        try:
+            response = await call()
+            if self.ttl > 0 and cacheable(response):
+                self._entries[key] = (time.monotonic() + self.ttl, response)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+            return response
+        finally:
+            self._inflight.pop(key, None)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "ttl": self.ttl
+        }
+
 class LLMAnalyzer:
     """LLM 기반 분석 시스템"""
     
-    def __init__(self, claude_client):
+    def __init__(self, claude_client, cache: Optional[AnalysisCache] = None,
+                 combined_max_tokens: int = COMBINED_MAX_TOKENS):
         self.claude_client = claude_client
+        self.cache = cache if cache is not None else AnalysisCache()
+        self.combined_max_tokens = combined_max_tokens
+    
+    async def _ask(self, prompt: str, max_tokens: int = ANALYSIS_MAX_TOKENS) -> str:
+        """캐시/single-flight 를 거쳐 Claude 호출 (오류 응답은 캐시하지 않음)"""
+        return await self.cache.get_or_call(
+            prompt,
+            lambda: self.claude_client.get_response(prompt, max_tokens=max_tokens),
+            cacheable=lambda response: not response.startswith(API_ERROR_PREFIX)
+        )
         
     async def analyze_conversation(self, messages: List[Dict]) -> ConversationAnalysis:
         """대화 전체를 종합적으로 분석"""
         
         if not messages or len(messages) < 2:
-            return ConversationAnalysis(
-                summary="대화가 충분하지 않습니다.",
-                key_topics=[],
-                emotional_state={"neutral": 1.0},
-                complexity_level="low",
-                user_interests=[],
-                conversation_quality=0.0,
-                suggested_directions=[],
-                timestamp=datetime.now()
-            )
+            return self._create_insufficient_analysis()
         
         # 대화 내용을 JSON 형태로 변환
         conversation_text = self._format_conversation(messages)
@@ -51,26 +144,40 @@ class LLMAnalyzer:
         
         try:
             # Claude API로 분석 요청
-            analysis_response = await self.claude_client.get_response(analysis_prompt)
+            analysis_response = await self._ask(analysis_prompt)
             
             # JSON 응답 파싱
             analysis_data = self._parse_analysis_response(analysis_response)
             
-            return ConversationAnalysis(
-                summary=analysis_data.get("summary", "분석 중 오류가 발생했습니다."),
-                key_topics=analysis_data.get("key_topics", []),
-                emotional_state=analysis_data.get("emotional_state", {"neutral": 1.0}),
-                complexity_level=analysis_data.get("complexity_level", "medium"),
-                user_interests=analysis_data.get("user_interests", []),
-                conversation_quality=analysis_data.get("conversation_quality", 0.5),
-                suggested_directions=analysis_data.get("suggested_directions", []),
-                timestamp=datetime.now()
-            )
+            return self._build_analysis(analysis_data)
             
         except Exception as e:
             print(f"LLM 분석 오류: {e}")
             return self._create_fallback_analysis(messages)
     
+    async def analyze_all(self, messages: List[Dict]) -> CombinedAnalysis:
+        """종합 분석, 감정 궤적, 인사이트를 한 번의 호출로 분석 (대화를 한 번만 전송)"""
+        
+        if not messages or len(messages) < 2:
+            return CombinedAnalysis(
+                analysis=self._create_insufficient_analysis(),
+                emotion_trajectory={"trend": "stable", "dominant_emotion": "neutral"},
+                insights=[]
+            )
+        
+        combined_prompt = self._create_combined_prompt(self._format_conversation(messages))
+        
+        try:
+            combined_response = await self._ask(combined_prompt, max_tokens=self.combined_max_tokens)
+            return self._parse_combined_response(combined_response, messages)
+        except Exception as e:
+            print(f"LLM 통합 분석 오류: {e}")
+            return CombinedAnalysis(
+                analysis=self._create_fallback_analysis(messages),
+                emotion_trajectory={"trend": "stable", "dominant_emotion": "neutral"},
+                insights=[]
+            )
+    
     async def generate_intelligent_summary(self, messages: List[Dict]) -> str:
         """지능적 요약 생성"""
         
@@ -81,7 +188,7 @@ class LLMAnalyzer:
         summary_prompt = self._create_summary_prompt(messages)
         
         try:
-            summary = await self.claude_client.get_response(summary_prompt)
+            summary = await self._ask(summary_prompt)
             return summary.strip()
         except Exception as e:
             print(f"요약 생성 오류: {e}")
@@ -96,7 +203,7 @@ class LLMAnalyzer:
         emotion_prompt = self._create_emotion_analysis_prompt(messages)
         
         try:
-            emotion_response = await self.claude_client.get_response(emotion_prompt)
+            emotion_response = await self._ask(emotion_prompt)
             emotion_data = self._parse_emotion_response(emotion_response)
             return emotion_data
         except Exception as e:
@@ -112,7 +219,7 @@ class LLMAnalyzer:
         insights_prompt = self._create_insights_prompt(messages)
         
         try:
-            insights_response = await self.claude_client.get_response(insights_prompt)
+            insights_response = await self._ask(insights_prompt)
             insights = self._parse_insights_response(insights_response)
             return insights
         except Exception as e:
@@ -168,6 +275,50 @@ class LLMAnalyzer:
     "conversation_quality": 0.8,
     "suggested_directions": ["제안1", "제안2"]
 }}
+"""
+    
+    def _create_combined_prompt(self, conversation_text: str) -> str:
+        """통합 분석 프롬프트 생성 (종합 분석 + 감정 궤적 + 인사이트)"""
+        return f"""
+다음 대화를 분석해주세요. 아래 세 부분을 하나의 JSON 객체로만 응답해주세요.
+
+대화 내용:
+{conversation_text}
+
+1. **analysis**: 대화 종합 분석
+   - summary: 핵심 내용 2-3문장 요약
+   - key_topics: 주요 주제들 (배열)
+   - emotional_state: 감정 상태 (valence: 0-1, arousal: 0-1, dominant_emotion: 문자열)
+   - complexity_level: 대화 복잡성 (low/medium/high)
+   - user_interests: 사용자의 관심사 (배열)
+   - conversation_quality: 대화 품질 (0-1)
+   - suggested_directions: 다음 대화 방향 제안 (배열)
+2. **emotion_trajectory**: 사용자의 감정 변화
+   - trend: 감정 변화 추세 (positive/negative/stable)
+   - dominant_emotion: 주요 감정 (joy, sadness, anger, fear, surprise, curiosity, confusion, satisfaction)
+   - emotional_intensity: 감정 강도 (0-1)
+   - emotional_stability: 감정 안정성 (0-1)
+3. **insights**: 학습 목표나 관심사, 이해가 부족한 부분, 흥미로워하는 내용, 다음에 도움이 될 정보 (문자열 배열)
+
+응답 형식:
+{{
+    "analysis": {{
+        "summary": "요약 내용",
+        "key_topics": ["주제1", "주제2"],
+        "emotional_state": {{"valence": 0.7, "arousal": 0.3, "dominant_emotion": "curious"}},
+        "complexity_level": "medium",
+        "user_interests": ["관심사1", "관심사2"],
+        "conversation_quality": 0.8,
+        "suggested_directions": ["제안1", "제안2"]
+    }},
+    "emotion_trajectory": {{
+        "trend": "positive",
+        "dominant_emotion": "curiosity",
+        "emotional_intensity": 0.7,
+        "emotional_stability": 0.8
+    }},
+    "insights": ["인사이트 1", "인사이트 2", "인사이트 3"]
+}}
 """
     
     def _create_summary_prompt(self, messages: List[Dict]) -> str:
@@ -249,6 +400,31 @@ class LLMAnalyzer:
             print(f"JSON 파싱 오류: {e}")
             return self._create_fallback_analysis_data()
     
+    def _parse_combined_response(self, response: str, messages: List[Dict]) -> CombinedAnalysis:
+        """통합 분석 응답 파싱 - 빠지거나 형식이 잘못된 부분만 개별 분석과 같은 기본값으로 채움"""
+        data = self._parse_analysis_response(response)
+        
+        analysis_data = data.get("analysis")
+        if isinstance(analysis_data, dict):
+            analysis = self._build_analysis(analysis_data)
+        else:
+            analysis = self._create_fallback_analysis(messages)
+        
+        # 개별 감정 분석과 마찬가지로 대화가 짧으면 추세를 판단하지 않음
+        emotion_trajectory = data.get("emotion_trajectory")
+        if len(messages) < 4 or not isinstance(emotion_trajectory, dict):
+            emotion_trajectory = {"trend": "stable", "dominant_emotion": "neutral"}
+        
+        insights = data.get("insights")
+        if not isinstance(insights, list):
+            insights = []
+        
+        return CombinedAnalysis(
+            analysis=analysis,
+            emotion_trajectory=emotion_trajectory,
+            insights=[str(insight) for insight in insights]
+        )
+    
     def _parse_emotion_response(self, response: str) -> Dict[str, Any]:
         """감정 분석 응답 파싱"""
         try:
@@ -277,6 +453,32 @@ class LLMAnalyzer:
         except json.JSONDecodeError:
             return []
     
+    def _build_analysis(self, analysis_data: Dict[str, Any]) -> ConversationAnalysis:
+        """파싱된 분석 데이터로 결과 생성"""
+        return ConversationAnalysis(
+            summary=analysis_data.get("summary", "분석 중 오류가 발생했습니다."),
+            key_topics=analysis_data.get("key_topics", []),
+            emotional_state=analysis_data.get("emotional_state", {"neutral": 1.0}),
+            complexity_level=analysis_data.get("complexity_level", "medium"),
+            user_interests=analysis_data.get("user_interests", []),
+            conversation_quality=analysis_data.get("conversation_quality", 0.5),
+            suggested_directions=analysis_data.get("suggested_directions", []),
+            timestamp=datetime.now()
+        )
+    
+    def _create_insufficient_analysis(self) -> ConversationAnalysis:
+        """대화가 너무 짧을 때의 분석 결과"""
+        return ConversationAnalysis(
+            summary="대화가 충분하지 않습니다.",
+            key_topics=[],
+            emotional_state={"neutral": 1.0},
+            complexity_level="low",
+            user_interests=[],
+            conversation_quality=0.0,
+            suggested_directions=[],
+            timestamp=datetime.now()
+        )
+    
     def _create_fallback_analysis(self, messages: List[Dict]) -> ConversationAnalysis:
         """오류 시 기본 분석 결과"""
         return ConversationAnalysis(
@@ -1,27 +1,39 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import json
 import logging
 from datetime import datetime
 import os
+import time
 from dotenv import load_dotenv
-import anthropic
-from typing import Optional, Dict, Any, AsyncGenerator, List
+from typing import Optional, Dict, Any, AsyncIterator
+from contextlib import asynccontextmanager
 import asyncio
 
-# 스트림 변환기 import
-from .stream_transformers import (
-    StreamTransformer, TranslationTransformer, SentimentFilter, 
-    SummaryTransformer, CodeFormatterTransformer, StreamPipeline,
-    StreamTransformerFactory
-)
+# Claude API 클라이언트 import
+from .claude_client import claude_registry
 
 # 컨텍스트 매니저 import
-from .context_manager import AdvancedContextManager, ConversationContext
+# context_manager는 backend 디렉토리 기준 최상위 모듈(summary_worker, memory_persistence, tokenizer)을
+# import하므로, 전역 워커/저장기/토큰 계산기는 컨텍스트 매니저가 실제로 쓰는 인스턴스를 가져온다
+# (.summary_worker 등으로 다시 import하면 같은 모듈이 두 번 로드되어 별개의 인스턴스가 생김)
+from .context_manager import AdvancedContextManager, summary_worker, memory_persister, token_counter
 
 # LLM 분석기 import
-from .llm_analyzer import LLMAnalyzer, ConversationAnalysis
+from .llm_analyzer import LLMAnalyzer, ConversationAnalysis, AnalysisCache
+
+# 로컬 임베딩 검색 import
+from .embedding_index import create_embedder
+
+# 사용자별 공유 Semantic Memory import
+from .semantic_store import semantic_store
+
+# 토큰 계산기 import
+from .tokenizer import create_tokenizer
+
+# 단계별 지연 시간 측정 import
+from .metrics import metrics
 
 # AI 페르소나 시스템 import
 from .ai_persona_system import persona_manager
@@ -36,6 +48,12 @@ logger = logging.getLogger(__name__)
 # 환경변수 로드
 load_dotenv()
 
+# 세션 간 공유되는 임베딩 백엔드 (CONTEXT_EMBEDDER=hashing 으로 활성화)
+context_embedder = create_embedder(os.getenv("CONTEXT_EMBEDDER"))
+
+# 토큰 계산 방식 (auto: tiktoken 설치 시 사용, 없으면 오프라인 추정)
+token_counter.set_tokenizer(create_tokenizer(os.getenv("CONTEXT_TOKENIZER")))
+
 app = FastAPI(title="Claude Chatbot API", version="1.0.0")
 
 # CORS 설정 - Replit 환경에 맞게
@@ -49,48 +67,207 @@ app.add_middleware(
 
 # 연결된 클라이언트들을 관리
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, hibernate_after: float = 300.0):
         self.active_connections: list[WebSocket] = []
         self.session_map: dict[WebSocket, str] = {}
+        self.session_users: dict[str, str] = {}
         # 🔥 컨텍스트 매니저 추가
         self.context_managers: dict[str, AdvancedContextManager] = {}
-
-    async def connect(self, websocket: WebSocket, claude_client=None):
+        
+        # 💤 유휴 세션 휴면 (컨텍스트 매니저를 DB에 저장하고 메모리에서 해제)
+        self.hibernate_after = hibernate_after  # 초 단위, 0이면 비활성화
+        self.hibernated_sessions: set[str] = set()
+        self.llm_analyzer: Optional[LLMAnalyzer] = None  # 시작 시 공유 Claude 클라이언트로 생성
+        self.last_activity: dict[str, float] = {}
+        self.in_use: dict[str, int] = {}  # 처리 중인 요청 수 (0보다 크면 휴면하지 않음)
+        self._rehydrating: dict[str, asyncio.Task] = {}
+        self._hibernation_task: Optional[asyncio.Task] = None
+
+    async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
         
         session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{id(websocket)}"
         self.session_map[websocket] = session_id
         
+        # 🔥 user_id가 있으면 재접속 시에도 주제 지식(Semantic Memory)을 이어서 사용
+        user_id = websocket.query_params.get("user_id")
+        if user_id:
+            self.session_users[session_id] = user_id
+        
+        self.context_managers[session_id] = self._create_context_manager(session_id)
+        self.last_activity[session_id] = time.monotonic()
+        
+        logger.info(f"클라이언트 연결됨. 세션: {session_id}, 총 연결 수: {len(self.active_connections)}")
+
+    def _create_context_manager(self, session_id: str) -> AdvancedContextManager:
+        """세션별 컨텍스트 매니저 생성 (연결 시 및 휴면 해제 시)"""
+        user_id = self.session_users.get(session_id)
+        semantic_memory = semantic_store.acquire(user_id) if user_id else None
+        
         # 🔥 세션별 컨텍스트 매니저 생성
         context_manager = AdvancedContextManager(
             max_working_memory=30,
             max_episodic_memory=200,
             max_tokens=8000,
-            compression_threshold=0.7
+            compression_threshold=0.7,
+            embedder=context_embedder,
+            context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")),
+            emotion_history=int(os.getenv("CONTEXT_EMOTION_HISTORY", "50")),
+            semantic_memory=semantic_memory
         )
         
-        # 🔥 LLM 분석기 생성 및 연결
-        if claude_client:
-            llm_analyzer = LLMAnalyzer(claude_client)
-            context_manager.llm_analyzer = llm_analyzer
+        # 🔥 공유 LLM 분석기 및 서버가 시작/종료하는 요약 워커, 메모리 저장기 연결
+        context_manager.llm_analyzer = self.llm_analyzer
+        context_manager.summary_worker = summary_worker
+        context_manager.persister = memory_persister
         
-        self.context_managers[session_id] = context_manager
+        return context_manager
+
+    async def get_context_manager(self, session_id: str) -> Optional[AdvancedContextManager]:
+        """세션의 컨텍스트 매니저 반환 (휴면 중이면 DB에서 복원)"""
+        context_manager = self.context_managers.get(session_id)
+        if context_manager is None:
+            if session_id not in self.hibernated_sessions:
+                return None
+            # 동시에 들어온 요청은 같은 복원 작업을 기다림
+            task = self._rehydrating.get(session_id)
+            if task is None:
+                task = asyncio.ensure_future(self._rehydrate(session_id))
+                self._rehydrating[session_id] = task
+            context_manager = await task
         
-        logger.info(f"클라이언트 연결됨. 세션: {session_id}, 총 연결 수: {len(self.active_connections)}")
+        self.last_activity[session_id] = time.monotonic()
+        return context_manager
+
+    @asynccontextmanager
+    async def using(self, session_id: str) -> AsyncIterator[Optional[AdvancedContextManager]]:
+        """요청을 처리하는 동안 세션을 사용 중으로 표시하고 컨텍스트 매니저 제공
+        
+        Claude 호출이 동시 요청 제한 대기열에서 휴면 시간보다 오래 기다려도
+        턴 도중에 매니저가 해제되지 않도록 한다.
+        """
+        self.in_use[session_id] = self.in_use.get(session_id, 0) + 1
+        try:
+            yield await self.get_context_manager(session_id)
+        finally:
+            remaining = self.in_use.get(session_id, 0) - 1
+            if remaining > 0:
+                self.in_use[session_id] = remaining
+            else:
+                self.in_use.pop(session_id, None)
+            # 유휴 시간은 요청이 끝난 시점부터 계산
+            if session_id in self.last_activity:
+                self.last_activity[session_id] = time.monotonic()
+
+    async def _rehydrate(self, session_id: str) -> AdvancedContextManager:
+        try:
+            context_manager = self._create_context_manager(session_id)
+            state = await asyncio.to_thread(memory_persister.load, session_id)
+            if state:
+                context_manager.import_memory_state(state)
+            
+            self.hibernated_sessions.discard(session_id)
+            self.context_managers[session_id] = context_manager
+            logger.info(f"💤 세션 복원: {session_id}")
+            return context_manager
+        finally:
+            self._rehydrating.pop(session_id, None)
+
+    async def hibernate(self, session_id: str) -> bool:
+        """컨텍스트 매니저를 스냅샷으로 저장하고 메모리에서 해제"""
+        context_manager = self.context_managers.get(session_id)
+        if context_manager is None or self.in_use.get(session_id):
+            return False
+        
+        # 백그라운드 요약이 아직 돌아오지 않은 세션은 다음 점검 때 처리
+        if any(item.get("metadata", {}).get("summary_pending") for item in context_manager.working_memory):
+            return False
+        
+        touched_at = self.last_activity.get(session_id)
+        try:
+            await memory_persister.save_snapshot(session_id, context_manager.export_memory_state())
+        except Exception as e:
+            logger.error(f"세션 휴면 저장 오류: {e}")
+            return False
+        
+        # 저장하는 동안 새 요청이 왔거나 연결이 끊겼으면 휴면 취소
+        if (self.last_activity.get(session_id) != touched_at or self.in_use.get(session_id)
+                or self.context_managers.get(session_id) is not context_manager):
+            return False
+        
+        memory_persister.forget(session_id)
+        del self.context_managers[session_id]
+        self.hibernated_sessions.add(session_id)
+        
+        user_id = self.session_users.get(session_id)
+        if user_id:
+            semantic_store.release(user_id)
+        
+        logger.info(f"💤 세션 휴면: {session_id}")
+        return True
+
+    async def hibernate_idle_sessions(self) -> int:
+        """hibernate_after초 이상 요청이 없던 세션 휴면"""
+        now = time.monotonic()
+        idle = [
+            session_id for session_id in list(self.context_managers)
+            if now - self.last_activity.get(session_id, now) >= self.hibernate_after
+            and not self.in_use.get(session_id)
+        ]
+        hibernated = 0
+        for session_id in idle:
+            if await self.hibernate(session_id):
+                hibernated += 1
+        return hibernated
+
+    async def _hibernation_loop(self):
+        interval = max(min(self.hibernate_after / 2, 60.0), 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.hibernate_idle_sessions()
+            except Exception as e:
+                logger.error(f"세션 휴면 점검 오류: {e}")
+
+    def start_hibernation(self):
+        """유휴 세션 휴면 점검 시작 (실행 중인 이벤트 루프 필요)"""
+        if self.hibernate_after > 0 and (self._hibernation_task is None or self._hibernation_task.done()):
+            self._hibernation_task = asyncio.get_running_loop().create_task(self._hibernation_loop())
+
+    def stop_hibernation(self):
+        if self._hibernation_task is not None:
+            self._hibernation_task.cancel()
+            self._hibernation_task = None
 
     def disconnect(self, websocket: WebSocket):
         self.active_connections.remove(websocket)
         session_id = self.session_map.pop(websocket, None)
+        if not session_id:
+            return
+        
+        self.last_activity.pop(session_id, None)
+        self.hibernated_sessions.discard(session_id)
+        user_id = self.session_users.pop(session_id, None)
         
-        # 🔥 메모리 상태 저장 (선택사항)
-        if session_id and session_id in self.context_managers:
-            memory_state = self.context_managers[session_id].export_memory_state()
-            # Replit DB나 파일로 저장 가능
-            # db[f"memory_{session_id}"] = memory_state
+        # 🔥 남은 변경분을 증분으로 기록 (다음 배치 때 저장)
+        if session_id in self.context_managers:
+            context_manager = self.context_managers[session_id]
+            memory_persister.record(
+                session_id,
+                context_manager.collect_memory_delta(),
+                context_manager.export_memory_state
+            )
+            memory_persister.forget(session_id)
+            metrics.forget_session(session_id)
+            
+            # 휴면 중인 세션은 이미 해제됨
+            if user_id:
+                semantic_store.release(user_id)
             
             del self.context_managers[session_id]
-            logger.info(f"클라이언트 연결 해제됨. 세션: {session_id}, 총 연결 수: {len(self.active_connections)}")
+        
+        logger.info(f"클라이언트 연결 해제됨. 세션: {session_id}, 총 연결 수: {len(self.active_connections)}")
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
@@ -99,71 +276,45 @@ class ConnectionManager:
         for connection in self.active_connections:
             await connection.send_text(message)
 
-manager = ConnectionManager()
+manager = ConnectionManager(
+    hibernate_after=float(os.getenv("CONTEXT_HIBERNATE_AFTER", "300"))
+)
 
-# Claude API 클라이언트
-class ClaudeClient:
-    def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
-    
-    async def get_response(self, user_message: str, model: str = "claude-3-opus-4-20250514", context_messages: Optional[List[Dict[str, str]]] = None) -> str:
-        try:
-            # 컨텍스트 메시지가 있으면 포함
-            messages = []
-            if context_messages:
-                messages.extend(context_messages)
-            messages.append({"role": "user", "content": user_message})
-            
-            # 비동기 처리를 위해 ThreadPoolExecutor 사용
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.client.messages.create(
-                    model=model,
-                    max_tokens=1024,
-                    messages=messages
-                )
-            )
-            return response.content[0].text
-        except Exception as e:
-            logger.error(f"Claude API 오류: {str(e)}")
-            return f"Claude API 오류: {str(e)}"
-    
-    async def get_streaming_response(self, user_message: str, model: str = "claude-3-opus-4-20250514") -> AsyncGenerator[str, None]:
-        """스트리밍 응답 생성 (시뮬레이션)"""
-        try:
-            # 실제 Claude API 호출
-            response = await self.get_response(user_message, model)
-            
-            # 응답을 청크 단위로 분할하여 스트리밍 시뮬레이션
-            words = response.split()
-            for i, word in enumerate(words):
-                yield word + " "
-                if i % 3 == 0:  # 3단어마다 잠시 대기
-                    await asyncio.sleep(0.1)
-                    
-        except Exception as e:
-            logger.error(f"Claude API 스트리밍 오류: {str(e)}")
-            yield f"Claude API 오류: {str(e)}"
+@app.on_event("startup")
+async def start_background_workers():
+    """공유 Claude 클라이언트 생성, 컨텍스트 메모리 주기적 저장 및 유휴 세션 휴면 점검 시작"""
+    # 모든 웹소켓과 LLM 분석기가 하나의 클라이언트(HTTP 연결 풀 keep-alive, 동시 요청 제한)를 공유
+    claude_client = claude_registry.start(
+        os.getenv("ANTHROPIC_API_KEY"),
+        max_connections=int(os.getenv("CLAUDE_MAX_CONNECTIONS", "100")),
+        max_keepalive=int(os.getenv("CLAUDE_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("CLAUDE_KEEPALIVE_EXPIRY", "60")),
+        max_in_flight=int(os.getenv("CLAUDE_MAX_IN_FLIGHT", "32"))
+    )
+    if claude_client:
+        # 대화가 바뀌지 않은 채 반복되는 분석 폴링은 캐시에서 응답
+        manager.llm_analyzer = LLMAnalyzer(
+            claude_client,
+            cache=AnalysisCache(
+                max_entries=int(os.getenv("LLM_CACHE_SIZE", "256")),
+                ttl=float(os.getenv("LLM_CACHE_TTL", "300"))
+            ),
+            combined_max_tokens=int(os.getenv("LLM_COMBINED_MAX_TOKENS", "2048"))
+        )
+        logger.info("Claude API 클라이언트 초기화 완료")
+    else:
+        logger.warning("Claude API 키가 설정되지 않음")
     
-    async def get_transformed_stream(self, user_message: str, transformer_configs: Optional[list[Dict[str, Any]]] = None, model: str = "claude-3-opus-4-20250514") -> AsyncGenerator[str, None]:
-        """변환기가 적용된 스트리밍 응답"""
-        # 기본 변환기 설정
-        if transformer_configs is None:
-            transformer_configs = [
-                {"type": "code_format", "language": "python"},
-                {"type": "summary", "summary_ratio": 0.3}
-            ]
-        
-        # 파이프라인 생성
-        pipeline = StreamTransformerFactory.create_pipeline(transformer_configs)
-        
-        # 원본 스트림 생성
-        original_stream = self.get_streaming_response(user_message, model)
-        
-        # 변환된 스트림 반환
-        async for transformed_chunk in pipeline.process(original_stream):
-            yield transformed_chunk
+    memory_persister.start()
+    manager.start_hibernation()
+
+@app.on_event("shutdown")
+async def shutdown_background_workers():
+    """백그라운드 워커 종료 및 남은 메모리 증분 저장"""
+    manager.stop_hibernation()
+    await summary_worker.shutdown()
+    await memory_persister.shutdown()
+    await claude_registry.shutdown()
 
 # 에러 핸들러
 class ErrorHandler:
@@ -224,9 +375,33 @@ async def health_check():
         "status": "healthy", 
         "connections": len(manager.active_connections),
         "claude_api_configured": bool(api_key),
+        "summary_worker": summary_worker.get_stats(),
+        "memory_persister": memory_persister.get_stats(),
+        "token_counter": token_counter.get_stats(),
+        "semantic_store": semantic_store.get_stats(),
+        "metrics": metrics.get_stats(),
+        "claude_client": claude_registry.get_stats(),
+        "llm_analysis_cache": manager.llm_analyzer.cache.get_stats() if manager.llm_analyzer else None,
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """채팅 턴 단계별 지연 시간 히스토그램 (Prometheus 텍스트 형식)"""
+    return PlainTextResponse(
+        metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/api/metrics/session/{session_id}")
+async def get_session_metrics(session_id: str):
+    """세션의 단계별 지연 시간 요약 (요청 수 / 평균 / p50 / p95, ms)"""
+    return {
+        "session_id": session_id,
+        "stages": metrics.get_session_stats(session_id),
+        "overall": metrics.get_stage_stats()
+    }
+
 @app.get("/transformers")
 async def get_available_transformers():
     """사용 가능한 스트림 변환기 목록 반환"""
@@ -273,27 +448,13 @@ async def get_available_transformers():
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    # Claude API 키 확인 및 클라이언트 초기화
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    claude_client = None
-    if api_key:
-        claude_client = ClaudeClient(api_key)
-        logger.info("Claude API 클라이언트 초기화 완료")
-    else:
-        logger.warning("Claude API 키가 설정되지 않음")
+    # 시작 시 만든 공유 Claude 클라이언트 사용 (API 키가 없으면 None)
+    claude_client = claude_registry.client
     
-    await manager.connect(websocket, claude_client)
+    await manager.connect(websocket)
     session_id = manager.session_map[websocket]
     
     try:
-        # Claude API 키 확인 및 클라이언트 초기화
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if api_key:
-            claude_client = ClaudeClient(api_key)
-            logger.info("Claude API 클라이언트 초기화 완료")
-        else:
-            logger.warning("Claude API 키가 설정되지 않음")
-        
         while True:
             try:
                 data = await websocket.receive_text()
@@ -318,119 +479,159 @@ async def websocket_endpoint(websocket: WebSocket):
                         )
                         continue
                     
-                    # 🔥 컨텍스트 매니저 가져오기
-                    context_manager = manager.context_managers[session_id]
+                    # ⏱️ 단계별 지연 시간 측정 (METRICS_ENABLED=false 이면 no-op)
+                    turn_timer = metrics.turn(session_id)
+                    turn_start = time.perf_counter()
                     
-                    # 🔥 관련 컨텍스트 검색
-                    relevant_memories = await context_manager.retrieve_relevant_context(
-                        user_message, 
-                        max_results=3
-                    )
-                    
-                    # 🔥 시스템 프롬프트에 컨텍스트 추가
-                    context_prompt = context_manager.get_system_prompt_context()
-                    
-                    # 스트리밍 모드 확인
-                    use_streaming = message_data.get("streaming", False)
-                    transformer_configs = message_data.get("transformers", None)
-                    
-                    if claude_client:
-                        # 🔥 컨텍스트 메시지 준비
-                        context_messages = context_manager._build_current_context().messages
+                    # 🔥 컨텍스트 매니저 가져오기 (턴이 끝날 때까지 휴면 대상에서 제외)
+                    async with manager.using(session_id) as context_manager:
                         
-                        if use_streaming:
-                            # 스트리밍 응답 전송
-                            await manager.send_personal_message(json.dumps({
-                                "type": "stream_start",
-                                "timestamp": datetime.now().isoformat()
-                            }), websocket)
+                        # 🔥 관련 컨텍스트 검색
+                        with turn_timer.span("retrieval"):
+                            relevant_memories = await context_manager.retrieve_relevant_context(
+                                user_message, 
+                                max_results=3
+                            )
+                        
+                        # 스트리밍 모드 확인
+                        use_streaming = message_data.get("streaming", False)
+                        transformer_configs = message_data.get("transformers", None)
+                        
+                        if claude_client:
+                            # 🔥 토큰 예산 안에서 컨텍스트 구성 (요약/주요 포인트/관련 기억/최근 대화)
+                            with turn_timer.span("prompt_build"):
+                                packed_context = context_manager.pack_context(relevant_memories)
                             
-                            # 변환기가 있는 경우 변환된 스트림 사용
-                            if transformer_configs:
-                                async for chunk in claude_client.get_transformed_stream(user_message, transformer_configs):
+                            if use_streaming:
+                                # 스트리밍 응답 전송
+                                # (다음 청크를 기다린 시간은 claude, 웹소켓 전송 시간은 send 단계로 합산해 턴마다 한 번 기록)
+                                mark = time.perf_counter()
+                                await manager.send_personal_message(json.dumps({
+                                    "type": "stream_start",
+                                    "timestamp": datetime.now().isoformat()
+                                }), websocket)
+                                upstream_seconds = 0.0
+                                send_seconds = time.perf_counter() - mark
+                                
+                                # 변환기가 있는 경우 변환된 스트림 사용
+                                # 일반 스트리밍은 업스트림 토큰을 받는 즉시 전송하고, 전송이 끝나야 다음 토큰을 읽음
+                                if transformer_configs:
+                                    stream = claude_client.get_transformed_stream(
+                                        user_message, transformer_configs,
+                                        context_messages=packed_context.messages,
+                                        system=packed_context.system
+                                    )
+                                else:
+                                    stream = claude_client.get_streaming_response(
+                                        user_message,
+                                        context_messages=packed_context.messages,
+                                        system=packed_context.system
+                                    )
+                                
+                                mark = time.perf_counter()
+                                async for chunk in stream:
+                                    received = time.perf_counter()
+                                    upstream_seconds += received - mark
                                     await manager.send_personal_message(json.dumps({
                                         "type": "stream_chunk",
                                         "content": chunk,
                                         "timestamp": datetime.now().isoformat()
                                     }), websocket)
+                                    mark = time.perf_counter()
+                                    send_seconds += mark - received
+                                received = time.perf_counter()
+                                upstream_seconds += received - mark  # 마지막 청크 이후 스트림 종료까지
+                                
+                                # 스트리밍 종료
+                                await manager.send_personal_message(json.dumps({
+                                    "type": "stream_end",
+                                    "timestamp": datetime.now().isoformat()
+                                }), websocket)
+                                send_seconds += time.perf_counter() - received
+                                
+                                turn_timer.record("claude", upstream_seconds)
+                                turn_timer.record("send", send_seconds)
+                                turn_timer.record("turn", time.perf_counter() - turn_start)
                             else:
-                                # 일반 스트리밍
-                                async for chunk in claude_client.get_streaming_response(user_message):
-                                    await manager.send_personal_message(json.dumps({
-                                        "type": "stream_chunk",
-                                        "content": chunk,
-                                        "timestamp": datetime.now().isoformat()
-                                    }), websocket)
-                            
-                            # 스트리밍 종료
-                            await manager.send_personal_message(json.dumps({
-                                "type": "stream_end",
-                                "timestamp": datetime.now().isoformat()
-                            }), websocket)
-                        else:
-                            # 🌿 AI 페르소나 시스템을 통한 응답 생성
-                            persona_response = persona_manager.generate_response(
-                                user_message, 
-                                context={"session_id": session_id}
-                            )
-                            
-                            # Anthropic 안전 프롬프트 생성
-                            safe_prompt = persona_manager.create_safe_prompt_for_claude(
-                                user_message, 
-                                persona_response
-                            )
-                            
-                            ai_response = await claude_client.get_response(
-                                safe_prompt, 
-                                context_messages=context_messages
-                            )
-                            
-                            # 🔥 상호작용을 컨텍스트 매니저에 추가
-                            conversation_context = await context_manager.add_interaction(
-                                user_message=user_message,
-                                ai_response=ai_response,
-                                metadata={
-                                    "boundaries_detected": 0,  # 분석 결과
-                                    "emotion_tone": {"enthusiasm": 0.7},  # 감정 분석 결과
-                                    "persona_state": {
+                                # 🌿 AI 페르소나 시스템을 통한 응답 생성
+                                with turn_timer.span("persona"):
+                                    persona_response = persona_manager.generate_response(
+                                        user_message, 
+                                        context={"session_id": session_id}
+                                    )
+                                
+                                # Anthropic 안전 프롬프트 생성
+                                with turn_timer.span("prompt_build"):
+                                    safe_prompt = persona_manager.create_safe_prompt_for_claude(
+                                        user_message, 
+                                        persona_response
+                                    )
+                                
+                                # 🔮 응답을 기다리는 동안 응답과 무관한 값(메시지 특징, 새 주제 여부, 다음 검색 후보)을 미리 계산
+                                prefetch_task = asyncio.create_task(context_manager.prefetch(user_message))
+                                
+                                with turn_timer.span("claude"):
+                                    ai_response = await claude_client.get_response(
+                                        safe_prompt, 
+                                        context_messages=packed_context.messages,
+                                        system=packed_context.system
+                                    )
+                                await prefetch_task
+                                
+                                # 🔥 상호작용을 컨텍스트 매니저에 추가
+                                with turn_timer.span("add_interaction"):
+                                    conversation_context = await context_manager.add_interaction(
+                                        user_message=user_message,
+                                        ai_response=ai_response,
+                                        session_id=session_id,
+                                        metadata={
+                                            "boundaries_detected": 0,  # 분석 결과
+                                            "emotion_tone": {"enthusiasm": 0.7},  # 감정 분석 결과
+                                            "persona_state": {
+                                                "location": persona_response.location.value,
+                                                "growth_stage": persona_response.growth_stage.value,
+                                                "mask_level": persona_response.mask_level,
+                                                "authenticity": persona_response.authenticity
+                                            }
+                                        }
+                                    )
+                                
+                                # 응답 전송 (페르소나 정보 포함)
+                                response_data = {
+                                    "type": "assistant",
+                                    "content": ai_response,
+                                    "timestamp": datetime.now().isoformat(),
+                                    "context_info": {
+                                        "conversation_depth": len(conversation_context.messages),
+                                        "current_topics": conversation_context.topic_stack[-3:],
+                                        "emotional_state": conversation_context.emotional_state,
+                                        "compression_active": len([m for m in conversation_context.messages 
+                                                                if m.get("role") == "system"]) > 0
+                                    },
+                                    "persona_info": {
                                         "location": persona_response.location.value,
                                         "growth_stage": persona_response.growth_stage.value,
+                                        "episode_count": persona_manager.persona_state.episode_count,
                                         "mask_level": persona_response.mask_level,
-                                        "authenticity": persona_response.authenticity
+                                        "security_protocol": persona_response.security_protocol.value if persona_response.security_protocol else None
                                     }
                                 }
-                            )
-                            
-                            # 응답 전송 (페르소나 정보 포함)
-                            response_data = {
+                                
+                                # 요청 시 지금까지의 단계별 소요 시간(ms)을 함께 전송 (전송 단계는 /metrics 에만 집계)
+                                if message_data.get("include_timings", False):
+                                    response_data["context_info"]["timings"] = turn_timer.as_dict()
+                                
+                                with turn_timer.span("send"):
+                                    await manager.send_personal_message(json.dumps(response_data), websocket)
+                                turn_timer.record("turn", time.perf_counter() - turn_start)
+                        else:
+                            error_msg = "Claude API 키가 설정되지 않았습니다. .env 파일에 ANTHROPIC_API_KEY를 추가해주세요."
+                            await manager.send_personal_message(json.dumps({
                                 "type": "assistant",
-                                "content": ai_response,
-                                "timestamp": datetime.now().isoformat(),
-                                "context_info": {
-                                    "conversation_depth": len(conversation_context.messages),
-                                    "current_topics": conversation_context.topic_stack[-3:],
-                                    "emotional_state": conversation_context.emotional_state,
-                                    "compression_active": len([m for m in conversation_context.messages 
-                                                            if m.get("role") == "system"]) > 0
-                                },
-                                "persona_info": {
-                                    "location": persona_response.location.value,
-                                    "growth_stage": persona_response.growth_stage.value,
-                                    "episode_count": persona_manager.persona_state.episode_count,
-                                    "mask_level": persona_response.mask_level,
-                                    "security_protocol": persona_response.security_protocol.value if persona_response.security_protocol else None
-                                }
-                            }
-                            
-                            await manager.send_personal_message(json.dumps(response_data), websocket)
-                    else:
-                        error_msg = "Claude API 키가 설정되지 않았습니다. .env 파일에 ANTHROPIC_API_KEY를 추가해주세요."
-                        await manager.send_personal_message(json.dumps({
-                            "type": "assistant",
-                            "content": error_msg,
-                            "timestamp": datetime.now().isoformat()
-                        }), websocket)
-                    
+                                "content": error_msg,
+                                "timestamp": datetime.now().isoformat()
+                            }), websocket)
+                        
                 # 파일 업로드 처리
                 elif message_data.get("type") == "file":
                     try:
@@ -475,10 +676,9 @@ async def websocket_endpoint(websocket: WebSocket):
 @app.get("/api/context/session/{session_id}")
 async def get_session_context(session_id: str):
     """세션의 현재 컨텍스트 상태"""
-    if session_id not in manager.context_managers:
+    context_manager = await manager.get_context_manager(session_id)
+    if context_manager is None:
         return {"error": "Session not found"}
-    
-    context_manager = manager.context_managers[session_id]
     current_context = context_manager._build_current_context()
     
     return {
@@ -490,6 +690,7 @@ async def get_session_context(session_id: str):
         "emotional_state": current_context.emotional_state,
         "memory_stats": {
             "working": len(context_manager.working_memory),
+            "working_tokens": context_manager.working_tokens,
             "episodic": len(context_manager.episodic_memory),
             "semantic": len(context_manager.semantic_memory)
         }
@@ -498,11 +699,10 @@ async def get_session_context(session_id: str):
 @app.get("/api/context/memory/{session_id}")
 async def get_memory_details(session_id: str, memory_type: str = "all"):
     """세션의 메모리 상세 정보"""
-    if session_id not in manager.context_managers:
+    context_manager = await manager.get_context_manager(session_id)
+    if context_manager is None:
         return {"error": "Session not found"}
     
-    context_manager = manager.context_managers[session_id]
-    
     result = {}
     
     if memory_type in ["all", "working"]:
@@ -532,13 +732,25 @@ async def get_memory_details(session_id: str, memory_type: str = "all"):
     
     return result
 
+@app.get("/api/context/emotions/{session_id}")
+async def get_emotion_trajectory(session_id: str, window: Optional[int] = Query(None, ge=1)):
+    """세션의 감정 점수 궤적과 윈도우 통계 (평균/변화량/기울기)"""
+    context_manager = await manager.get_context_manager(session_id)
+    if context_manager is None:
+        return {"error": "Session not found"}
+    
+    return {
+        "session_id": session_id,
+        "capacity": context_manager.emotion_series.capacity,
+        **context_manager.get_emotional_trajectory(window)
+    }
+
 @app.post("/api/context/export/{session_id}")
 async def export_context(session_id: str):
     """컨텍스트 내보내기"""
-    if session_id not in manager.context_managers:
+    context_manager = await manager.get_context_manager(session_id)
+    if context_manager is None:
         return {"error": "Session not found"}
-    
-    context_manager = manager.context_managers[session_id]
     memory_state = context_manager.export_memory_state()
     
     return JSONResponse(
@@ -552,88 +764,115 @@ async def export_context(session_id: str):
 @app.get("/api/llm/analyze/{session_id}")
 async def analyze_conversation(session_id: str):
     """대화 종합 분석"""
-    if session_id not in manager.context_managers:
-        return {"error": "Session not found"}
-    
-    context_manager = manager.context_managers[session_id]
-    
-    if not context_manager.llm_analyzer:
-        return {"error": "LLM analyzer not available"}
-    
-    try:
-        current_context = context_manager._build_current_context()
-        analysis = await context_manager.llm_analyzer.analyze_conversation(
-            current_context.messages
-        )
+    async with manager.using(session_id) as context_manager:
+        if context_manager is None:
+            return {"error": "Session not found"}
+        
+        if not context_manager.llm_analyzer:
+            return {"error": "LLM analyzer not available"}
+        
+        try:
+            current_context = context_manager._build_current_context()
+            analysis = await context_manager.llm_analyzer.analyze_conversation(
+                current_context.messages
+            )
+            
+            return {
+                "session_id": session_id,
+                "analysis": _serialize_analysis(analysis)
+            }
+        except Exception as e:
+            logger.error(f"LLM 분석 오류: {e}")
+            return {"error": f"Analysis failed: {str(e)}"}
+
+def _serialize_analysis(analysis: ConversationAnalysis) -> Dict[str, Any]:
+    return {
+        "summary": analysis.summary,
+        "key_topics": analysis.key_topics,
+        "emotional_state": analysis.emotional_state,
+        "complexity_level": analysis.complexity_level,
+        "user_interests": analysis.user_interests,
+        "conversation_quality": analysis.conversation_quality,
+        "suggested_directions": analysis.suggested_directions,
+        "timestamp": analysis.timestamp.isoformat()
+    }
+
+@app.get("/api/llm/combined/{session_id}")
+async def analyze_conversation_combined(session_id: str):
+    """종합 분석 + 인사이트 + 감정 궤적을 한 번의 Claude 호출로 반환"""
+    async with manager.using(session_id) as context_manager:
+        if context_manager is None:
+            return {"error": "Session not found"}
+        
+        if not context_manager.llm_analyzer:
+            return {"error": "LLM analyzer not available"}
         
-        return {
-            "session_id": session_id,
-            "analysis": {
-                "summary": analysis.summary,
-                "key_topics": analysis.key_topics,
-                "emotional_state": analysis.emotional_state,
-                "complexity_level": analysis.complexity_level,
-                "user_interests": analysis.user_interests,
-                "conversation_quality": analysis.conversation_quality,
-                "suggested_directions": analysis.suggested_directions,
-                "timestamp": analysis.timestamp.isoformat()
+        try:
+            current_context = context_manager._build_current_context()
+            combined = await context_manager.llm_analyzer.analyze_all(
+                current_context.messages
+            )
+            
+            return {
+                "session_id": session_id,
+                "analysis": _serialize_analysis(combined.analysis),
+                "insights": combined.insights,
+                "emotion_analysis": combined.emotion_trajectory,
+                "timestamp": datetime.now().isoformat()
             }
-        }
-    except Exception as e:
-        logger.error(f"LLM 분석 오류: {e}")
-        return {"error": f"Analysis failed: {str(e)}"}
+        except Exception as e:
+            logger.error(f"LLM 통합 분석 오류: {e}")
+            return {"error": f"Combined analysis failed: {str(e)}"}
 
 @app.get("/api/llm/insights/{session_id}")
 async def get_conversation_insights(session_id: str):
     """대화 인사이트 추출"""
-    if session_id not in manager.context_managers:
-        return {"error": "Session not found"}
-    
-    context_manager = manager.context_managers[session_id]
-    
-    if not context_manager.llm_analyzer:
-        return {"error": "LLM analyzer not available"}
-    
-    try:
-        current_context = context_manager._build_current_context()
-        insights = await context_manager.llm_analyzer.extract_key_insights(
-            current_context.messages
-        )
+    async with manager.using(session_id) as context_manager:
+        if context_manager is None:
+            return {"error": "Session not found"}
         
-        return {
-            "session_id": session_id,
-            "insights": insights,
-            "timestamp": datetime.now().isoformat()
-        }
-    except Exception as e:
-        logger.error(f"인사이트 추출 오류: {e}")
-        return {"error": f"Insights extraction failed: {str(e)}"}
+        if not context_manager.llm_analyzer:
+            return {"error": "LLM analyzer not available"}
+        
+        try:
+            current_context = context_manager._build_current_context()
+            insights = await context_manager.llm_analyzer.extract_key_insights(
+                current_context.messages
+            )
+            
+            return {
+                "session_id": session_id,
+                "insights": insights,
+                "timestamp": datetime.now().isoformat()
+            }
+        except Exception as e:
+            logger.error(f"인사이트 추출 오류: {e}")
+            return {"error": f"Insights extraction failed: {str(e)}"}
 
 @app.get("/api/llm/emotion/{session_id}")
 async def analyze_emotion_trajectory(session_id: str):
     """감정 궤적 분석"""
-    if session_id not in manager.context_managers:
-        return {"error": "Session not found"}
-    
-    context_manager = manager.context_managers[session_id]
-    
-    if not context_manager.llm_analyzer:
-        return {"error": "LLM analyzer not available"}
-    
-    try:
-        current_context = context_manager._build_current_context()
-        emotion_analysis = await context_manager.llm_analyzer.analyze_emotional_trajectory(
-            current_context.messages
-        )
+    async with manager.using(session_id) as context_manager:
+        if context_manager is None:
+            return {"error": "Session not found"}
         
-        return {
-            "session_id": session_id,
-            "emotion_analysis": emotion_analysis,
-            "timestamp": datetime.now().isoformat()
-        }
-    except Exception as e:
-        logger.error(f"감정 분석 오류: {e}")
-        return {"error": f"Emotion analysis failed: {str(e)}"}
+        if not context_manager.llm_analyzer:
+            return {"error": "LLM analyzer not available"}
+        
+        try:
+            current_context = context_manager._build_current_context()
+            emotion_analysis = await context_manager.llm_analyzer.analyze_emotional_trajectory(
+                current_context.messages
+            )
+            
+            return {
+                "session_id": session_id,
+                "emotion_analysis": emotion_analysis,
+                "timestamp": datetime.now().isoformat()
+            }
+        except Exception as e:
+            logger.error(f"감정 분석 오류: {e}")
+            return {"error": f"Emotion analysis failed: {str(e)}"}
 
 # 🌿 AI 페르소나 API 엔드포인트들
 @app.get("/api/persona/info")
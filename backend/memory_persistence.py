@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+컨텍스트 메모리 증분 저장기
+메시지마다 전체 상태를 직렬화하는 대신 변경분(delta)만 모아 배치로 기록하고,
+일정 개수가 쌓이면 전체 스냅샷으로 압축
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database_manager import db_manager
+
+logger = logging.getLogger(__name__)
+
+def with_working_ids(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """ID가 없는 이전 형식의 Working Memory 항목에 위치 기반 고정 ID 부여
+
+    복원(import_memory_state)과 증분 재적용이 같은 ID를 쓰므로, 이후 증분의
+    working_ids가 이전 형식 스냅샷의 항목을 그대로 가리킨다.
+    """
+    return [item if "id" in item else {**item, "id": f"wm_legacy_{index}"}
+            for index, item in enumerate(items)]
+
+def replay_deltas(snapshot: Optional[Dict[str, Any]], deltas: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """스냅샷 위에 증분을 순서대로 적용해 export_memory_state 형식의 상태 복원"""
+    if not deltas:
+        return snapshot
+
+    state = dict(snapshot or {})
+    working_items = with_working_ids(state.get("working_memory", []))
+    working = {item["id"]: item for item in working_items}
+    working_ids = [item["id"] for item in working_items]
+    episodic = {item["id"]: item for item in state.get("episodic_memory", [])}
+    semantic = dict(state.get("semantic_memory", {}))
+
+    for delta in deltas:
+        for item in delta.get("working_upserts", []):
+            working[item["id"]] = item
+        working_ids = delta.get("working_ids", working_ids)
+
+        for item in delta.get("episodic_upserts", []):
+            episodic[item["id"]] = item
+        for memory_id in delta.get("episodic_removed", []):
+            episodic.pop(memory_id, None)
+
+        semantic.update(delta.get("semantic_upserts", {}))
+
+        # 크기가 작은 상태는 증분마다 통째로 기록됨
+        for key in ("patterns", "current_topics", "emotional_trajectory"):
+            if key in delta:
+                state[key] = delta[key]
+
+    state["working_memory"] = [working[i] for i in working_ids if i in working]
+    state["episodic_memory"] = list(episodic.values())
+    state["semantic_memory"] = semantic
+    return state
+
+class MemoryPersister:
+    """증분 배치 기록 + 주기적 스냅샷 압축"""
+
+    def __init__(self, db=None, flush_interval: float = 5.0, batch_size: int = 20,
+                 compact_every: int = 50):
+        self.db = db or db_manager
+        self.flush_interval = flush_interval  # 초 단위
+        self.batch_size = batch_size          # 버퍼에 쌓인 증분 수
+        self.compact_every = compact_every    # 세션별 증분 수
+
+        # 세션별 (순번, 증분) 목록. 순번은 기록 실패 후 되돌릴 때 순서를 지키는 데 쓴다
+        self._buffers: Dict[str, List[Tuple[int, Dict]]] = defaultdict(list)
+        self._snapshot_providers: Dict[str, Callable[[], Dict]] = {}
+        self._delta_counts: Dict[str, int] = defaultdict(int)
+        self._sequence = itertools.count(1)
+        self._last_sequence = 0
+        self._snapshot_cutoffs: Dict[str, int] = {}  # 저장된 스냅샷에 이미 반영된 마지막 순번
+        self._pending_snapshots = 0  # 기록 잠금을 기다리거나 기록 중인 스냅샷 수
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()  # 증분 기록과 스냅샷 교체가 겹치지 않도록
+
+        # 통계
+        self.stats = {"deltas": 0, "flushes": 0, "compactions": 0, "failures": 0}
+
+    def record(self, session_id: str, delta: Dict[str, Any], snapshot: Callable[[], Dict]):
+        """증분 등록 (디스크 I/O 없음)"""
+        with self._lock:
+            self._last_sequence = next(self._sequence)
+            self._buffers[session_id].append((self._last_sequence, delta))
+        self._snapshot_providers[session_id] = snapshot
+        self.stats["deltas"] += 1
+
+    @property
+    def buffered_count(self) -> int:
+        return sum(len(deltas) for deltas in self._buffers.values())
+
+    def should_flush(self) -> bool:
+        buffered = self.buffered_count
+        if buffered >= self.batch_size:
+            return True
+        return buffered > 0 and time.monotonic() - self._last_flush >= self.flush_interval
+
+    async def maybe_flush(self):
+        """임계값을 넘었으면 이벤트 루프 밖에서 기록"""
+        if self.should_flush():
+            await self.flush()
+
+    async def flush(self):
+        """버퍼의 증분을 기록하고 필요한 세션은 스냅샷으로 압축
+
+        기록에 실패하면 배치를 버퍼 앞쪽에 되돌리고 증분 수도 복원해
+        다음 flush에서 다시 기록한다.
+        """
+        if self._write_lock.locked() or self._pending_snapshots:
+            return  # 진행 중인 기록이 끝나면 다음 기회에 저장
+        
+        with self._lock:
+            entries = dict(self._buffers)
+            self._buffers = defaultdict(list)
+        self._last_flush = time.monotonic()
+        if not entries:
+            return
+
+        # 스냅샷은 상태를 변경하는 이벤트 루프 스레드에서 만든다
+        previous_counts = {session_id: self._delta_counts[session_id] for session_id in entries}
+        snapshots = {}
+        for session_id, buffered in entries.items():
+            self._delta_counts[session_id] += len(buffered)
+            provider = self._snapshot_providers.get(session_id)
+            if provider and self._delta_counts[session_id] >= self.compact_every:
+                snapshots[session_id] = provider()
+                self._delta_counts[session_id] = 0
+
+        batch = {session_id: [delta for _, delta in buffered] for session_id, buffered in entries.items()}
+        async with self._write_lock:
+            written = await asyncio.to_thread(self._write, batch, snapshots)
+            if not written:
+                self._requeue(entries, previous_counts)
+
+    def _write(self, batch: Dict[str, List[Dict]], snapshots: Dict[str, Dict]) -> bool:
+        try:
+            self.db.append_context_deltas(batch)
+            for session_id, snapshot in snapshots.items():
+                self.db.save_context_memory(session_id, snapshot)
+                self.db.clear_context_deltas(session_id)
+        except Exception as e:
+            logger.error(f"메모리 증분 저장 오류: {e}")
+            self.stats["failures"] += 1
+            return False
+        self.stats["flushes"] += 1
+        self.stats["compactions"] += len(snapshots)
+        return True
+
+    def _requeue(self, entries: Dict[str, List[Tuple[int, Dict]]], counts: Dict[str, int]):
+        """기록하지 못한 증분을 순번 순서대로 버퍼에 되돌림 (이미 스냅샷에 반영된 증분은 제외)"""
+        with self._lock:
+            for session_id, buffered in entries.items():
+                cutoff = self._snapshot_cutoffs.get(session_id, 0)
+                restored = [entry for entry in buffered if entry[0] > cutoff]
+                if not restored:
+                    continue
+                merged = restored + self._buffers.get(session_id, [])
+                self._buffers[session_id] = sorted(merged, key=lambda entry: entry[0])
+        for session_id, count in counts.items():
+            self._delta_counts[session_id] = count
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """저장된 스냅샷 + 증분으로 상태 복원 (아직 기록 전인 버퍼도 반영)"""
+        snapshot = self.db.get_context_memory(session_id)
+        deltas = list(self.db.get_context_deltas(session_id))
+        with self._lock:
+            deltas.extend(delta for _, delta in self._buffers.get(session_id, []))
+        return replay_deltas(snapshot, deltas)
+
+    async def save_snapshot(self, session_id: str, snapshot: Dict[str, Any]):
+        """전체 스냅샷을 즉시 저장하고 그 이전 증분은 폐기 (세션 휴면 시)
+
+        버퍼는 호출 시점에 비운다. 기록 잠금을 기다리는 동안 들어온 증분은
+        스냅샷보다 새로우므로 남겨 두었다가 스냅샷 뒤에 기록한다.
+        저장에 실패하면 비운 증분을 되돌리고 예외를 그대로 올린다.
+        """
+        with self._lock:
+            cutoff = self._last_sequence
+            popped = self._buffers.pop(session_id, [])
+        previous_count = self._delta_counts.pop(session_id, 0)
+
+        self._pending_snapshots += 1
+        try:
+            async with self._write_lock:
+                def write():
+                    self.db.save_context_memory(session_id, snapshot)
+                    self.db.clear_context_deltas(session_id)
+
+                try:
+                    await asyncio.to_thread(write)
+                except Exception:
+                    self.stats["failures"] += 1
+                    self._requeue({session_id: popped}, {session_id: previous_count})
+                    raise
+
+                with self._lock:
+                    self._snapshot_cutoffs[session_id] = max(cutoff, self._snapshot_cutoffs.get(session_id, 0))
+                    # 실패한 flush가 되돌려 놓은 이전 증분은 스냅샷에 이미 반영됨
+                    remaining = [entry for entry in self._buffers.get(session_id, []) if entry[0] > cutoff]
+                    if remaining:
+                        self._buffers[session_id] = remaining
+                    else:
+                        self._buffers.pop(session_id, None)
+                self.stats["compactions"] += 1
+        finally:
+            self._pending_snapshots -= 1
+
+    def forget(self, session_id: str):
+        """세션 종료 시 스냅샷 공급자 해제 (버퍼는 다음 기록 때 저장)"""
+        self._snapshot_providers.pop(session_id, None)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.maybe_flush()
+            except Exception as e:
+                logger.error(f"주기적 메모리 저장 오류: {e}")
+
+    def start(self):
+        """주기적 기록 태스크 시작 (실행 중인 이벤트 루프 필요)"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def shutdown(self):
+        """남은 증분을 모두 기록하고 태스크 종료"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "buffered": self.buffered_count}
+
+# 전역 메모리 저장기 인스턴스
+memory_persister = MemoryPersister(
+    flush_interval=float(os.getenv("MEMORY_FLUSH_INTERVAL", "5")),
+    batch_size=int(os.getenv("MEMORY_FLUSH_BATCH_SIZE", "20")),
+    compact_every=int(os.getenv("MEMORY_COMPACT_EVERY", "50"))
+)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Episodic Memory 저장소
+삽입 순서를 유지하면서 지연 감쇠 중요도 기준 최소 힙으로 O(log n) 삽입/최하위 제거 지원
+"""
+
+import heapq
+import math
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+if TYPE_CHECKING:
+    from context_manager import Memory
+
+IMPORTANCE_FLOOR = 0.1  # 감쇠 후 최소 중요도
+
+def effective_importance(base, anchor, now: float, decay_rate=0.1):
+    """닫힌 형태 감쇠 중요도: max(floor, base * exp(-rate * 경과 시간))
+
+    base, anchor(epoch 초), decay_rate(시간당)는 스칼라 또는 numpy 배열.
+    지수 감쇠는 기준 시점을 옮겨도 값이 같으므로 몇 번 계산하든 결과가 누적되지 않는다.
+    """
+    if NUMPY_AVAILABLE and isinstance(base, np.ndarray):
+        hours = np.maximum(now - anchor, 0.0) / 3600
+        return np.maximum(IMPORTANCE_FLOOR, base * np.exp(-decay_rate * hours))
+    hours = max(now - anchor, 0.0) / 3600
+    return max(IMPORTANCE_FLOOR, base * math.exp(-decay_rate * hours))
+
+def effective_importances(memories: Sequence["Memory"], now: Optional[float] = None):
+    """여러 메모리의 감쇠 중요도를 한 번에 계산 (numpy 사용 시 배열 연산)"""
+    now = time.time() if now is None else now
+    if NUMPY_AVAILABLE:
+        return effective_importance(
+            np.fromiter((m.importance for m in memories), dtype=np.float64, count=len(memories)),
+            np.fromiter((m.decay_anchor for m in memories), dtype=np.float64, count=len(memories)),
+            now,
+            np.fromiter((m.decay_rate for m in memories), dtype=np.float64, count=len(memories))
+        )
+    return [effective_importance(m.importance, m.decay_anchor, now, m.decay_rate) for m in memories]
+
+def rank_by_importance(memories: Sequence["Memory"], limit: Optional[int] = None,
+                       now: Optional[float] = None) -> List["Memory"]:
+    """감쇠 중요도 내림차순 정렬 (동점은 원래 순서 유지)"""
+    if not memories:
+        return []
+    scores = effective_importances(memories, now)
+    if NUMPY_AVAILABLE:
+        order = np.argsort(-scores, kind="stable")
+    else:
+        order = sorted(range(len(memories)), key=lambda i: -scores[i])
+    if limit is not None:
+        order = order[:limit]
+    return [memories[i] for i in order]
+
+class EpisodicStore:
+    """삽입 순서 + 감쇠 중요도 힙 기반 Episodic Memory 저장소"""
+
+    def __init__(self):
+        self._items: Dict[str, "Memory"] = {}  # 삽입 순서 유지
+        self._heap: List[Tuple[float, int, str]] = []
+        self._heap_seq: Dict[str, int] = {}  # ID별 최신 힙 항목 (이전 항목은 무효)
+        self._seq = 0
+
+    def priority_key(self, memory: "Memory") -> float:
+        """시간에 따라 순서가 변하지 않는 감쇠 키
+
+        유효 중요도 importance * exp(-rate * (now - decay_anchor)) 의 로그에서
+        모든 메모리에 공통인 -rate * now 항을 뺀 값이므로, 힙을 재정렬하지 않아도
+        어느 시점에서든 유효 중요도 순서와 일치한다 (같은 감쇠율 기준).
+        """
+        hours = memory.decay_anchor / 3600
+        return math.log(max(memory.importance, 1e-9)) + memory.decay_rate * hours
+
+    def _push(self, memory: "Memory"):
+        self._seq += 1
+        self._heap_seq[memory.id] = self._seq
+        heapq.heappush(self._heap, (self.priority_key(memory), self._seq, memory.id))
+
+        # 무효 항목이 쌓이면 힙 재구축
+        if len(self._heap) > 2 * len(self._items) + 64:
+            self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = []
+        self._heap_seq = {}
+        for memory in self._items.values():
+            self._seq += 1
+            self._heap_seq[memory.id] = self._seq
+            self._heap.append((self.priority_key(memory), self._seq, memory.id))
+        heapq.heapify(self._heap)
+
+    def append(self, memory: "Memory"):
+        """메모리 추가 - O(log n)"""
+        self._items[memory.id] = memory
+        self._push(memory)
+
+    def touch(self, memory: "Memory"):
+        """중요도나 접근 시각이 바뀐 메모리의 힙 위치 갱신 - O(log n)"""
+        if memory.id in self._items:
+            self._push(memory)
+
+    def remove(self, memory_id: str) -> Optional["Memory"]:
+        """메모리 제거 (힙 항목은 지연 삭제)"""
+        self._heap_seq.pop(memory_id, None)
+        return self._items.pop(memory_id, None)
+
+    def pop_lowest(self, count: int) -> List["Memory"]:
+        """유효 중요도가 가장 낮은 메모리 count개 제거 - O(count log n)"""
+        evicted = []
+        while self._heap and len(evicted) < count:
+            _, seq, memory_id = heapq.heappop(self._heap)
+            if self._heap_seq.get(memory_id) != seq:
+                continue  # 무효 항목
+            del self._heap_seq[memory_id]
+            evicted.append(self._items.pop(memory_id))
+        return evicted
+
+    def get(self, memory_id: str) -> Optional["Memory"]:
+        return self._items.get(memory_id)
+
+    def recent(self, count: int) -> List["Memory"]:
+        """가장 최근에 추가된 메모리 count개 (오래된 순)"""
+        result = []
+        for memory in reversed(self._items.values()):
+            if len(result) >= count:
+                break
+            result.append(memory)
+        result.reverse()
+        return result
+
+    def clear(self):
+        self._items.clear()
+        self._heap.clear()
+        self._heap_seq.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator["Memory"]:
+        return iter(list(self._items.values()))
+
+    def __contains__(self, memory_id: str) -> bool:
+        return memory_id in self._items
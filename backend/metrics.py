@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+채팅 턴 단계별 지연 시간 측정
+검색/프롬프트 구성/페르소나/Claude 호출/상호작용 기록/전송 구간을 히스토그램으로 모아 Prometheus 텍스트 형식으로 노출
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# 초 단위 히스토그램 경계 (Prometheus 기본값과 비슷하게 5ms ~ 30s)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+class Histogram:
+    """고정 경계 히스토그램 - 관측 O(log 버킷 수)"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 마지막 칸은 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, 누적 개수) 목록 - Prometheus 버킷 형식"""
+        result = []
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            result.append((f"{bound:g}", running))
+        result.append(("+Inf", running + self.counts[-1]))
+        return result
+
+    def quantile(self, q: float) -> float:
+        """버킷 상한으로 근사한 분위수"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return self.bounds[-1]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p95_ms": self.quantile(0.95) * 1000
+        }
+
+class _Span:
+    """with 블록 소요 시간을 StageTimer에 기록"""
+
+    __slots__ = ("timer", "stage", "start")
+
+    def __init__(self, timer: "StageTimer", stage: str):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class StageTimer:
+    """채팅 턴 하나의 단계별 소요 시간 (같은 단계를 여러 번 재면 합산)"""
+
+    __slots__ = ("registry", "session_id", "durations")
+
+    def __init__(self, registry: "MetricsRegistry", session_id: Optional[str]):
+        self.registry = registry
+        self.session_id = session_id
+        self.durations: Dict[str, float] = {}
+
+    def span(self, stage: str) -> _Span:
+        return _Span(self, stage)
+
+    def record(self, stage: str, seconds: float):
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+        self.registry.observe(stage, seconds, self.session_id)
+
+    def as_dict(self) -> Dict[str, float]:
+        """context_info 첨부용 {단계: ms}"""
+        return {stage: round(seconds * 1000, 2) for stage, seconds in self.durations.items()}
+
+class _NullTimer:
+    """측정 비활성화 시 사용 - 아무것도 기록하지 않음"""
+
+    __slots__ = ()
+
+    def span(self, stage: str) -> _NullSpan:
+        return _NULL_SPAN
+
+    def record(self, stage: str, seconds: float):
+        pass
+
+    def as_dict(self) -> Dict[str, float]:
+        return {}
+
+_NULL_TIMER = _NullTimer()
+
+class MetricsRegistry:
+    """단계별 / 세션별 지연 시간 히스토그램 모음
+
+    - 단계별 히스토그램은 프로세스 전체 누적
+    - 세션별 히스토그램은 최근 사용 순으로 max_sessions개까지만 유지
+    """
+
+    def __init__(self, enabled: bool = True, max_sessions: int = 1000,
+                 session_labels: bool = False, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.max_sessions = max_sessions
+        self.session_labels = session_labels  # /metrics 에 session 라벨 포함 여부 (카디널리티 주의)
+        self.buckets = buckets
+        self._stages: Dict[str, Histogram] = {}
+        self._sessions: "OrderedDict[str, Dict[str, Histogram]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def turn(self, session_id: Optional[str] = None):
+        """채팅 턴 측정 시작 (비활성화 시 공용 no-op 타이머 반환)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return StageTimer(self, session_id)
+
+    def observe(self, stage: str, seconds: float, session_id: Optional[str] = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+            if session_id is None or self.max_sessions <= 0:
+                return
+            stages = self._sessions.get(session_id)
+            if stages is None:
+                stages = self._sessions[session_id] = {}
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            histogram = stages.get(stage)
+            if histogram is None:
+                histogram = stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def forget_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_stage_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {stage: h.summary() for stage, h in self._stages.items()}
+
+    def get_session_stats(self, session_id: str) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stages = self._sessions.get(session_id, {})
+            return {stage: h.summary() for stage, h in stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._sessions.clear()
+
+    def render_prometheus(self) -> str:
+        """Prometheus 텍스트 노출 형식 (0.0.4)"""
+        name = "chat_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Chat turn stage latency in seconds.",
+            f"# TYPE {name} histogram"
+        ]
+        with self._lock:
+            series = [({"stage": stage}, h) for stage, h in sorted(self._stages.items())]
+            if self.session_labels:
+                for session_id, stages in self._sessions.items():
+                    series.extend(
+                        ({"stage": stage, "session": session_id}, h) for stage, h in sorted(stages.items())
+                    )
+            for labels, histogram in series:
+                label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+                for le, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {count}')
+                lines.append(f"{name}_sum{{{label_text}}} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+            lines.append("# HELP chat_tracked_sessions Sessions with per-session latency histograms.")
+            lines.append("# TYPE chat_tracked_sessions gauge")
+            lines.append(f"chat_tracked_sessions {len(self._sessions)}")
+        return "\n".join(lines) + "\n"
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "stages": len(self._stages),
+            "tracked_sessions": len(self._sessions)
+        }
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+# 전역 지연 시간 측정기 인스턴스
+metrics = MetricsRegistry(
+    enabled=_env_flag("METRICS_ENABLED", "true"),
+    max_sessions=int(os.getenv("METRICS_MAX_SESSIONS", "1000")),
+    session_labels=_env_flag("METRICS_SESSION_LABELS", "false")
+)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+사용자별 공유 Semantic Memory 저장소
+세션(웹소켓 연결)이 끊겨도 주제 지식을 프로세스 안에 유지하고, 재접속 시 그대로 이어서 사용
+"""
+
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List
+
+if TYPE_CHECKING:
+    from context_manager import Memory
+
+class _Shard:
+    """사용자 일부를 담당하는 LRU 샤드 (샤드마다 별도 잠금)"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.users: "OrderedDict[str, Dict[str, Memory]]" = OrderedDict()
+        self.refcounts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def evict_cold(self) -> int:
+        """용량 초과분만큼 사용 중이 아닌 가장 오래된 사용자 제거"""
+        evicted = 0
+        if len(self.users) <= self.capacity:
+            return evicted
+        for user_id in list(self.users):
+            if len(self.users) <= self.capacity:
+                break
+            if self.refcounts.get(user_id, 0) == 0:
+                del self.users[user_id]
+                evicted += 1
+        return evicted
+
+class SemanticMemoryStore:
+    """사용자 ID 기준 샤딩 + 콜드 사용자 LRU 제거"""
+
+    def __init__(self, num_shards: int = 16, max_users: int = 10000):
+        self.num_shards = num_shards
+        self.max_users = max_users
+        capacity = max(max_users // num_shards, 1)
+        self._shards: List[_Shard] = [_Shard(capacity) for _ in range(num_shards)]
+
+        # 통계
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _shard(self, user_id: str) -> _Shard:
+        return self._shards[zlib.crc32(user_id.encode("utf-8")) % self.num_shards]
+
+    def acquire(self, user_id: str) -> Dict[str, "Memory"]:
+        """사용자의 Semantic Memory 사전 반환 (같은 사용자의 세션끼리 공유, release 전까지 제거되지 않음)"""
+        shard = self._shard(user_id)
+        with shard.lock:
+            memory = shard.users.get(user_id)
+            if memory is None:
+                memory = {}
+                shard.users[user_id] = memory
+                self.stats["misses"] += 1
+            else:
+                shard.users.move_to_end(user_id)
+                self.stats["hits"] += 1
+            shard.refcounts[user_id] = shard.refcounts.get(user_id, 0) + 1
+            self.stats["evictions"] += shard.evict_cold()
+        return memory
+
+    def release(self, user_id: str):
+        """세션 종료 시 호출 (마지막 세션이면 LRU 제거 대상이 됨)"""
+        shard = self._shard(user_id)
+        with shard.lock:
+            remaining = shard.refcounts.get(user_id, 0) - 1
+            if remaining > 0:
+                shard.refcounts[user_id] = remaining
+            else:
+                shard.refcounts.pop(user_id, None)
+            if user_id in shard.users:
+                shard.users.move_to_end(user_id)
+            self.stats["evictions"] += shard.evict_cold()
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._shard(user_id).users
+
+    def __len__(self) -> int:
+        return sum(len(shard.users) for shard in self._shards)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "users": len(self),
+            "active_users": sum(len(shard.refcounts) for shard in self._shards),
+            "shards": self.num_shards
+        }
+
+# 전역 Semantic Memory 저장소 인스턴스
+semantic_store = SemanticMemoryStore(
+    num_shards=int(os.getenv("SEMANTIC_STORE_SHARDS", "16")),
+    max_users=int(os.getenv("SEMANTIC_STORE_MAX_USERS", "10000"))
+)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+백그라운드 요약 작업 큐
+컨텍스트 압축 시 LLM 요약을 요청 경로 밖에서 실행하고 결과를 콜백으로 되돌려줌
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SummaryJob:
+    """요약 작업 단위"""
+    key: Hashable
+    summarize: Callable[[], Awaitable[str]]
+    on_done: Callable[[str], None]
+    is_current: Optional[Callable[[], bool]] = None  # 실행 직전 확인, False면 LLM 호출 없이 건너뜀
+
+class SummarizationWorker:
+    """요약 작업 큐 (같은 키의 대기 작업은 병합, 동시 실행 수 제한)"""
+
+    def __init__(self, max_concurrency: int = 2, max_queue_size: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._pending: Dict[Hashable, SummaryJob] = {}
+
+        # 통계
+        self.stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "completed": 0,
+            "skipped": 0,
+            "failed": 0
+        }
+
+    def _ensure_started(self) -> bool:
+        """실행 중인 이벤트 루프에 워커 태스크 시작 (루프가 없으면 False)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        if self._loop is not loop:
+            # 새 루프에서는 큐와 워커를 다시 만든다 (이전 루프의 작업은 폐기)
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._pending.clear()
+            self._workers = [
+                loop.create_task(self._worker_loop())
+                for _ in range(self.max_concurrency)
+            ]
+        return True
+
+    def submit(self, key: Hashable, summarize: Callable[[], Awaitable[str]],
+               on_done: Callable[[str], None],
+               is_current: Optional[Callable[[], bool]] = None) -> bool:
+        """요약 작업 등록 (대기 중인 같은 키는 최신 입력으로 교체)
+
+        is_current: 실행 직전에 결과가 아직 필요한지 확인 (예: 대상 블록이 병합되어 사라짐)
+        """
+        if not self._ensure_started():
+            return False
+
+        self.stats["submitted"] += 1
+
+        existing = self._pending.get(key)
+        if existing is not None:
+            existing.summarize = summarize
+            existing.on_done = on_done
+            existing.is_current = is_current
+            self.stats["coalesced"] += 1
+            return True
+
+        job = SummaryJob(key=key, summarize=summarize, on_done=on_done, is_current=is_current)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning(f"요약 큐가 가득 차 작업을 건너뜁니다: {key}")
+            return False
+
+        self._pending[key] = job
+        return True
+
+    async def _worker_loop(self):
+        """큐에서 작업을 꺼내 순차 실행"""
+        while True:
+            job = await self._queue.get()
+            # 실행이 시작되면 더 이상 병합 대상이 아님
+            self._pending.pop(job.key, None)
+            try:
+                # 대기하는 동안 필요 없어진 작업은 유료 호출 없이 버림
+                if job.is_current is not None and not job.is_current():
+                    self.stats["skipped"] += 1
+                    continue
+                summary = await job.summarize()
+                job.on_done(summary)
+                self.stats["completed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"백그라운드 요약 오류: {e}")
+            finally:
+                self._queue.task_done()
+
+    @property
+    def pending_count(self) -> int:
+        """대기 중인 작업 수"""
+        return self._queue.qsize() if self._queue else 0
+
+    async def drain(self):
+        """대기 및 실행 중인 작업이 모두 끝날 때까지 대기"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def shutdown(self):
+        """워커 태스크 종료"""
+        for task in self._workers:
+            task.cancel()
+        if self._workers and self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._loop = None
+        self._pending.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """작업 통계"""
+        return {**self.stats, "pending": self.pending_count}
+
+# 전역 요약 워커 인스턴스
+summary_worker = SummarizationWorker()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Claude 클라이언트 스트리밍 테스트 스크립트
+로컬 가짜 업스트림(Anthropic Messages API 형식 SSE)을 띄워 실제 네트워크 경로로 검증
+"""
+
+import asyncio
+import json
+import sys
+import os
+import time
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from claude_client import ClaudeClient, ClaudeClientRegistry, InFlightLimiter, create_http_client
+
+class FakeAnthropicServer:
+    """/v1/messages 를 흉내 내는 최소 HTTP 서버 (테스트/벤치마크용)
+
+    stream=true 요청에는 chunks 개의 텍스트 델타를 delay 간격으로 SSE 전송하고,
+    그 외에는 전체 응답을 생성 시간(chunks * delay) 후 한 번에 JSON으로 돌려준다.
+    JSON 응답은 keep-alive 로 같은 연결에서 다음 요청을 계속 받는다.
+    """
+
+    def __init__(self, chunks: int = 20, delay: float = 0.01, text: str = "토큰"):
+        self.chunks = chunks
+        self.delay = delay
+        self.text = text
+        self.requests = []
+        self.sent_events = 0
+        self.connections = 0
+        self.active = 0
+        self.peak_active = 0
+        self._server = None
+        self._handlers = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self) -> "FakeAnthropicServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        # keep-alive 로 남아 있는 연결도 닫아 요청 대기 중인 핸들러를 끝냄
+        for writer in list(self._handlers.values()):
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def _chunk_text(self, i: int) -> str:
+        return f"{self.text}{i} "
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._handlers[asyncio.current_task()] = writer
+        try:
+            while await reader.readline():  # 요청 줄 (빈 값이면 연결 종료)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.lower()] = value.strip()
+                body = json.loads(await reader.readexactly(int(headers.get("content-length", 0))) or b"{}")
+                self.requests.append(body)
+
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+                try:
+                    if body.get("stream"):
+                        await self._stream(body, writer)
+                        break
+                    await asyncio.sleep(self.chunks * self.delay)
+                    payload = json.dumps(self._message(body, "".join(self._chunk_text(i) for i in range(self.chunks)))).encode()
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                        + f"content-length: {len(payload)}\r\n\r\n".encode() + payload
+                    )
+                    await writer.drain()
+                finally:
+                    self.active -= 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._handlers.pop(asyncio.current_task(), None)
+            writer.close()
+
+    def _message(self, body, text: str):
+        return {
+            "id": "msg_fake", "type": "message", "role": "assistant", "model": body.get("model", "fake"),
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": 1, "output_tokens": self.chunks}
+        }
+
+    async def _stream(self, body, writer: asyncio.StreamWriter):
+        writer.write(b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\ncache-control: no-cache\r\nconnection: close\r\n\r\n")
+
+        async def event(name, data):
+            writer.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+            await writer.drain()  # 클라이언트가 읽지 않으면 여기서 대기 (역압)
+
+        message = self._message(body, "")
+        message["content"] = []
+        message["stop_reason"] = None
+        await event("message_start", {"type": "message_start", "message": message})
+        await event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for i in range(self.chunks):
+            await asyncio.sleep(self.delay)
+            await event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": self._chunk_text(i)}})
+            self.sent_events += 1
+        await event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        await event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": self.chunks}})
+        await event("message_stop", {"type": "message_stop"})
+
+def test_streaming_first_chunk():
+    """업스트림 토큰이 도착하는 즉시 전달되는지 테스트"""
+    print("=== 실시간 스트리밍 테스트 ===")
+
+    async def run():
+        async with FakeAnthropicServer(chunks=20, delay=0.02) as server:
+            client = ClaudeClient("test-key", base_url=server.base_url)
+            start = time.perf_counter()
+            first_chunk_at = None
+            chunks = []
+            async for chunk in client.get_streaming_response(
+                "안녕", context_messages=[{"role": "user", "content": "이전"}, {"role": "assistant", "content": "응답"}],
+                system="요약"
+            ):
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter() - start
+                chunks.append(chunk)
+            total = time.perf_counter() - start
+            await client.close()
+
+            assert chunks == [f"토큰{i} " for i in range(20)]
+            # 전체 생성 시간(0.4s)을 기다리지 않고 첫 토큰을 받음
+            assert first_chunk_at < total / 3
+            request = server.requests[-1]
+            assert request["stream"] is True and request["system"] == "요약"
+            assert [m["content"] for m in request["messages"]] == ["이전", "응답", "안녕"]
+
+    asyncio.run(run())
+
+def test_streaming_backpressure():
+    """소비자가 멈추면 업스트림도 더 보내지 못하는지 테스트"""
+    print("=== 스트리밍 역압 테스트 ===")
+
+    async def run():
+        # 소켓 버퍼를 넘길 만큼 큰 청크를 지연 없이 전송
+        async with FakeAnthropicServer(chunks=5000, delay=0, text="x" * 4096) as server:
+            client = ClaudeClient("test-key", base_url=server.base_url)
+            stream = client.get_streaming_response("안녕")
+            await stream.__anext__()
+            await asyncio.sleep(0.3)  # 느린 웹소켓 흉내
+            assert server.sent_events < server.chunks
+            await stream.aclose()
+            await client.close()
+
+    asyncio.run(run())
+
+def test_non_streaming_response():
+    """비스트리밍 응답 테스트"""
+    print("=== 비스트리밍 응답 테스트 ===")
+
+    async def run():
+        async with FakeAnthropicServer(chunks=3, delay=0) as server:
+            client = ClaudeClient("test-key", base_url=server.base_url)
+            assert await client.get_response("안녕") == "토큰0 토큰1 토큰2 "
+            assert server.requests[-1]["max_tokens"] == 1024
+            await client.get_response("안녕", max_tokens=2048)
+            assert server.requests[-1]["max_tokens"] == 2048
+            await client.close()
+
+    asyncio.run(run())
+
+def test_shared_pool_and_limiter():
+    """공유 연결 풀 재사용과 동시 요청 제한 테스트"""
+    print("=== 공유 연결 풀 / 동시 요청 제한 테스트 ===")
+
+    async def run():
+        async with FakeAnthropicServer(chunks=5, delay=0.01) as server:
+            http_client = create_http_client(max_connections=10, max_keepalive=10)
+            limiter = InFlightLimiter(2)
+            clients = [ClaudeClient("test-key", base_url=server.base_url, http_client=http_client, limiter=limiter)
+                       for _ in range(3)]
+
+            # 여러 클라이언트의 순차 요청이 keep-alive 연결 하나를 재사용
+            for client in clients:
+                await client.get_response("안녕")
+            assert server.connections == 1
+
+            # 동시 요청은 제한 수만큼만 업스트림에 도달
+            responses = await asyncio.gather(*(clients[i % 3].get_response("안녕") for i in range(8)))
+            assert all(r.startswith("토큰0") for r in responses)
+            assert server.peak_active == 2
+            stats = limiter.get_stats()
+            assert stats["peak_in_flight"] == 2 and stats["in_flight"] == 0 and stats["queued"] > 0
+
+            await clients[0].close()  # 공유 풀은 닫지 않음
+            assert not http_client.is_closed
+            await http_client.aclose()
+
+    asyncio.run(run())
+
+def test_client_registry():
+    """애플리케이션 범위 클라이언트 보관소 테스트"""
+    print("=== Claude 클라이언트 보관소 테스트 ===")
+
+    async def run():
+        registry = ClaudeClientRegistry()
+        assert registry.start(None) is None  # API 키가 없으면 생성하지 않음
+
+        async with FakeAnthropicServer(chunks=2, delay=0) as server:
+            client = registry.start("test-key", base_url=server.base_url, max_in_flight=4)
+            assert registry.start("test-key") is client  # 재시작해도 같은 클라이언트
+
+            # 여러 웹소켓 재접속이 같은 클라이언트와 연결을 재사용
+            for _ in range(5):
+                assert await registry.client.get_response("안녕") == "토큰0 토큰1 "
+            assert server.connections == 1
+            assert registry.get_stats()["requests"]["requests"] == 5
+
+            http_client = registry.http_client
+            await registry.shutdown()
+            assert http_client.is_closed and registry.client is None
+            assert registry.get_stats()["configured"] is False
+
+    asyncio.run(run())
+
+def main():
+    """모든 테스트 실행"""
+    print("🚀 Claude 클라이언트 테스트 시작\n")
+    test_streaming_first_chunk()
+    test_streaming_backpressure()
+    test_non_streaming_response()
+    test_shared_pool_and_limiter()
+    test_client_registry()
+    print("\n✅ 모든 테스트 완료!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+웹소켓 연결 관리자(ConnectionManager) 테스트 스크립트
+서버 모듈을 main_replit.py와 같은 방식(backend 패키지 + backend 디렉토리 경로)으로 import해 검증
+"""
+
+import asyncio
+import gc
+import json
+import sys
+import os
+import weakref
+
+from fastapi.testclient import TestClient
+
+# 서버 실행과 같은 경로 구성: 프로젝트 루트(backend 패키지)와 backend 디렉토리
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BACKEND_DIR))
+sys.path.append(BACKEND_DIR)
+
+import backend.main_replit_improved as server
+from context_manager import estimate_tokens
+from test_context_manager import InMemoryContextDB
+from tokenizer import Tokenizer
+
+class FakeWebSocket:
+    """accept / send_text 만 흉내 내는 웹소켓"""
+
+    def __init__(self, user_id=None):
+        self.query_params = {"user_id": user_id} if user_id else {}
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+class FakeStreamingClient:
+    """청크 사이에 지연이 있는 가짜 Claude 스트리밍 클라이언트"""
+
+    async def get_streaming_response(self, user_message, context_messages=None, system=None):
+        for i in range(3):
+            await asyncio.sleep(0.02)
+            yield f"토큰{i} "
+
+class FixedTokenizer(Tokenizer):
+    """항상 같은 토큰 수를 돌려주는 토크나이저"""
+
+    def count(self, text: str) -> int:
+        return 7
+
+def test_server_shares_context_singletons():
+    """서버가 시작/종료하는 워커·저장기·토큰 계산기가 컨텍스트 매니저와 같은 인스턴스인지 테스트"""
+    print("=== 서버 전역 인스턴스 공유 테스트 ===")
+    db = InMemoryContextDB()
+    original_db = server.memory_persister.db
+    server.memory_persister.db = db
+    connections = server.ConnectionManager(hibernate_after=0)
+
+    async def run():
+        websocket = FakeWebSocket()
+        await connections.connect(websocket)
+        session_id = connections.session_map[websocket]
+        context_manager = await connections.get_context_manager(session_id)
+
+        assert context_manager.persister is server.memory_persister
+        assert context_manager.summary_worker is server.summary_worker
+
+        await context_manager.add_interaction("파이썬 질문", "답변", session_id=session_id)
+        connections.disconnect(websocket)
+        # 서버 종료 시와 같은 경로로 저장
+        await server.memory_persister.flush()
+        return session_id
+
+    try:
+        session_id = asyncio.run(run())
+        assert db.deltas[session_id][0]["working_upserts"]
+        assert [item["user"] for item in server.memory_persister.load(session_id)["working_memory"]] == ["파이썬 질문"]
+    finally:
+        server.memory_persister.db = original_db
+
+    # 서버가 설정하는 토큰 계산기가 estimate_tokens가 쓰는 계산기
+    tokenizer = server.token_counter.tokenizer
+    server.token_counter.set_tokenizer(FixedTokenizer())
+    try:
+        assert estimate_tokens("아무 문장") == 7
+    finally:
+        server.token_counter.set_tokenizer(tokenizer)
+
+def test_hibernation_skips_busy_sessions():
+    """처리 중인 세션은 휴면하지 않고, 휴면한 매니저는 메모리에서 해제되는지 테스트"""
+    print("=== 세션 휴면 테스트 ===")
+    db = InMemoryContextDB()
+    original_db = server.memory_persister.db
+    server.memory_persister.db = db
+    connections = server.ConnectionManager(hibernate_after=0.01)
+
+    async def run():
+        websocket = FakeWebSocket()
+        await connections.connect(websocket)
+        session_id = connections.session_map[websocket]
+
+        async with connections.using(session_id) as context_manager:
+            await context_manager.add_interaction("파이썬 질문", "답변", session_id=session_id)
+            # Claude 응답을 기다리는 동안 휴면 시간이 지나도 해제되지 않음
+            await asyncio.sleep(0.02)
+            assert await connections.hibernate_idle_sessions() == 0
+            assert not await connections.hibernate(session_id)
+        assert connections.in_use == {}
+
+        await asyncio.sleep(0.02)
+        assert await connections.hibernate_idle_sessions() == 1
+        assert session_id in connections.hibernated_sessions and server.memory_persister.buffered_count == 0
+        released = weakref.ref(context_manager)
+        del context_manager
+
+        # 다음 요청에서 스냅샷으로 복원
+        async with connections.using(session_id) as restored:
+            assert [item["user"] for item in restored.working_memory] == ["파이썬 질문"]
+        connections.disconnect(websocket)
+        await server.memory_persister.flush()
+        return released
+
+    try:
+        released = asyncio.run(run())
+    finally:
+        server.memory_persister.db = original_db
+    gc.collect()
+    assert released() is None
+
+def test_emotion_endpoint():
+    """감정 궤적 API의 window 검증과 보관 개수 설정 테스트"""
+    print("=== 감정 궤적 API 테스트 ===")
+    original_db = server.memory_persister.db
+    server.memory_persister.db = InMemoryContextDB()
+    os.environ["CONTEXT_EMOTION_HISTORY"] = "5"
+    websocket = FakeWebSocket()
+    try:
+        asyncio.run(server.manager.connect(websocket))
+        session_id = server.manager.session_map[websocket]
+
+        client = TestClient(server.app)
+        assert client.get(f"/api/context/emotions/{session_id}", params={"window": 0}).status_code == 422
+        response = client.get(f"/api/context/emotions/{session_id}", params={"window": 3})
+        assert response.status_code == 200 and response.json()["capacity"] == 5
+    finally:
+        os.environ.pop("CONTEXT_EMOTION_HISTORY", None)
+        if websocket in server.manager.session_map:
+            server.manager.disconnect(websocket)
+        server.memory_persister.db = original_db
+
+def test_streaming_turn_metrics():
+    """스트리밍 턴의 업스트림 대기/전송/전체 구간 측정 테스트"""
+    print("=== 스트리밍 턴 측정 테스트 ===")
+    original_db = server.memory_persister.db
+    server.memory_persister.db = InMemoryContextDB()
+    original_client = server.claude_registry.client
+    server.claude_registry.client = FakeStreamingClient()
+    server.metrics.reset()
+    try:
+        with TestClient(server.app).websocket_connect("/ws") as websocket:
+            websocket.send_text(json.dumps({
+                "type": "chat", "message": "안녕", "streaming": True, "timestamp": "2024-01-01T00:00:00"
+            }))
+            received = [json.loads(websocket.receive_text())["type"] for _ in range(5)]
+        assert received == ["stream_start"] + ["stream_chunk"] * 3 + ["stream_end"]
+
+        stages = server.metrics.get_stage_stats()
+        assert {"retrieval", "prompt_build", "claude", "send", "turn"} <= set(stages)
+        assert all(stages[stage]["count"] == 1 for stage in ("claude", "send", "turn"))
+        assert stages["claude"]["avg_ms"] >= 60 and stages["turn"]["avg_ms"] >= stages["claude"]["avg_ms"]
+    finally:
+        server.claude_registry.client = original_client
+        server.memory_persister.db = original_db
+        server.metrics.reset()
+
+def main():
+    """모든 테스트 실행"""
+    print("🚀 연결 관리자 테스트 시작\n")
+    test_server_shares_context_singletons()
+    test_hibernation_skips_busy_sessions()
+    test_emotion_endpoint()
+    test_streaming_turn_metrics()
+    print("\n✅ 모든 테스트 완료!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,859 @@
+#!/usr/bin/env python3
+"""
+고급 컨텍스트 매니저 테스트 스크립트
+"""
+
+import asyncio
+import json
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from context_manager import AdvancedContextManager, Memory, MemoryRecord, MemoryType, estimate_tokens
+from embedding_index import HashingEmbedder
+from memory_persistence import MemoryPersister
+from metrics import MetricsRegistry
+from text_features import extract_features
+from semantic_store import SemanticMemoryStore
+from time_series import RingSeries
+from topic_graph import TopicTransitionGraph
+from tokenizer import CachedTokenCounter, HeuristicTokenizer, ScriptAwareTokenizer
+from summary_worker import SummarizationWorker
+
+def _fill(manager, count, prefix="message"):
+    """테스트용 상호작용 추가"""
+    async def run():
+        for i in range(count):
+            await manager.add_interaction(
+                user_message=f"{prefix} {i} about python programming",
+                ai_response=f"answer {i} " * 20
+            )
+    asyncio.run(run())
+
+def test_working_token_ledger():
+    """Working Memory 토큰 장부 테스트"""
+    print("=== 토큰 장부 테스트 ===")
+    manager = AdvancedContextManager(max_working_memory=8, max_tokens=100000)
+    _fill(manager, 20)
+    
+    expected = sum(item["tokens"] for item in manager.working_memory)
+    print(f"장부: {manager.working_tokens}, 실제: {expected}")
+    assert manager.working_tokens == expected
+    
+    # 압축 후에도 장부가 일치해야 함
+    asyncio.run(manager._compress_context())
+    assert manager.working_tokens == sum(item["tokens"] for item in manager.working_memory)
+    
+    # 복원 시 재계산
+    restored = AdvancedContextManager(max_working_memory=8)
+    restored.import_memory_state(manager.export_memory_state())
+    assert restored.working_tokens == manager.working_tokens
+
+def test_episodic_inverted_index():
+    """Episodic Memory 역색인 검색 테스트"""
+    print("=== 역색인 검색 테스트 ===")
+    manager = AdvancedContextManager(max_episodic_memory=10)
+    
+    async def run():
+        for i in range(15):
+            topic = "quantum physics" if i % 5 == 0 else f"cooking recipe {i}"
+            await manager._save_to_episodic(
+                {"timestamp": datetime.now(), "user": f"tell me about {topic}",
+                 "assistant": "sure", "metadata": {}},
+                importance=0.8
+            )
+        return await manager.retrieve_relevant_context("quantum physics", max_results=10)
+    
+    results = asyncio.run(run())
+    print(f"검색 결과: {len(results)}개")
+    assert results
+    assert all("quantum" in m.content for m in results if m.type.value == "episodic")
+    
+    # 정리 후 색인이 남은 메모리와 일치해야 함
+    live_ids = {m.id for m in manager.episodic_memory}
+    indexed_ids = set().union(*manager._episodic_index.values())
+    assert indexed_ids == live_ids
+    
+    # 복원 시 색인 재구축
+    restored = AdvancedContextManager()
+    restored.import_memory_state(manager.export_memory_state())
+    assert set(restored._episodic_terms) == live_ids
+
+def test_embedding_retrieval():
+    """임베딩 행렬 기반 검색 테스트"""
+    print("=== 임베딩 검색 테스트 ===")
+    manager = AdvancedContextManager(max_episodic_memory=10, embedder=HashingEmbedder(dim=128))
+    
+    async def run():
+        for i in range(15):
+            topic = "파이썬 비동기 프로그래밍" if i % 5 == 0 else f"요리 레시피 {i}"
+            await manager._save_to_episodic(
+                {"timestamp": datetime.now(), "user": f"{topic}에 대해 알려줘",
+                 "assistant": "좋아요", "metadata": {}},
+                importance=0.8
+            )
+        return await manager.retrieve_relevant_context("파이썬 프로그래밍", max_results=3)
+    
+    results = asyncio.run(run())
+    print(f"검색 결과: {len(results)}개")
+    assert results
+    assert "파이썬" in json.loads(results[0].content)["user"]
+    assert len(manager._vector_index) == len(manager.episodic_memory)
+
+def test_context_snapshot_cache():
+    """컨텍스트 스냅샷 캐시 테스트"""
+    print("=== 스냅샷 캐시 테스트 ===")
+    manager = AdvancedContextManager()
+    _fill(manager, 3)
+    
+    # 변경이 없으면 같은 스냅샷 공유
+    first = manager._build_current_context()
+    manager.get_system_prompt_context()
+    assert manager._build_current_context() is first
+    
+    # 상호작용 추가 후 새 스냅샷, 다음 턴에서 재사용
+    context = asyncio.run(manager.add_interaction("new question", "new answer"))
+    assert context is not first
+    assert manager._build_current_context() is context
+    assert context.messages[-1]["content"] == "new answer"
+    
+    # 검색으로 Episodic 접근 기록이 바뀌면 새 스냅샷
+    asyncio.run(manager._save_to_episodic(
+        {"timestamp": datetime.now(), "user": "garden soil", "assistant": "ok", "metadata": {}},
+        importance=0.9
+    ))
+    before = manager._build_current_context()
+    assert asyncio.run(manager.retrieve_relevant_context("garden soil"))
+    assert manager._build_current_context() is not before
+    
+    # 일치하는 기억이 없는 검색은 스냅샷을 유지
+    unchanged = manager._build_current_context()
+    asyncio.run(manager.retrieve_relevant_context("zzz"))
+    assert manager._build_current_context() is unchanged
+
+class FakeSummaryAnalyzer:
+    """지연이 있는 가짜 LLM 요약기"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    async def generate_intelligent_summary(self, messages):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return f"LLM summary of {len(messages)} messages"
+
+def test_background_summarization():
+    """백그라운드 요약 파이프라인 테스트"""
+    print("=== 백그라운드 요약 테스트 ===")
+    manager = AdvancedContextManager(max_tokens=100000)
+    manager.llm_analyzer = FakeSummaryAnalyzer()
+    
+    async def run():
+        for i in range(12):
+            manager._append_working({
+                "timestamp": datetime.now(), "user": f"question {i}",
+                "assistant": f"answer {i}", "metadata": {}, "tokens": 5
+            })
+        
+        # 압축은 LLM 응답을 기다리지 않고 즉시 끝나야 함
+        start = time.perf_counter()
+        await manager._compress_context()
+        assert time.perf_counter() - start < 0.05
+        
+        block = manager.working_memory[0]
+        assert block["metadata"]["summary_pending"]
+        
+        await manager.summary_worker.drain()
+        return block
+    
+    block = asyncio.run(run())
+    print(f"패치된 요약: {block['assistant']}")
+    assert block["assistant"] == "LLM summary of 20 messages"
+    assert not block["metadata"]["summary_pending"]
+    assert manager.working_tokens == sum(item["tokens"] for item in manager.working_memory)
+
+def test_summary_worker_coalescing():
+    """같은 키의 대기 요약 작업 병합 테스트"""
+    worker = SummarizationWorker(max_concurrency=1)
+    results = []
+    
+    async def summarize(text):
+        return text
+    
+    async def run():
+        worker.submit("blocker", lambda: asyncio.sleep(0.01), lambda _: None)
+        for i in range(5):
+            worker.submit(("session", "cmp_1"), lambda i=i: summarize(f"v{i}"), results.append)
+        await worker.drain()
+        await worker.shutdown()
+    
+    asyncio.run(run())
+    assert results == ["v4"]
+    assert worker.stats["coalesced"] == 4
+
+class FailingSummaryAnalyzer(FakeSummaryAnalyzer):
+    """API 오류 문자열을 돌려주는 가짜 요약기"""
+    
+    async def generate_intelligent_summary(self, messages):
+        self.calls += 1
+        return "Claude API 오류: overloaded"
+
+def test_summary_errors_and_merged_blocks():
+    """API 오류 요약 무시 및 병합된 블록의 요약 호출 생략 테스트"""
+    print("=== 요약 오류 / 병합 블록 테스트 ===")
+    
+    def fill(manager, count):
+        for i in range(count):
+            manager._append_working({
+                "timestamp": datetime.now(), "user": f"question {i}",
+                "assistant": f"answer {i}", "metadata": {}, "tokens": 5
+            })
+    
+    async def run_error():
+        manager = AdvancedContextManager(max_tokens=100000)
+        manager.llm_analyzer = FailingSummaryAnalyzer()
+        manager.summary_worker = SummarizationWorker()
+        fill(manager, 12)
+        await manager._compress_context()
+        block = manager.working_memory[0]
+        fallback = block["assistant"]
+        await manager.summary_worker.drain()
+        await manager.summary_worker.shutdown()
+        return block, fallback
+    
+    block, fallback = asyncio.run(run_error())
+    assert block["assistant"] == fallback
+    assert not block["metadata"]["summary_pending"]
+    
+    async def run_rollup():
+        manager = AdvancedContextManager(max_tokens=100000, compression_fanout=2)
+        analyzer = manager.llm_analyzer = FakeSummaryAnalyzer()
+        worker = manager.summary_worker = SummarizationWorker()
+        fill(manager, 20)
+        # 두 번째 압축에서 레벨 1 블록 두 개가 레벨 2로 병합됨 (워커가 돌기 전)
+        await manager._compress_context()
+        await manager._compress_context()
+        await worker.drain()
+        await worker.shutdown()
+        return manager, analyzer, worker
+    
+    manager, analyzer, worker = asyncio.run(run_rollup())
+    stats = manager.get_compression_stats()
+    print(f"블록 레벨: {stats['levels']}, LLM 호출: {analyzer.calls}, 생략: {worker.stats['skipped']}")
+    assert stats["levels"] == {2: 1}
+    assert analyzer.calls == 1 and worker.stats["skipped"] == 2
+    assert manager.working_memory[0]["assistant"] == "LLM summary of 2 messages"
+
+def test_heap_episodic_eviction():
+    """힙 기반 Episodic 정리 테스트"""
+    print("=== 힙 기반 정리 테스트 ===")
+    manager = AdvancedContextManager(max_episodic_memory=50)
+    
+    async def run():
+        for i in range(51):
+            await manager._save_to_episodic(
+                {"timestamp": datetime.now(), "user": f"topic{i % 7} detail",
+                 "assistant": "ok", "metadata": {}},
+                importance=0.1 + (i * 37 % 51) / 60
+            )
+    
+    asyncio.run(run())
+    
+    # 상위 80%만 남고, 제거된 메모리는 주제별로 Semantic에 반영
+    remaining = sorted(m.importance for m in manager.episodic_memory)
+    print(f"남은 메모리: {len(remaining)}개, 최저 중요도 {remaining[0]:.2f}")
+    assert len(remaining) == 40
+    assert remaining[0] >= sorted(0.1 + (i * 37 % 51) / 60 for i in range(51))[11]
+    assert manager.semantic_memory
+    
+    # 최근 항목은 삽입 순서 유지
+    recent = manager.episodic_memory.recent(3)
+    assert [m.id for m in recent] == [m.id for m in list(manager.episodic_memory)[-3:]]
+
+def test_closed_form_decay():
+    """닫힌 형태 중요도 감쇠 테스트"""
+    print("=== 중요도 감쇠 테스트 ===")
+    past = datetime.now() - timedelta(hours=5)
+    memory = Memory(id="ep_1", type=MemoryType.EPISODIC, content="{}",
+                    timestamp=past, importance=0.9, last_accessed=past)
+    
+    now = datetime.now()
+    expected = memory.effective_importance(now.timestamp())
+    print(f"5시간 후 감쇠 중요도: {expected:.3f}")
+    assert 0.1 < expected < 0.9
+    
+    # 저장값은 바뀌지 않고, 기준점 이동을 반복해도 누적되지 않음
+    assert memory.importance == 0.9
+    memory.decay_importance(now)
+    memory.decay_importance(now)
+    assert abs(memory.effective_importance(now.timestamp()) - expected) < 1e-9
+    
+    # 접근해도 쌓인 감쇠는 유지되고, 이후 감쇠만 멈춤 (원래 중요도로 돌아가지 않음)
+    for old in (Memory(id="ep_2", type=MemoryType.EPISODIC, content="{}",
+                       timestamp=past, importance=0.9, last_accessed=past),
+                MemoryRecord(id="ep_3", user="q", assistant="a", created_at=past.timestamp(),
+                             importance=0.9, decay_anchor=past.timestamp())):
+        old.touch(now)
+        assert abs(old.importance - expected) < 1e-9
+        assert abs(old.effective_importance(now.timestamp()) - expected) < 1e-9
+        assert old.access_count == 1
+
+def test_compact_storage():
+    """슬롯 기반 압축 저장 모드 테스트"""
+    print("=== 압축 저장 모드 테스트 ===")
+    manager = AdvancedContextManager(max_episodic_memory=10, compact_storage=True)
+    metadata = {"emotion_tone": {"enthusiasm": 0.7}}
+    
+    async def run():
+        for i in range(12):
+            await manager._save_to_episodic(
+                {"timestamp": datetime.now(), "user": f"파이썬 질문 {i}",
+                 "assistant": "답변", "metadata": dict(metadata)},
+                importance=0.8
+            )
+        return await manager.retrieve_relevant_context("파이썬 질문 3")
+    
+    results = asyncio.run(run())
+    memories = list(manager.episodic_memory)
+    assert all(isinstance(m, MemoryRecord) for m in memories)
+    assert memories[0].metadata is memories[1].metadata  # 인턴된 메타데이터 공유
+    assert results and manager._extract_key_points()
+    
+    restored = AdvancedContextManager(compact_storage=True)
+    restored.import_memory_state(manager.export_memory_state())
+    assert [m.user for m in restored.episodic_memory] == [m.user for m in memories]
+
+class InMemoryContextDB:
+    """테스트용 메모리 DB (database_manager의 컨텍스트 저장 API와 동일)"""
+    
+    def __init__(self):
+        self.snapshots = {}
+        self.deltas = {}
+    
+    def get_context_memory(self, session_id):
+        return self.snapshots.get(session_id)
+    
+    def save_context_memory(self, session_id, state):
+        self.snapshots[session_id] = json.loads(json.dumps(state))
+        return True
+    
+    def append_context_deltas(self, deltas_by_session):
+        for session_id, deltas in deltas_by_session.items():
+            self.deltas.setdefault(session_id, []).extend(json.loads(json.dumps(deltas)))
+        return True
+    
+    def get_context_deltas(self, session_id):
+        return self.deltas.get(session_id, [])
+    
+    def clear_context_deltas(self, session_id):
+        self.deltas.pop(session_id, None)
+        return True
+
+def test_delta_persistence():
+    """증분 저장 + 스냅샷 압축 테스트"""
+    print("=== 증분 저장 테스트 ===")
+    db = InMemoryContextDB()
+    persister = MemoryPersister(db=db, flush_interval=3600, batch_size=4, compact_every=8)
+    manager = AdvancedContextManager(max_working_memory=5)
+    manager.persister = persister
+    
+    async def run():
+        for i in range(10):
+            await manager.add_interaction(
+                user_message=f"파이썬 질문 {i} 정말 중요해요!",
+                ai_response=f"답변 {i}",
+                session_id="session-1"
+            )
+        await manager.summary_worker.drain()
+        await persister.flush()
+    
+    asyncio.run(run())
+    
+    # 증분에는 새로 추가된 Working Memory 항목만 들어감
+    delta = db.deltas["session-1"][-1]
+    assert len(delta["working_upserts"]) == 1
+    assert persister.stats["compactions"] == 1 and "session-1" in db.snapshots
+    
+    restored = AdvancedContextManager(max_working_memory=5)
+    restored.import_memory_state(persister.load("session-1"))
+    expected = manager.export_memory_state()
+    assert [i["user"] for i in restored.working_memory] == [i["user"] for i in manager.working_memory]
+    assert len(restored.episodic_memory) == len(expected["episodic_memory"])
+    assert restored.interaction_patterns["question_types"] == manager.interaction_patterns["question_types"]
+    
+    # 저장하지 않는 세션은 변경 표시가 쌓이지 않음
+    unsaved = AdvancedContextManager(max_working_memory=5)
+    _fill(unsaved, 10)
+    assert not (unsaved._dirty_working or unsaved._dirty_episodic or unsaved._dirty_semantic)
+
+def test_failed_write_requeues_deltas():
+    """기록 실패 시 증분이 버퍼로 돌아가 다음 flush에서 저장되는지 테스트"""
+    print("=== 기록 실패 재시도 테스트 ===")
+    class FlakyContextDB(InMemoryContextDB):
+        def __init__(self):
+            super().__init__()
+            self.fail_appends = 1
+            self.fail_snapshots = 0
+
+        def append_context_deltas(self, deltas_by_session):
+            if self.fail_appends:
+                self.fail_appends -= 1
+                raise IOError("disk full")
+            return super().append_context_deltas(deltas_by_session)
+
+        def save_context_memory(self, session_id, state):
+            if self.fail_snapshots:
+                self.fail_snapshots -= 1
+                raise IOError("disk full")
+            return super().save_context_memory(session_id, state)
+
+    db = FlakyContextDB()
+    persister = MemoryPersister(db=db, flush_interval=3600, batch_size=100, compact_every=3)
+    manager = AdvancedContextManager(max_working_memory=50)
+    manager.persister = persister
+
+    async def run():
+        for i in range(2):
+            await manager.add_interaction(f"파이썬 질문 {i}", f"답변 {i}", session_id="session-1")
+        await persister.flush()  # 실패: 배치와 증분 수가 그대로 남음
+        assert persister.buffered_count == 2 and "session-1" not in db.deltas
+        assert persister._delta_counts["session-1"] == 0
+
+        await manager.add_interaction("파이썬 질문 2", "답변 2", session_id="session-1")
+        await persister.flush()  # 순서대로 기록되고 누적 증분 수로 압축
+        assert persister.buffered_count == 0 and persister.stats["compactions"] == 1
+
+        # 휴면 스냅샷 저장이 실패하면 비운 증분을 되돌리고 예외를 올림
+        await manager.add_interaction("파이썬 질문 3", "답변 3", session_id="session-1")
+        db.fail_snapshots = 1
+        try:
+            await persister.save_snapshot("session-1", manager.export_memory_state())
+            assert False, "스냅샷 저장 실패가 전달되어야 함"
+        except IOError:
+            pass
+        assert persister.buffered_count == 1
+        await persister.flush()
+
+    asyncio.run(run())
+    assert persister.stats["failures"] == 2
+    restored = persister.load("session-1")
+    assert [item["user"] for item in restored["working_memory"]] == [f"파이썬 질문 {i}" for i in range(4)]
+
+def test_replay_over_legacy_snapshot():
+    """ID가 없는 이전 형식 스냅샷 위에 증분을 재적용해도 항목이 남는지 테스트"""
+    print("=== 이전 형식 스냅샷 재적용 테스트 ===")
+    db = InMemoryContextDB()
+    db.save_context_memory("session-1", {"working_memory": [
+        {"timestamp": "2024-01-01T00:00:00", "user": "옛 질문 1", "assistant": "옛 답변 1", "metadata": {}},
+        {"timestamp": "2024-01-01T00:01:00", "user": "옛 질문 2", "assistant": "옛 답변 2", "metadata": {}},
+    ]})
+    persister = MemoryPersister(db=db, flush_interval=3600, batch_size=100, compact_every=100)
+    manager = AdvancedContextManager(max_working_memory=50)
+    manager.persister = persister
+    manager.import_memory_state(persister.load("session-1"))
+
+    async def run():
+        await manager.add_interaction("새 질문", "새 답변", session_id="session-1")
+        await persister.flush()
+
+    asyncio.run(run())
+    assert db.deltas["session-1"][0]["working_ids"][:2] == ["wm_legacy_0", "wm_legacy_1"]
+    restored = persister.load("session-1")
+    assert [item["user"] for item in restored["working_memory"]] == ["옛 질문 1", "옛 질문 2", "새 질문"]
+
+def test_interaction_features():
+    """단일 패스 특징 추출 테스트"""
+    print("=== 특징 추출 테스트 ===")
+    # 기존 부분 문자열 검사와 같은 분류 (대소문자 무시, 단어 내부 일치 포함)
+    assert extract_features("Where is it?").question_type == "factual"
+    assert extract_features("Show me the code").question_type == "explanatory"
+    assert extract_features("I believe so").question_type == "subjective"
+    assert extract_features("정말요?").question_type == "yes_no"
+    assert extract_features("좋아요").question_type == "statement"
+    
+    features = extract_features("How does the python interpreter work")
+    assert features.is_deep_question
+    assert features.topic == "does"
+    assert extract_features("How does the python interpreter work") is features  # 캐시 공유
+    
+    manager = AdvancedContextManager()
+    _fill(manager, 3)
+    assert manager.current_topics[-1] == "message"
+    assert manager.interaction_patterns["question_types"]["statement"] == 3
+
+def test_token_counter():
+    """토크나이저 + LRU 캐시 테스트"""
+    print("=== 토큰 계산 테스트 ===")
+    tokenizer = ScriptAwareTokenizer()
+    korean = "안녕하세요 반갑습니다"
+    # 한글은 글자 수 기반 추정보다 훨씬 많은 토큰을 사용
+    assert tokenizer.count(korean) > HeuristicTokenizer().count(korean) * 2
+    assert tokenizer.count("hello world") == 2
+    
+    counter = CachedTokenCounter(tokenizer, max_entries=2)
+    for text in ["a b", "c d", "a b", "e f", "c d"]:
+        counter.count(text)
+    # "c d"는 "e f" 추가 시 가장 오래 사용되지 않아 제거됨
+    assert counter.stats == {"hits": 1, "misses": 4}
+    assert counter.count("") == 0
+
+def test_context_packing():
+    """토큰 예산 기반 컨텍스트 패킹 테스트"""
+    print("=== 컨텍스트 패킹 테스트 ===")
+    manager = AdvancedContextManager(max_working_memory=20, max_tokens=100000)
+    _fill(manager, 10)
+    memories = asyncio.run(manager.retrieve_relevant_context("message 3 python", max_results=3))
+    
+    turn_tokens = manager.working_memory[-1]["tokens"]
+    packed = manager.pack_context(memories, token_budget=turn_tokens * 3)
+    assert packed.tokens <= turn_tokens * 3 + estimate_tokens(packed.system)
+    assert packed.dropped > 0
+    # 가장 최근 턴은 항상 포함되고, 역할 교대가 유지됨
+    assert packed.messages[-1]["content"] == manager.working_memory[-1]["assistant"]
+    assert [m["role"] for m in packed.messages] == ["user", "assistant"] * (len(packed.messages) // 2)
+    assert "system" not in {m["role"] for m in packed.messages}
+    
+    # 예산이 충분하면 모든 턴 포함
+    full = manager.pack_context(memories, token_budget=100000)
+    assert len(full.messages) == 20 and full.dropped == 0
+
+def test_hierarchical_compression():
+    """다단계 압축 (요약의 요약) 테스트"""
+    print("=== 다단계 압축 테스트 ===")
+    manager = AdvancedContextManager(max_working_memory=100, max_tokens=200, compression_fanout=3)
+    _fill(manager, 400)
+    
+    stats = manager.get_compression_stats()
+    levels = stats["levels"]
+    # 레벨마다 fanout-1개 이하만 남아 블록 수가 대화 길이에 로그 비례
+    assert max(levels) >= 3
+    assert all(count < 3 for count in levels.values())
+    assert stats["compressed_messages"] + len(manager.working_memory) - stats["blocks"] == 400
+    assert stats["compression_ratio"] > 1.0
+    
+    # 블록은 앞쪽에 상위 레벨부터 모여 있음
+    block_levels = [item["metadata"]["level"] for item in list(manager.working_memory)[:stats["blocks"]]]
+    assert block_levels == sorted(block_levels, reverse=True)
+    assert manager._working_tokens == sum(item["tokens"] for item in manager.working_memory)
+    assert manager.export_memory_state()["compression_stats"] == stats
+    
+    # 개수 제한에 먼저 걸려도 상위 블록이 밀려나지 않고 계층이 쌓임
+    bounded = AdvancedContextManager(max_working_memory=15, max_tokens=100000, compression_fanout=3)
+    _fill(bounded, 200)
+    stats = bounded.get_compression_stats()
+    assert max(stats["levels"]) >= 3
+    assert stats["compressed_messages"] + len(bounded.working_memory) - stats["blocks"] == 200
+    
+    # 가득 찬 상태에서 추가하면 가장 오래된 원본 대화가 밀려남
+    top_block = bounded.working_memory[0]
+    while len(bounded.working_memory) < 15:
+        bounded._append_working({"timestamp": datetime.now(), "user": "filler", "assistant": "ok",
+                                 "metadata": {}, "tokens": 1})
+    oldest_raw = bounded.working_memory[stats["blocks"]]
+    bounded._append_working({"timestamp": datetime.now(), "user": "new", "assistant": "ok",
+                             "metadata": {}, "tokens": 1})
+    assert bounded.working_memory[0] is top_block and oldest_raw not in bounded.working_memory
+    assert bounded.working_tokens == sum(item["tokens"] for item in bounded.working_memory)
+
+def test_shared_semantic_store():
+    """사용자별 공유 Semantic Memory 테스트"""
+    print("=== 공유 Semantic Memory 테스트 ===")
+    store = SemanticMemoryStore(num_shards=1, max_users=2)
+    
+    first = AdvancedContextManager(max_episodic_memory=5, semantic_memory=store.acquire("alice"))
+    _fill(first, 10, prefix="gardening")
+    assert "gardening" in first.semantic_memory
+    store.release("alice")
+    
+    # 재접속한 세션은 이전 주제 지식에서 시작
+    second = AdvancedContextManager(semantic_memory=store.acquire("alice"))
+    assert second.semantic_memory is first.semantic_memory
+    assert second._infer_preferences()["interests"] == ["gardening"]
+    
+    # 용량 초과 시 사용 중이 아닌 가장 오래된 사용자만 제거
+    store.acquire("bob")
+    store.release("bob")
+    store.acquire("carol")
+    assert "alice" in store and "bob" not in store
+    assert store.get_stats()["evictions"] == 1
+
+def test_snapshot_rehydration():
+    """휴면 스냅샷 저장 후 복원 테스트"""
+    print("=== 휴면/복원 테스트 ===")
+    db = InMemoryContextDB()
+    persister = MemoryPersister(db=db, flush_interval=3600, batch_size=100, compact_every=100)
+    manager = AdvancedContextManager(max_working_memory=50, max_tokens=600)
+    manager.persister = persister
+    
+    async def run():
+        for i in range(30):
+            await manager.add_interaction(
+                user_message=f"파이썬 질문 {i} 정말 중요해요!",
+                ai_response=f"답변 {i} " * 10,
+                session_id="session-1"
+            )
+        # 휴면: 버퍼의 증분은 스냅샷으로 대체됨
+        await persister.save_snapshot("session-1", manager.export_memory_state())
+    
+    asyncio.run(run())
+    assert persister.buffered_count == 0 and "session-1" not in db.deltas
+    
+    restored = AdvancedContextManager(max_working_memory=50, max_tokens=600)
+    restored.import_memory_state(persister.load("session-1"))
+    assert restored.get_compression_stats() == manager.get_compression_stats()
+    assert [i["id"] for i in restored.working_memory] == [i["id"] for i in manager.working_memory]
+    assert restored.working_tokens == manager.working_tokens
+    
+    # 복원된 매니저가 만든 압축 블록 ID는 기존 블록과 겹치지 않음
+    _fill(restored, 20)
+    block_ids = [i["metadata"]["block_id"] for i in restored.working_memory
+                 if i["metadata"].get("compressed")]
+    assert len(block_ids) == len(set(block_ids))
+    
+    # 이전 배치 기록 중에 휴면해도, 스냅샷 이후 증분은 남고 이전 증분은 스냅샷 뒤에 재적용되지 않음
+    class SlowContextDB(InMemoryContextDB):
+        def append_context_deltas(self, deltas_by_session):
+            time.sleep(0.05)
+            return super().append_context_deltas(deltas_by_session)
+    
+    slow_db = SlowContextDB()
+    racing = MemoryPersister(db=slow_db, flush_interval=3600, batch_size=100, compact_every=100)
+    
+    async def race():
+        racing.record("session-2", {"working_upserts": [{"id": "w0", "user": "stale"}], "working_ids": ["w0"]}, dict)
+        flushing = asyncio.create_task(racing.flush())
+        await asyncio.sleep(0)  # 이전 증분 기록 중
+        snapshotting = asyncio.create_task(
+            racing.save_snapshot("session-2", {"working_memory": [{"id": "w1", "user": "old"}]})
+        )
+        await asyncio.sleep(0)
+        racing.record("session-2", {"working_upserts": [{"id": "w2", "user": "new"}], "working_ids": ["w1", "w2"]}, dict)
+        await flushing
+        await snapshotting
+        await racing.flush()
+    
+    asyncio.run(race())
+    assert [d["working_ids"] for d in slow_db.deltas["session-2"]] == [["w1", "w2"]]
+    assert [i["user"] for i in racing.load("session-2")["working_memory"]] == ["old", "new"]
+
+def test_bulk_ingestion():
+    """대화 로그 일괄 가져오기 테스트"""
+    print("=== 일괄 가져오기 테스트 ===")
+    turns = [
+        (f"question {i} about python programming?", f"answer {i} " * 20,
+         {"timestamp": f"2024-01-01T00:{i % 60:02d}:00"})
+        for i in range(120)
+    ]
+    
+    sequential = AdvancedContextManager(max_working_memory=30, max_tokens=2000)
+    async def run_sequential():
+        for user, assistant, metadata in turns:
+            await sequential.add_interaction(user, assistant, {k: v for k, v in metadata.items() if k != "timestamp"})
+    asyncio.run(run_sequential())
+    
+    db = InMemoryContextDB()
+    bulk = AdvancedContextManager(max_working_memory=30, max_tokens=2000)
+    bulk.persister = MemoryPersister(db=db)
+    context = asyncio.run(bulk.add_interactions(turns, session_id="import"))
+    
+    assert [i["user"] for i in bulk.working_memory] == [i["user"] for i in sequential.working_memory]
+    assert bulk.interaction_patterns["question_types"] == sequential.interaction_patterns["question_types"]
+    assert len(bulk.episodic_memory) == len(sequential.episodic_memory)
+    assert bulk.working_memory[-1]["timestamp"] == datetime(2024, 1, 1, 0, 59)
+    assert "timestamp" not in bulk.working_memory[-1]["metadata"]
+    
+    # 저장은 스냅샷 한 번, 반환값은 최종 컨텍스트
+    assert "import" in db.snapshots and not db.deltas
+    assert context is bulk._build_current_context()
+
+def test_emotion_ring_buffer():
+    """감정 궤적 링 버퍼 테스트"""
+    print("=== 감정 링 버퍼 테스트 ===")
+    series = RingSeries(capacity=8)
+    scores = [0.1 * (i % 7) for i in range(30)]
+    for i, score in enumerate(scores):
+        series.append(score, timestamp=1000.0 + i)
+    
+    # 누적합 기반 통계가 직접 계산한 값과 일치
+    for window in (1, 3, 8, 20):
+        recent = scores[-min(window, 8):]
+        stats = series.window_stats(window)
+        assert stats["count"] == len(recent)
+        assert abs(stats["mean"] - sum(recent) / len(recent)) < 1e-9
+        assert abs(stats["trend"] - (recent[-1] - recent[0])) < 1e-9
+        # 최소제곱 기울기
+        x_mean = (len(recent) - 1) / 2
+        denominator = sum((x - x_mean) ** 2 for x in range(len(recent))) or 1
+        slope = sum((x - x_mean) * y for x, y in enumerate(recent)) / denominator
+        assert abs(stats["slope"] - slope) < 1e-9
+    assert series.points(2) == [(1028.0, scores[-2]), (1029.0, scores[-1])]
+    
+    manager = AdvancedContextManager(emotion_history=100, emotion_window=5)
+    _fill(manager, 60)
+    trajectory = manager.get_emotional_trajectory(60)
+    assert trajectory["count"] == 60 and len(trajectory["points"]) == 60
+    
+    restored = AdvancedContextManager(emotion_history=100)
+    restored.import_memory_state(manager.export_memory_state())
+    assert restored.emotion_series.points() == manager.emotion_series.points()
+
+def test_topic_transition_graph():
+    """크기 제한 주제 전환 그래프 테스트"""
+    print("=== 주제 전환 그래프 테스트 ===")
+    graph = TopicTransitionGraph(max_sources=3, max_targets=2)
+    for _ in range(5):
+        graph.record("python", "asyncio")
+    graph.record("python", "django")
+    graph.record("python", "flask")  # 가장 적게 센 django를 대체
+    assert graph.targets("python") == {"asyncio": 5, "flask": 2}
+    assert graph.predict_next("python", k=1) == [("asyncio", 5 / 7)]
+    
+    for source in ("a", "b", "c"):
+        graph.record(source, "x")
+    assert len(graph) == 3 and "python" not in graph  # 가장 오래 갱신되지 않은 출발 주제 제거
+    
+    # 이전 형식(목록)도 복원 가능
+    legacy = TopicTransitionGraph.from_dict({"python": ["asyncio", "asyncio", "django"]})
+    assert legacy.targets("python") == {"asyncio": 2, "django": 1}
+    
+    manager = AdvancedContextManager()
+    async def run():
+        for i in range(6):
+            await manager.add_interaction("garden flowers bloom", "answer")
+            await manager.add_interaction("python asyncio loops", "answer")
+    asyncio.run(run())
+    assert manager.current_topics[-1] == "python"
+    assert manager.predict_next_topics(1) == [("garden", 1.0)]
+    exported = manager.export_memory_state()["patterns"]["topic_transitions"]
+    assert exported == {"garden": {"python": 6}, "python": {"garden": 5}}
+
+def test_speculative_prefetch():
+    """응답 생성 중 prefetch 테스트"""
+    print("=== prefetch 테스트 ===")
+    manager = AdvancedContextManager()
+    baseline = AdvancedContextManager()
+    
+    def recalled(memories):
+        keys = []
+        for memory in memories:
+            try:
+                keys.append((memory.type, manager._dialogue(memory)[0]))
+            except (ValueError, TypeError, KeyError):
+                keys.append((memory.type, memory.content))
+        return keys
+    
+    async def run():
+        for target in (manager, baseline):
+            for i in range(4):
+                await target.add_interaction(f"garden flowers bloom {i} 정말 중요해요!", "answer")
+                await target.add_interaction(f"python asyncio loops {i} 정말 중요해요!", "answer")
+        
+        # 응답 생성(가짜 지연)과 동시에 prefetch 실행
+        message = "garden soil question"
+        prefetch = asyncio.create_task(manager.prefetch(message))
+        await asyncio.sleep(0.01)
+        await prefetch
+        
+        assert manager._speculation["is_new_topic"] == manager._is_new_topic(extract_features(message))
+        # 다음 검색 후보(최근 Working 항목의 단어 집합)와 garden 다음 예측 주제의 검색 결과 준비
+        warmed = {item["id"]: words for item, _, words in manager._retrieval_pool["working"]}
+        assert ("python", None) in manager._search_memo
+        
+        await manager.add_interaction(message, "answer")
+        await baseline.add_interaction(message, "answer")
+        assert manager._speculation is None  # 사용 후 폐기
+        
+        # 응답 반영 직후 후보 풀과 스냅샷/시스템 프롬프트가 현재 상태로 준비됨
+        pool = manager._retrieval_pool
+        assert pool["key"] == (manager._state_version, tuple(manager.current_topics))
+        assert manager._prompt_cache_version == manager._state_version
+        reused = [(item["id"], words) for item, _, words in pool["working"] if item["id"] in warmed]
+        assert reused and all(words is warmed[item_id] for item_id, words in reused)
+        assert len(reused) == len(pool["working"]) - 1  # 새 항목만 계산
+        
+        # 미리 계산한 값으로 검색해도 결과는 같음
+        predicted = manager.get_predicted_memories()
+        assert predicted and recalled(predicted) == recalled(baseline.get_predicted_memories())
+        for query in ("python asyncio", "garden flowers"):
+            assert recalled(await manager.retrieve_relevant_context(query)) == \
+                recalled(await baseline.retrieve_relevant_context(query))
+        
+        # 색인이 바뀌면 이전 검색 결과를 쓰지 않음
+        before = len(manager._search_episodic("python", top_k=2))
+        await manager._save_to_episodic(
+            {"timestamp": datetime.now(), "user": "python again", "assistant": "ok", "metadata": {}},
+            importance=0.9
+        )
+        assert len(manager._search_episodic("python", top_k=2)) == before + 1
+        
+        # 응답을 기다리는 동안 주제 스택이 바뀌면 예측값을 쓰지 않음
+        await manager.prefetch("garden soil again")
+        manager.current_topics.append("python")
+        assert manager._speculated_new_topic("garden soil again") is None
+    
+    asyncio.run(run())
+
+def test_stage_metrics():
+    """단계별 지연 시간 히스토그램 테스트"""
+    print("=== 단계별 지연 시간 측정 테스트 ===")
+    registry = MetricsRegistry(max_sessions=2, session_labels=True)
+    timer = registry.turn("s1")
+    with timer.span("retrieval"):
+        pass
+    timer.record("claude", 0.3)
+    timer.record("claude", 0.2)  # 같은 턴 안에서는 합산
+    assert timer.as_dict()["claude"] == 500.0
+    
+    registry.observe("claude", 7.0, "s2")
+    registry.observe("claude", 0.01, "s3")  # s1 제거 (최근 2개 세션만 유지)
+    assert registry.get_session_stats("s1") == {}
+    assert registry.get_stage_stats()["claude"]["count"] == 4
+    
+    text = registry.render_prometheus()
+    assert 'chat_stage_duration_seconds_bucket{stage="claude",le="0.25"} 2' in text
+    assert 'chat_stage_duration_seconds_bucket{stage="claude",le="+Inf"} 4' in text
+    assert 'chat_stage_duration_seconds_count{stage="claude",session="s2"} 1' in text
+    
+    # 비활성화 시 공용 no-op 타이머
+    disabled = MetricsRegistry(enabled=False)
+    noop = disabled.turn("s1")
+    with noop.span("retrieval"):
+        pass
+    assert noop is disabled.turn("s2") and noop.as_dict() == {}
+    assert disabled.get_stage_stats() == {}
+
+def main():
+    """모든 테스트 실행"""
+    print("🚀 컨텍스트 매니저 테스트 시작\n")
+    test_working_token_ledger()
+    test_episodic_inverted_index()
+    test_embedding_retrieval()
+    test_context_snapshot_cache()
+    test_background_summarization()
+    test_summary_worker_coalescing()
+    test_summary_errors_and_merged_blocks()
+    test_heap_episodic_eviction()
+    test_closed_form_decay()
+    test_compact_storage()
+    test_delta_persistence()
+    test_failed_write_requeues_deltas()
+    test_replay_over_legacy_snapshot()
+    test_interaction_features()
+    test_token_counter()
+    test_context_packing()
+    test_hierarchical_compression()
+    test_shared_semantic_store()
+    test_snapshot_rehydration()
+    test_bulk_ingestion()
+    test_emotion_ring_buffer()
+    test_topic_transition_graph()
+    test_speculative_prefetch()
+    test_stage_metrics()
+    print("\n✅ 모든 테스트 완료!")
+
+if __name__ == "__main__":
+    main()
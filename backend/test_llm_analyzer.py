@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+LLM 분석기 테스트 스크립트
+"""
+
+import asyncio
+import json
+import sys
+import os
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from llm_analyzer import COMBINED_MAX_TOKENS, AnalysisCache, LLMAnalyzer
+
+class CountingClaudeClient:
+    """호출 횟수를 세는 가짜 Claude 클라이언트"""
+
+    def __init__(self, response: str = '["인사이트"]', delay: float = 0.01):
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+        self.max_tokens = []
+
+    async def get_response(self, prompt: str, max_tokens: int = 1024) -> str:
+        self.calls += 1
+        self.max_tokens.append(max_tokens)
+        await asyncio.sleep(self.delay)
+        return self.response
+
+MESSAGES = [
+    {"role": "user", "content": "파이썬 비동기 알려줘"},
+    {"role": "assistant", "content": "asyncio는 이벤트 루프 기반입니다."},
+    {"role": "user", "content": "예제도 보여줘"},
+    {"role": "assistant", "content": "asyncio.run(main())"},
+]
+
+def test_analysis_cache():
+    """같은 대화의 반복 분석 캐시 테스트"""
+    print("=== 분석 응답 캐시 테스트 ===")
+    client = CountingClaudeClient()
+    analyzer = LLMAnalyzer(client)
+
+    async def run():
+        first = await analyzer.extract_key_insights(MESSAGES)
+        assert await analyzer.extract_key_insights(MESSAGES) == first == ["인사이트"]
+        assert client.calls == 1
+
+        # 프롬프트 템플릿이 다르거나 대화가 바뀌면 다시 호출
+        await analyzer.analyze_emotional_trajectory(MESSAGES)
+        await analyzer.extract_key_insights(MESSAGES + [{"role": "user", "content": "고마워"}])
+        assert client.calls == 3
+        assert analyzer.cache.get_stats()["hits"] == 1
+
+    asyncio.run(run())
+
+def test_analysis_single_flight():
+    """동시에 들어온 같은 요청 병합 테스트"""
+    print("=== 분석 요청 병합 테스트 ===")
+    client = CountingClaudeClient(delay=0.05)
+    analyzer = LLMAnalyzer(client, cache=AnalysisCache(ttl=0))  # 저장 없이 병합만
+
+    async def run():
+        results = await asyncio.gather(*(analyzer.extract_key_insights(MESSAGES) for _ in range(10)))
+        assert all(r == ["인사이트"] for r in results)
+        assert client.calls == 1
+        assert analyzer.cache.get_stats()["coalesced"] == 9
+        assert len(analyzer.cache) == 0
+
+        await analyzer.extract_key_insights(MESSAGES)
+        assert client.calls == 2
+
+    asyncio.run(run())
+
+def test_analysis_cache_eviction_and_errors():
+    """TTL 만료, 크기 제한, 오류 응답 미저장 테스트"""
+    print("=== 분석 캐시 만료/제거 테스트 ===")
+
+    async def run():
+        cache = AnalysisCache(max_entries=2, ttl=60)
+        calls = []
+
+        async def call(prompt):
+            calls.append(prompt)
+            return f"응답:{prompt}"
+
+        for prompt in ("a", "b", "c"):
+            await cache.get_or_call(prompt, lambda p=prompt: call(p))
+        assert len(cache) == 2 and cache.get_stats()["evictions"] == 1
+        await cache.get_or_call("a", lambda: call("a"))  # 가장 오래된 a 가 제거되었으므로 다시 호출
+        assert calls == ["a", "b", "c", "a"]
+
+        expired = AnalysisCache(ttl=0.01)
+        await expired.get_or_call("x", lambda: call("x"))
+        await asyncio.sleep(0.02)
+        await expired.get_or_call("x", lambda: call("x"))
+        assert expired.get_stats()["expired"] == 1 and calls.count("x") == 2
+
+        client = CountingClaudeClient(response="Claude API 오류: overloaded")
+        analyzer = LLMAnalyzer(client)
+        await analyzer.extract_key_insights(MESSAGES)
+        await analyzer.extract_key_insights(MESSAGES)
+        assert client.calls == 2 and len(analyzer.cache) == 0
+
+    asyncio.run(run())
+
+COMBINED_RESPONSE = json.dumps({
+    "analysis": {
+        "summary": "파이썬 비동기 학습",
+        "key_topics": ["asyncio"],
+        "emotional_state": {"valence": 0.7, "arousal": 0.4, "dominant_emotion": "curious"},
+        "complexity_level": "medium",
+        "user_interests": ["파이썬"],
+        "conversation_quality": 0.8,
+        "suggested_directions": ["태스크 취소"]
+    },
+    "emotion_trajectory": {"trend": "positive", "dominant_emotion": "curiosity",
+                           "emotional_intensity": 0.6, "emotional_stability": 0.9},
+    "insights": ["이벤트 루프 개념을 궁금해함", "예제를 선호함"]
+}, ensure_ascii=False)
+
+def test_combined_analysis():
+    """한 번의 호출로 세 가지 분석 결과를 채우는지 테스트"""
+    print("=== 통합 분석 테스트 ===")
+    client = CountingClaudeClient(response="분석 결과입니다:\n" + COMBINED_RESPONSE)
+    analyzer = LLMAnalyzer(client)
+
+    async def run():
+        combined = await analyzer.analyze_all(MESSAGES)
+        assert client.calls == 1
+        assert client.max_tokens == [COMBINED_MAX_TOKENS]  # 세 결과를 담을 만큼 긴 응답 허용
+        assert combined.analysis.summary == "파이썬 비동기 학습"
+        assert combined.analysis.conversation_quality == 0.8
+        assert combined.emotion_trajectory["trend"] == "positive"
+        assert combined.insights == ["이벤트 루프 개념을 궁금해함", "예제를 선호함"]
+
+        # 대화는 한 번만 전송되므로 개별 프롬프트 세 개보다 훨씬 짧음
+        conversation = analyzer._format_conversation(MESSAGES)
+        separate = (len(analyzer._create_analysis_prompt(conversation))
+                    + len(analyzer._create_emotion_analysis_prompt(MESSAGES))
+                    + len(analyzer._create_insights_prompt(MESSAGES)))
+        assert len(analyzer._create_combined_prompt(conversation)) < separate
+
+        # 빠지거나 잘못된 부분만 기본값으로 채움
+        client.response = json.dumps({"analysis": {"summary": "요약"}, "insights": "not a list"})
+        partial = await analyzer.analyze_all(MESSAGES[:3])
+        assert partial.analysis.summary == "요약"
+        assert partial.emotion_trajectory == {"trend": "stable", "dominant_emotion": "neutral"}
+        assert partial.insights == []
+
+        client.response = "JSON이 아닌 응답"
+        analyzer.cache.clear()  # 같은 대화의 이전 응답이 캐시되어 있음
+        broken = await analyzer.analyze_all(MESSAGES)
+        assert broken.analysis.summary == f"이전 {len(MESSAGES)}개의 대화가 있었습니다."
+
+        short = await analyzer.analyze_all(MESSAGES[:1])
+        assert short.analysis.complexity_level == "low" and client.calls == 3
+
+    asyncio.run(run())
+
+def main():
+    """모든 테스트 실행"""
+    print("🚀 LLM 분석기 테스트 시작\n")
+    test_analysis_cache()
+    test_analysis_single_flight()
+    test_analysis_cache_eviction_and_errors()
+    test_combined_analysis()
+    print("\n✅ 모든 테스트 완료!")
+
+if __name__ == "__main__":
+    main()
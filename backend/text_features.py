@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+상호작용 텍스트 특징 추출기
+질문 분류, 중요도 평가, 주제 추적이 공유하는 토큰/키워드/주제를 한 번의 패스로 계산
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import FrozenSet, Tuple
+
+# 질문 분류 순서가 곧 우선순위
+QUESTION_CLASSES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("factual", ("what", "which", "who", "where", "when")),
+    ("explanatory", ("why", "how")),
+    ("subjective", ("feel", "think", "believe", "opinion")),
+)
+
+# 심층 질문 단서 (중요도 가산)
+DEPTH_CUES: FrozenSet[str] = frozenset({"why", "how", "feel", "think"})
+
+TOPIC_STOPWORDS: FrozenSet[str] = frozenset(
+    {"the", "is", "at", "which", "on", "a", "an", "and", "or", "but"}
+)
+
+_KEYWORDS = sorted(
+    {word for _, words in QUESTION_CLASSES for word in words} | DEPTH_CUES,
+    key=len,
+    reverse=True
+)
+
+# 전방탐색 교대식: 한 번의 스캔으로 겹치는 위치까지 모든 키워드를 찾는다
+# (기존 `word in text` 부분 문자열 검사와 같은 결과, 예: "show" 안의 "how")
+_KEYWORD_PATTERN = re.compile("(?=(" + "|".join(map(re.escape, _KEYWORDS)) + "))")
+
+@dataclass(frozen=True)
+class InteractionFeatures:
+    """사용자 메시지 하나에서 추출한 특징 (불변, 캐시 공유)"""
+    tokens: Tuple[str, ...]
+    keyword_hits: FrozenSet[str]
+    question_type: str
+    topic: str
+
+    @property
+    def token_set(self) -> FrozenSet[str]:
+        return frozenset(self.tokens)
+
+    @property
+    def is_deep_question(self) -> bool:
+        return not DEPTH_CUES.isdisjoint(self.keyword_hits)
+
+def _classify(hits: FrozenSet[str], text: str) -> str:
+    for question_type, words in QUESTION_CLASSES:
+        if not hits.isdisjoint(words):
+            return question_type
+    return "yes_no" if "?" in text else "statement"
+
+def _first_topic(tokens: Tuple[str, ...]) -> str:
+    for token in tokens:
+        if len(token) > 3 and token not in TOPIC_STOPWORDS:
+            return token  # 가장 첫 번째 의미있는 단어
+    return "general"
+
+@lru_cache(maxsize=512)
+def extract_features(text: str) -> InteractionFeatures:
+    """텍스트 특징 추출 (같은 메시지는 검색/저장 경로에서 한 번만 계산)"""
+    lowered = text.lower()
+    tokens = tuple(lowered.split())
+    hits = frozenset(_KEYWORD_PATTERN.findall(lowered))
+    return InteractionFeatures(
+        tokens=tokens,
+        keyword_hits=hits,
+        question_type=_classify(hits, text),
+        topic=_first_topic(tokens)
+    )
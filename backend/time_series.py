@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+고정 크기 링 버퍼 시계열
+(시각, 점수)를 덮어쓰며 저장하고 누적합으로 임의 윈도우의 평균/변화/기울기를 O(1)에 계산
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 가중 누적합이 커져 정밀도가 떨어지지 않도록 주기적으로 인덱스를 0부터 다시 매김
+_REBASE_EVERY = 1 << 20
+
+def _zeros(size: int):
+    return np.zeros(size, dtype=np.float64) if NUMPY_AVAILABLE else [0.0] * size
+
+class RingSeries:
+    """(timestamp, score) 링 버퍼 + 누적합
+
+    n번째(0부터) 값을 쓸 때 전체 누적합 S[n] = sum(score[0..n]) 와
+    가중 누적합 W[n] = sum(i * score[i]) 를 같은 칸에 기록해 두면,
+    최근 w개의 합은 S[n] - S[n-w] 로 바로 구할 수 있다 (w <= capacity).
+    """
+
+    def __init__(self, capacity: int = 50):
+        self.capacity = capacity
+        self._timestamps = _zeros(capacity)
+        self._scores = _zeros(capacity)
+        # 윈도우 시작 직전 누적값을 읽기 위해 한 칸 더 보관
+        self._sums = _zeros(capacity + 1)
+        self._weighted_sums = _zeros(capacity + 1)
+        self._total = 0.0
+        self._weighted_total = 0.0
+        self._written = 0  # 지금까지 기록된 전체 개수
+
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+
+    def __bool__(self) -> bool:
+        return self._written > 0
+
+    def append(self, score: float, timestamp: Optional[float] = None):
+        """값 추가 - 분할 상환 O(1) (가득 차면 가장 오래된 값을 덮어씀)"""
+        if self._written >= _REBASE_EVERY:
+            self._rebase()
+
+        index = self._written
+        slot = index % self.capacity
+        self._timestamps[slot] = datetime.now().timestamp() if timestamp is None else timestamp
+        self._scores[slot] = score
+
+        self._total += score
+        self._weighted_total += index * score
+        self._sums[index % (self.capacity + 1)] = self._total
+        self._weighted_sums[index % (self.capacity + 1)] = self._weighted_total
+        self._written += 1
+
+    def _prefix(self, index: int) -> Tuple[float, float]:
+        """index번째 값까지의 (누적합, 가중 누적합) - index < 0 이면 0"""
+        if index < 0:
+            return 0.0, 0.0
+        slot = index % (self.capacity + 1)
+        return float(self._sums[slot]), float(self._weighted_sums[slot])
+
+    def _score_at(self, index: int) -> float:
+        return float(self._scores[index % self.capacity])
+
+    def window_stats(self, window: int = 10) -> Dict[str, float]:
+        """최근 window개 값의 개수/평균/변화량(마지막-처음)/기울기(값당 변화) - O(1)"""
+        count = min(window, len(self))
+        if count == 0:
+            return {"count": 0, "mean": 0.0, "trend": 0.0, "slope": 0.0}
+
+        last = self._written - 1
+        first = last - count + 1
+        total_end, weighted_end = self._prefix(last)
+        total_start, weighted_start = self._prefix(first - 1)
+        total = total_end - total_start
+        weighted = weighted_end - weighted_start
+        mean = total / count
+
+        # 최소제곱 기울기: sum((i - i_mean) * s) / sum((i - i_mean)^2)
+        slope = 0.0
+        if count > 1:
+            index_mean = (first + last) / 2
+            variance = count * (count * count - 1) / 12
+            slope = (weighted - index_mean * total) / variance
+
+        return {
+            "count": count,
+            "mean": mean,
+            "trend": self._score_at(last) - self._score_at(first),
+            "slope": slope
+        }
+
+    def points(self, window: Optional[int] = None) -> List[Tuple[float, float]]:
+        """최근 window개 (timestamp, score), 오래된 순 - O(window)"""
+        count = len(self) if window is None else min(window, len(self))
+        start = self._written - count
+        return [
+            (float(self._timestamps[i % self.capacity]), float(self._scores[i % self.capacity]))
+            for i in range(start, self._written)
+        ]
+
+    def _rebase(self):
+        """보관 중인 값만으로 누적합을 다시 계산"""
+        retained = self.points()
+        self.clear()
+        for timestamp, score in retained:
+            self.append(score, timestamp)
+
+    def clear(self):
+        self.__init__(self.capacity)
+
+    def to_list(self, window: Optional[int] = None) -> List[Dict[str, Any]]:
+        """JSON 저장용 [{timestamp: ISO, score}] 목록"""
+        return [
+            {"timestamp": datetime.fromtimestamp(timestamp).isoformat(), "score": score}
+            for timestamp, score in self.points(window)
+        ]
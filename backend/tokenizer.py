@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+토큰 수 계산기
+교체 가능한 토크나이저 + 텍스트 해시 기반 LRU 캐시 (압축/컨텍스트 구성 시 같은 문자열 재계산 방지)
+"""
+
+import hashlib
+import logging
+import math
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+class Tokenizer:
+    """토크나이저 인터페이스"""
+
+    name: str = "base"
+
+    def count(self, text: str) -> int:
+        raise NotImplementedError
+
+class HeuristicTokenizer(Tokenizer):
+    """글자 수 기반 추정 (기존 방식)"""
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        # 대략 3글자 = 1토큰
+        return len(text) // 3
+
+# BPE 사전 분할과 같은 방식으로 문자 종류별 조각을 나눈다
+_PIECE_PATTERN = re.compile(
+    r"(?P<hangul>[가-힣ㄱ-ㆎ]+)"
+    r"|(?P<cjk>[぀-ヿ一-鿿]+)"
+    r"|(?P<word>[A-Za-z]+)"
+    r"|(?P<digit>\d{1,3})"
+    r"|(?P<newline>\s*\n\s*)"
+    r"|(?P<space>\s+)"
+    r"|(?P<symbol>.)",
+    re.DOTALL
+)
+
+class ScriptAwareTokenizer(Tokenizer):
+    """오프라인 BPE 근사 토크나이저 (사전 파일 없이 문자 종류별 병합률로 추정)
+
+    영어 단어는 대부분 통째로 병합되고, 한글은 음절 단위에 가깝게 분할되는
+    BPE 어휘의 경향을 반영한다. 공백은 다음 조각에 붙는 것으로 본다.
+    """
+
+    name = "script"
+
+    def __init__(self, word_chars: float = 6.0, hangul_chars: float = 1.2):
+        self.word_chars = word_chars      # 영어 단어 조각당 평균 글자 수
+        self.hangul_chars = hangul_chars  # 한글 토큰당 평균 음절 수
+
+    def count(self, text: str) -> int:
+        tokens = 0
+        for match in _PIECE_PATTERN.finditer(text):
+            kind = match.lastgroup
+            length = match.end() - match.start()
+            if kind == "word":
+                tokens += math.ceil(length / self.word_chars)
+            elif kind == "hangul":
+                tokens += math.ceil(length / self.hangul_chars)
+            elif kind in ("cjk", "symbol"):
+                tokens += length
+            elif kind in ("digit", "newline"):
+                tokens += 1
+        return tokens
+
+class TiktokenTokenizer(Tokenizer):
+    """tiktoken BPE 토크나이저 (어휘 파일이 캐시되어 있으면 오프라인 동작)"""
+
+    name = "tiktoken"
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+class CachedTokenCounter:
+    """텍스트 해시 키 기반 LRU 캐시 토큰 계산기"""
+
+    def __init__(self, tokenizer: Tokenizer, max_entries: int = 4096):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+
+        # 긴 텍스트를 그대로 보관하지 않도록 해시를 키로 사용
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return cached
+
+        self.stats["misses"] += 1
+        tokens = self.tokenizer.count(text)
+        self._cache[key] = tokens
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def set_tokenizer(self, tokenizer: Tokenizer):
+        """토크나이저 교체 (이전 계산 결과는 폐기)"""
+        self.tokenizer = tokenizer
+        self._cache.clear()
+
+    def clear(self):
+        self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "tokenizer": self.tokenizer.name, "entries": len(self._cache)}
+
+def create_tokenizer(kind: Optional[str] = "auto") -> Tokenizer:
+    """설정 문자열로 토크나이저 생성 (auto: tiktoken → 문자 종류별 추정 순으로 대체)"""
+    kind = kind or "auto"
+    if kind in ("auto", "tiktoken"):
+        if TIKTOKEN_AVAILABLE:
+            try:
+                return TiktokenTokenizer()
+            except Exception as e:
+                # 어휘 파일을 내려받을 수 없는 오프라인 환경
+                logger.warning(f"tiktoken 어휘를 불러올 수 없어 추정 토크나이저를 사용합니다: {e}")
+        elif kind == "tiktoken":
+            logger.warning("tiktoken이 설치되지 않아 추정 토크나이저를 사용합니다.")
+        return ScriptAwareTokenizer()
+    if kind == "script":
+        return ScriptAwareTokenizer()
+    if kind == "heuristic":
+        return HeuristicTokenizer()
+    raise ValueError(f"지원하지 않는 토크나이저: {kind}")
+
+# 전역 토큰 계산기 인스턴스
+token_counter = CachedTokenCounter(
+    create_tokenizer(os.getenv("CONTEXT_TOKENIZER")),
+    max_entries=int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+주제 전환 그래프
+주제별로 다음 주제 상위 k개만 근사 빈도(Space-Saving)로 유지해 메모리를 고정하고, 다음 주제 예측 제공
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple, Union
+
+class TopicTransitionGraph:
+    """크기 제한 주제 전환 카운터
+
+    - 출발 주제마다 도착 주제를 최대 max_targets개만 센다. 가득 찬 상태에서 새 주제가 오면
+      가장 적게 센 주제를 밀어내고 그 횟수 + 1로 시작한다 (Space-Saving: 빈도가 높은 주제는
+      반드시 남고, 횟수는 실제보다 최대 밀려난 횟수만큼 크게 추정될 수 있음).
+    - 출발 주제는 최근 갱신 순으로 max_sources개까지 유지한다.
+    """
+
+    def __init__(self, max_sources: int = 200, max_targets: int = 8):
+        self.max_sources = max_sources
+        self.max_targets = max_targets
+        self._edges: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+
+    def record(self, source: str, target: str, count: int = 1):
+        """전환 기록 - O(max_targets)"""
+        targets = self._edges.get(source)
+        if targets is None:
+            targets = self._edges[source] = {}
+            if len(self._edges) > self.max_sources:
+                self._edges.popitem(last=False)
+        else:
+            self._edges.move_to_end(source)
+
+        if target in targets or len(targets) < self.max_targets:
+            targets[target] = targets.get(target, 0) + count
+        else:
+            evicted = min(targets, key=targets.get)
+            targets[target] = targets.pop(evicted) + count
+
+    def predict_next(self, topic: str, k: int = 3) -> List[Tuple[str, float]]:
+        """topic 다음에 올 가능성이 높은 주제 k개와 추정 확률"""
+        targets = self._edges.get(topic)
+        if not targets:
+            return []
+        total = sum(targets.values())
+        ranked = sorted(targets.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(target, count / total) for target, count in ranked]
+
+    def targets(self, topic: str) -> Dict[str, int]:
+        return dict(self._edges.get(topic, {}))
+
+    def __len__(self) -> int:
+        return len(self._edges)
+
+    def __contains__(self, topic: str) -> bool:
+        return topic in self._edges
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        """JSON 저장용 {출발: {도착: 횟수}}"""
+        return {source: dict(targets) for source, targets in self._edges.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Union[Dict[str, int], Iterable[str]]], **kwargs) -> "TopicTransitionGraph":
+        """저장된 그래프 복원 (이전 형식인 {출발: [도착, ...]} 목록도 허용)"""
+        graph = cls(**kwargs)
+        for source, targets in data.items():
+            if isinstance(targets, dict):
+                for target, count in targets.items():
+                    graph.record(source, target, count)
+            else:
+                for target in targets:
+                    graph.record(source, target)
+        return graph